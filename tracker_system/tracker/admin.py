@@ -11,7 +11,7 @@ except Exception:
     base_formats = []
 
 from django.db.models import Q
-from .models import Car, Tracker, InstallationHistory, OrderDocument, Location, ActionLog
+from .models import Car, Tracker, InstallationHistory, OrderDocument, Location, ActionLog, ActionLogStats
 
 # Ресурсы для импорта-экспорта
 class CarResource(resources.ModelResource):
@@ -103,7 +103,7 @@ class TrackerAdmin(ImportExportModelAdmin):
         'installation_history_link'
     )
     
-    list_filter = ('protocol', 'is_active', 'created_at')
+    list_filter = ('protocol', 'is_active', 'status', 'created_at')
     search_fields = (
         'serial_number', 'imei', 'inventory_number_tracker',
         'inventory_number_antenna', 'comment'
@@ -220,57 +220,108 @@ class OrderDocumentAdmin(admin.ModelAdmin):
 # ActionLog admin + export
 # ------------------------
 import csv
+import datetime
 import json
-from django.http import HttpResponse
+from django.contrib.contenttypes.models import ContentType
+from django.http import StreamingHttpResponse
+from . import compact
+
+EXPORT_CHUNK_SIZE = 2000
+
+_EXPORT_COLUMNS = ('timestamp', 'user__username', 'action', 'object_repr', 'content_type_id', 'object_id', 'changes', 'changes_packed', 'request_path', 'ip_address')
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def _export_rows(queryset):
+    """One pass over the selected logs as dicts: the user is joined in, content types come from a small lookup."""
+    content_types = {ct.pk: str(ct) for ct in ContentType.objects.filter(pk__in=queryset.order_by().values('content_type_id'))}
+    for row in queryset.values(*_EXPORT_COLUMNS).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'timestamp': row['timestamp'].isoformat(),
+            'user': row['user__username'],
+            'action': row['action'],
+            'object_repr': row['object_repr'],
+            'content_type': content_types.get(row['content_type_id'], ''),
+            'object_id': row['object_id'],
+            'changes': compact.row_changes(row),
+            'request_path': row['request_path'] or '',
+            'ip_address': row['ip_address'] or '',
+        }
+
 
 @admin.action(description='Export selected logs as CSV')
 def export_logs_csv(modeladmin, request, queryset):
     fieldnames = ['timestamp', 'user', 'action', 'object_repr', 'content_type', 'object_id', 'changes', 'request_path', 'ip_address']
-    response = HttpResponse(content_type='text/csv')
+    writer = csv.DictWriter(_Echo(), fieldnames=fieldnames)
+
+    def lines():
+        yield writer.writeheader()
+        for row in _export_rows(queryset):
+            row['user'] = row['user'] or ''
+            row['changes'] = json.dumps(row['changes'], ensure_ascii=False)
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="action_logs.csv"'
-    writer = csv.DictWriter(response, fieldnames=fieldnames)
-    writer.writeheader()
-    for log in queryset:
-        writer.writerow({
-            'timestamp': log.timestamp.isoformat(),
-            'user': log.user.username if log.user else '',
-            'action': log.action,
-            'object_repr': log.object_repr,
-            'content_type': str(log.content_type),
-            'object_id': log.object_id,
-            'changes': json.dumps(log.changes, ensure_ascii=False),
-            'request_path': log.request_path or '',
-            'ip_address': log.ip_address or '',
-        })
     return response
 
 @admin.action(description='Export selected logs as JSON')
 def export_logs_json(modeladmin, request, queryset):
-    data = []
-    for log in queryset:
-        data.append({
-            'timestamp': log.timestamp.isoformat(),
-            'user': log.user.username if log.user else None,
-            'action': log.action,
-            'object_repr': log.object_repr,
-            'content_type': str(log.content_type),
-            'object_id': log.object_id,
-            'changes': log.changes,
-            'request_path': log.request_path or '',
-            'ip_address': log.ip_address or '',
-        })
-    response = HttpResponse(json.dumps(data, ensure_ascii=False, indent=2), content_type='application/json')
+    def chunks():
+        # a JSON array written element by element, one object per line
+        yield '['
+        separator = '\n'
+        for row in _export_rows(queryset):
+            yield separator + json.dumps(row, ensure_ascii=False)
+            separator = ',\n'
+        yield '\n]\n'
+
+    response = StreamingHttpResponse(chunks(), content_type='application/json')
     response['Content-Disposition'] = 'attachment; filename="action_logs.json"'
     return response
 
 
+def _parse_filter_datetime(value):
+    """Datetime from a changelist date filter value ('2024-01-31' or '2024-01-31 00:00:00+02:00')."""
+    from django.utils import timezone
+    from django.utils.dateparse import parse_date, parse_datetime
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
 @admin.action(description='Clear selected logs')
 def clear_selected_logs(modeladmin, request, queryset):
-    count = queryset.count()
-    queryset.delete()
+    count = queryset.purge()
     modeladmin.message_user(request, f'Cleared {count} selected log(s).')
 
 
+@admin.action(description='View object as of selected entry')
+def view_as_of(modeladmin, request, queryset):
+    from django.shortcuts import redirect
+    from urllib.parse import urlencode
+    log = queryset.order_by('-timestamp', '-id').first()
+    url = reverse('admin:tracker_actionlog_as_of', args=[log.content_type_id, log.object_id])
+    return redirect(f"{url}?{urlencode({'at': log.timestamp.isoformat()})}")
+
+
 @admin.register(ActionLog)
 class ActionLogAdmin(admin.ModelAdmin):
     change_list_template = 'admin/tracker/actionlog/change_list.html'
@@ -278,14 +329,15 @@ class ActionLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'user', 'action', 'object_repr', 'content_type', 'object_id')
     list_filter = ('action', 'content_type', 'timestamp')
     search_fields = ('user__username', 'object_repr', 'changes')
-    readonly_fields = ('timestamp', 'user', 'action', 'object_repr', 'content_type', 'object_id', 'changes', 'request_path', 'ip_address')
-    actions = [export_logs_csv, export_logs_json, clear_selected_logs]
+    readonly_fields = ('timestamp', 'user', 'action', 'object_repr', 'content_type', 'object_id', 'changes', 'request_path', 'ip_address', 'size')
+    actions = [export_logs_csv, export_logs_json, clear_selected_logs, view_as_of]
 
     def get_urls(self):
         from django.urls import path
         urls = super().get_urls()
         custom_urls = [
             path('clear-logs/', self.admin_site.admin_view(self.clear_all_logs_view), name='tracker_actionlog_clear_logs'),
+            path('as-of/<int:content_type_id>/<str:object_id>/', self.admin_site.admin_view(self.as_of_view), name='tracker_actionlog_as_of'),
         ]
         return custom_urls + urls
 
@@ -293,8 +345,7 @@ class ActionLogAdmin(admin.ModelAdmin):
         # only allow POST for destructive action
         from django.shortcuts import redirect
         if request.method == 'POST':
-            count = ActionLog.objects.count()
-            ActionLog.objects.all().delete()
+            count = ActionLog.objects.all().purge(batch_size=5000)
             self.message_user(request, f'Cleared {count} log(s).')
             return redirect('..')
         # If GET, render a simple confirmation
@@ -302,13 +353,84 @@ class ActionLogAdmin(admin.ModelAdmin):
         context = dict(
             self.admin_site.each_context(request),
             title='Confirm clear ActionLog',
-            count=ActionLog.objects.count(),
+            count=ActionLogStats.current().rows,
         )
         return TemplateResponse(request, 'admin/tracker/actionlog/confirm_clear.html', context)
 
+    def as_of_view(self, request, content_type_id, object_id):
+        """Object state reconstructed from the log (tracker/history.py) at ?at=."""
+        from django.contrib.contenttypes.models import ContentType
+        from django.shortcuts import get_object_or_404
+        from django.template.response import TemplateResponse
+        from django.utils import timezone
+        from . import history
+        content_type = get_object_or_404(ContentType, pk=content_type_id)
+        at = _parse_filter_datetime(request.GET.get('at')) or timezone.now()
+        result = history.reconstruct(content_type, object_id, at)
+        context = dict(
+            self.admin_site.each_context(request),
+            title=f'{content_type} #{object_id}',
+            content_type=content_type,
+            object_id=object_id,
+            at=at,
+            at_value=timezone.localtime(at).strftime('%Y-%m-%dT%H:%M:%S'),
+            state=sorted(result.state.items()) if result.state is not None else None,
+            replayed=result.replayed,
+            checkpoint=result.checkpoint,
+        )
+        return TemplateResponse(request, 'admin/tracker/actionlog/as_of.html', context)
+
+    def delete_model(self, request, obj):
+        ActionLog.objects.filter(pk=obj.pk).purge()
+
+    def delete_queryset(self, request, queryset):
+        queryset.purge()
+
+    def get_search_results(self, request, queryset, search_term):
+        # full-text index (tracker/fts.py) instead of LIKE '%term%' over changes
+        from . import fts
+        found = fts.search(queryset, search_term)
+        if found is None:
+            return super().get_search_results(request, queryset, search_term)
+        return found, False
+
     def changelist_view(self, request, extra_context=None):
         if extra_context is None:
             extra_context = {}
         from django.urls import reverse
         extra_context['clear_logs_url'] = reverse('admin:tracker_actionlog_clear_logs')
+        extra_context.update(self.archived_context(request))
         return super().changelist_view(request, extra_context=extra_context)
+
+    archive_display_limit = 200
+
+    def archived_context(self, request):
+        """Rows from the archive segments (tracker/archive.py) matching the changelist filters.
+
+        The archive is only read when a date filter is set and its lower bound
+        reaches into the archived period.
+        """
+        from collections import deque
+        from . import archive
+        since = _parse_filter_datetime(request.GET.get('timestamp__gte'))
+        until = _parse_filter_datetime(request.GET.get('timestamp__lt'))
+        if since is None and until is None:
+            return {}
+        newest = archive.archived_until()
+        if newest is None or (since is not None and since > newest):
+            return {}
+        action = request.GET.get('action__exact')
+        content_type = request.GET.get('content_type__id__exact')
+        term = (request.GET.get('q') or '').lower()
+        matched = 0
+        shown = deque(maxlen=self.archive_display_limit)
+        for record in archive.read(since, until):
+            if action and record['action'] != action:
+                continue
+            if content_type and str(record['content_type_id']) != content_type:
+                continue
+            if term and not any(term in str(record[k] or '').lower() for k in ('user', 'object_repr', 'changes')):
+                continue
+            matched += 1
+            shown.append(record)
+        return {'archived_logs': list(reversed(shown)), 'archived_count': matched}
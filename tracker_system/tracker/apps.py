@@ -5,8 +5,17 @@ class TrackerConfig(AppConfig):
     name = "tracker"
 
     def ready(self):
-        # import audit module to register signal handlers
-        try:
-            from . import audit  # noqa: F401
-        except Exception:
-            pass
+        # connect audit signal handlers for the models listed in AUDIT_MODELS; a bad
+        # entry fails startup instead of silently leaving the journal empty
+        from . import audit
+        audit.autodiscover()
+        # keep the denormalized current-installation pointers, the dashboard counters,
+        # the car/tracker search index, the identifier index, the data versions and the
+        # change log in sync
+        from . import changes, counters, identifiers, pointers, search, versioning
+        pointers.connect()
+        counters.connect()
+        search.connect()
+        identifiers.connect()
+        versioning.connect()
+        changes.connect()
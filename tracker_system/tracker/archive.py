@@ -0,0 +1,190 @@
+"""Cold storage for old ActionLog rows.
+
+Rows older than a cutoff are moved out of ``tracker_actionlog`` into one
+append-only segment per month (UTC), ``actionlog-YYYY-MM.jsonl.gz`` in
+``AUDIT_ARCHIVE_DIR``. Every append writes a separate gzip member (a valid
+multi-member gzip file, readable with ``zcat``), and the small index next to it
+(``actionlog-YYYY-MM.idx.json``) lists each member's byte offset, length, row
+count and time range, so a reader only decompresses the members that overlap
+the requested period.
+
+Crash safety: rows are deleted from the database only after the segment and
+its index are on disk. Bytes appended after the last indexed member (an
+interrupted run) are truncated before the next append. A run that stops after
+indexing a member but before deleting its rows leaves them in the database;
+they can only be in each month's last member, so ``append`` skips the rows of
+that member (its id range is in the index) and re-running the command never
+duplicates rows.
+"""
+import gzip
+import json
+import os
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from . import compact
+from .models import ActionLog
+
+_COLUMNS = (
+    'id', 'timestamp', 'user_id', 'user__username', 'action', 'object_repr',
+    'content_type_id', 'content_type__app_label', 'content_type__model', 'object_id',
+    'changes', 'changes_packed', 'request_path', 'ip_address', 'size',
+)
+
+
+def archive_dir():
+    return Path(getattr(settings, 'AUDIT_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'actionlog'))
+
+
+def _month(ts):
+    return ts.astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def _paths(month):
+    base = archive_dir()
+    return base / f'actionlog-{month}.jsonl.gz', base / f'actionlog-{month}.idx.json'
+
+
+def _read_index(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'members': []}
+
+
+def _write_index(path, index):
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _to_record(row):
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'].isoformat(),
+        'user_id': row['user_id'],
+        'user': row['user__username'],
+        'action': row['action'],
+        'object_repr': row['object_repr'],
+        'content_type_id': row['content_type_id'],
+        'content_type': f"{row['content_type__app_label']}.{row['content_type__model']}",
+        'object_id': row['object_id'],
+        'changes': compact.row_changes(row),
+        'request_path': row['request_path'],
+        'ip_address': row['ip_address'],
+        'size': row['size'],
+    }
+
+
+def _member_ids(segment, member):
+    with open(segment, 'rb') as f:
+        f.seek(member['offset'])
+        data = gzip.decompress(f.read(member['length']))
+    return {json.loads(line)['id'] for line in data.decode('utf-8').splitlines()}
+
+
+def append(month, records):
+    """Append ``records`` (dicts, oldest first) to the month's segment as one gzip member.
+
+    Records already in the month's last member are skipped; returns how many were appended.
+    """
+    segment, index_path = _paths(month)
+    segment.parent.mkdir(parents=True, exist_ok=True)
+    index = _read_index(index_path)
+    last = index['members'][-1] if index['members'] else None
+    if last is not None and ('min_id' not in last or any(last['min_id'] <= r['id'] <= last['max_id'] for r in records)):
+        # an earlier run stopped before deleting the rows of its last member
+        archived = _member_ids(segment, last)
+        records = [r for r in records if r['id'] not in archived]
+    if not records:
+        return 0
+    end = sum(m['length'] for m in index['members'])
+    payload = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records).encode('utf-8')
+    data = gzip.compress(payload)
+    with open(segment, 'ab') as f:
+        # drop a member left behind by an interrupted run: its rows are still in the database
+        f.truncate(end)
+        f.seek(end)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    index['members'].append({
+        'offset': end,
+        'length': len(data),
+        'rows': len(records),
+        'first': records[0]['timestamp'],
+        'last': records[-1]['timestamp'],
+        'min_id': min(r['id'] for r in records),
+        'max_id': max(r['id'] for r in records),
+    })
+    _write_index(index_path, index)
+    return len(records)
+
+
+def archive_before(cutoff, batch_size=5000):
+    """Move rows with ``timestamp < cutoff`` into the archive. Returns the number of rows moved."""
+    moved = 0
+    while True:
+        rows = list(
+            ActionLog.objects.filter(timestamp__lt=cutoff).order_by('timestamp', 'id').values(*_COLUMNS)[:batch_size]
+        )
+        if not rows:
+            break
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(_month(row['timestamp']), []).append(_to_record(row))
+        for month, records in by_month.items():
+            append(month, records)
+        ActionLog.delete_rows([(row['id'], row['size']) for row in rows])
+        moved += len(rows)
+    return moved
+
+
+def months():
+    """Archived months, oldest first."""
+    base = archive_dir()
+    if not base.exists():
+        return []
+    return sorted(p.name[len('actionlog-'):-len('.idx.json')] for p in base.glob('actionlog-*.idx.json'))
+
+
+def archived_until():
+    """Timestamp of the newest archived row, or None when nothing is archived."""
+    for month in reversed(months()):
+        members = _read_index(_paths(month)[1])['members']
+        if members:
+            return max(parse_datetime(m['last']) for m in members)
+    return None
+
+
+def read(since=None, until=None):
+    """Yield archived records with ``since <= timestamp < until``, month by month.
+
+    Only segments of the months in range and only the gzip members whose time
+    range overlaps it are read and decompressed.
+    """
+    for month in months():
+        if since is not None and month < _month(since):
+            continue
+        if until is not None and month > _month(until):
+            break
+        segment, index_path = _paths(month)
+        members = _read_index(index_path)['members']
+        with open(segment, 'rb') as f:
+            for member in members:
+                if since is not None and parse_datetime(member['last']) < since:
+                    continue
+                if until is not None and parse_datetime(member['first']) >= until:
+                    continue
+                f.seek(member['offset'])
+                for line in gzip.decompress(f.read(member['length'])).decode('utf-8').splitlines():
+                    record = json.loads(line)
+                    ts = parse_datetime(record['timestamp'])
+                    if (since is None or ts >= since) and (until is None or ts < until):
+                        record['timestamp'] = ts
+                        yield record
@@ -1,10 +1,21 @@
-import json
-from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
-from django.dispatch import receiver
+import atexit
+import functools
+import logging
+import os
+import threading
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, models, transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, pre_migrate, post_migrate
 from django.contrib.contenttypes.models import ContentType
 from django.utils.timezone import now
-from .models import ActionLog
-from .middleware import get_current_user, get_current_request
+from . import fts, history
+from .models import ActionLog, ActionLogStats
+from .middleware import get_current_user, get_current_request, record_audit
+
+logger = logging.getLogger(__name__)
 
 def _serialize_value(value):
     try:
@@ -14,62 +25,484 @@ def _serialize_value(value):
     except Exception:
         return str(value)
 
-@receiver(pre_save)
-def _pre_save(sender, instance, **kwargs):
-    # Ignore our ActionLog model to prevent recursion
-    if sender is ActionLog:
-        return
+
+def _merge(first, second):
+    """Fold two consecutive entries for the same object into one net entry (or None)."""
+    if first.action == 'delete':
+        # the object was re-created after deletion; keep both events
+        return False
+    if second.action == 'delete':
+        if first.action == 'create':
+            # created and deleted in the same transaction: nothing to log
+            return None
+        # report the state before the transaction, not the intermediate one
+        before = dict(second.changes or {})
+        for name, diff in (first.changes or {}).items():
+            before[name] = diff['old']
+        second.changes = before
+        return second
+    if first.action == 'create':
+        # second is an update: the create snapshot simply takes the new values
+        data = dict(first.changes or {})
+        for name, diff in (second.changes or {}).items():
+            data[name] = diff['new']
+        second.action, second.changes = 'create', data
+        return second
+    diffs = dict(first.changes or {})
+    for name, diff in (second.changes or {}).items():
+        old = diffs[name]['old'] if name in diffs else diff['old']
+        if old == diff['new']:
+            diffs.pop(name, None)
+        else:
+            diffs[name] = {'old': old, 'new': diff['new']}
+    if not diffs:
+        return None
+    second.changes = diffs
+    return second
+
+
+def coalesce(entries):
+    """Merge entries that touch the same object into one net entry per object, keeping order."""
+    merged = {}
+    order = []
+    for entry in entries:
+        key = (entry.content_type_id, entry.object_id)
+        previous = merged.get(key)
+        result = _merge(previous, entry) if previous is not None else entry
+        if result is False:
+            # cannot be folded: flush the previous one as a separate event
+            order.append(previous)
+            result = entry
+        if result is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = result
+    return sorted(order + list(merged.values()), key=lambda e: e.timestamp)
+
+
+class _TransactionBuffer:
+    """Audit entries of one outermost atomic block on the current thread.
+
+    Every ``add`` registers a robust on_commit hook in the current block, so
+    Django drops it along with a rolled back savepoint. After the commit each
+    hook collects its entries and hands everything collected so far, coalesced,
+    to the writer, unless a later ``add`` is certain to follow: one made in the
+    same savepoint or an enclosing one, which cannot have been rolled back while
+    this hook survived. The last surviving hook always hands over the rest;
+    entries of a nested savepoint at the end may be coalesced separately.
+
+    If the hooks were cut short (an earlier non-robust hook raised), the buffer
+    is left ``stale`` and the next ``enqueue_many`` or ``flush`` on the thread
+    hands over what it collected.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.committed = []
+        # the savepoints each add was made in
+        self.scopes = []
+
+    def add(self, connection, entries):
+        seq = len(self.scopes)
+        # atomic(savepoint=False) blocks show up as None and are never rolled back on their own
+        self.scopes.append(frozenset(sid for sid in connection.savepoint_ids if sid is not None))
+        transaction.on_commit(
+            functools.partial(self._committed, seq, entries), using=connection.alias, robust=True,
+        )
+
+    def _committed(self, seq, entries):
+        self.committed.extend(entries)
+        scope = self.scopes[seq]
+        if not any(later <= scope for later in self.scopes[seq + 1:]):
+            self.close()
+
+    @property
+    def stale(self):
+        # entries are only collected after the commit: the transaction is over
+        return bool(self.committed)
+
+    def close(self):
+        try:
+            entries, self.committed = coalesce(self.committed), []
+            if entries:
+                self.writer._push(entries)
+        finally:
+            if getattr(_local, 'buffer', None) is self:
+                _local.buffer = None
+
+
+_local = threading.local()
+
+
+class AuditWriter:
+    """Write-behind queue for ActionLog rows.
+
+    Signal handlers only build unsaved ActionLog instances. Within a
+    transaction they are buffered per outermost atomic block; on commit the
+    entries are coalesced into one net entry per object (see ``coalesce``) and
+    handed to the queue. Rolled back work never reaches it. The queue is
+    written with ``bulk_create``:
+
+    - by a background thread once ``AUDIT_BATCH_SIZE`` rows are queued or
+      ``AUDIT_FLUSH_INTERVAL`` seconds have passed;
+    - synchronously on commit when ``AUDIT_WRITE_BEHIND`` is disabled;
+    - at process shutdown (``atexit``);
+    - explicitly via ``flush()`` (used by tests and management commands).
+
+    A batch that fails to write (e.g. ``database is locked`` on SQLite) is put
+    back at the head of the queue and logged; the background thread then backs
+    off exponentially, up to ``AUDIT_RETRY_MAX_DELAY`` seconds, before retrying.
+
+    Each batch also bumps the running totals in ActionLogStats; the size budget
+    itself is enforced by the background thread and the ``prune_action_logs``
+    command, never on the request path.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._failures = 0
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'AUDIT_BATCH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2.0)
+
+    @property
+    def write_behind(self):
+        return getattr(settings, 'AUDIT_WRITE_BEHIND', True)
+
+    def _retry_delay(self):
+        delay = self.flush_interval * 2 ** (self._failures - 1)
+        return min(delay, getattr(settings, 'AUDIT_RETRY_MAX_DELAY', 60.0))
+
+    def enqueue(self, entry):
+        """Queue an unsaved ActionLog once the current transaction commits."""
+        self.enqueue_many([entry])
+
+    def enqueue_many(self, entries):
+        """Queue several unsaved ActionLog rows with a single commit hook."""
+        entries = list(entries)
+        if not entries:
+            return
+        record_audit(events=len(entries))
+        conn = transaction.get_connection()
+        if not conn.in_atomic_block:
+            # autocommit: the write has already been committed
+            self._push(entries)
+            return
+        buffer = self._stale_buffer_closed()
+        if buffer is None:
+            buffer = _local.buffer = _TransactionBuffer(self)
+        buffer.add(conn, entries)
+
+    def _stale_buffer_closed(self):
+        # the current thread's buffer, after handing over one left by an earlier transaction
+        buffer = getattr(_local, 'buffer', None)
+        if buffer is not None and buffer.stale:
+            buffer.close()
+            return None
+        return buffer
+
+    def pending(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _push(self, entries):
+        with self._lock:
+            self._queue.extend(entries)
+            size = len(self._queue)
+        if not self.write_behind:
+            started = time.perf_counter()
+            self.flush()
+            record_audit(time.perf_counter() - started)
+            return
+        self._ensure_thread()
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # (re)start the flusher lazily; a forked worker does not inherit the parent's thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='actionlog-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self.pending():
+                continue
+            try:
+                batch = self._write()
+                if self._failures:
+                    # the batch is back in the queue; wakeups would only make it fail faster
+                    time.sleep(self._retry_delay())
+                    continue
+                # retention and checkpoints run here, off the request path; both are no-ops
+                # while under budget / below the checkpoint interval
+                try:
+                    ActionLog.trim_logs()
+                    history.checkpoint_objects({(e.content_type_id, e.object_id) for e in batch})
+                except Exception:
+                    logger.exception('ActionLog retention / checkpoints failed')
+            finally:
+                # the flusher thread owns its own connection; don't keep it open between batches
+                connections.close_all()
+
+    def flush(self):
+        """Write every queued entry now. Returns the number of rows written."""
+        self._stale_buffer_closed()
+        return len(self._write())
+
+    def _write(self):
+        # returns the written entries
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+            if not batch:
+                return []
+            try:
+                with transaction.atomic():
+                    with ActionLog.packed(batch):
+                        for entry in batch:
+                            entry.size = entry.compute_size()
+                        ActionLog.objects.bulk_create(batch, batch_size=self.batch_size)
+                    ActionLogStats.add(rows=len(batch), size=sum(e.size for e in batch))
+                    fts.index(batch)
+            except Exception:
+                # don't fail the caller because logging failed; keep the entries for the next flush
+                self._failures += 1
+                for entry in batch:
+                    # bulk_create may have set the pks of the rolled back rows
+                    entry.pk = None
+                    entry._state.adding = True
+                with self._lock:
+                    self._queue[:0] = batch
+                logger.exception('Writing %d ActionLog entries failed (attempt %d); requeued', len(batch), self._failures)
+                return []
+            self._failures = 0
+            return batch
+
+
+writer = AuditWriter()
+atexit.register(writer.flush)
+
+
+def flush():
+    """Synchronously drain the audit queue (tests, management commands)."""
+    return writer.flush()
+
+
+# Модели, которые пишутся в журнал, и поля, которые в нём не нужны.
+# Переопределяется настройкой AUDIT_MODELS в том же формате.
+DEFAULT_AUDIT_MODELS = {
+    'tracker.Car': {'exclude': ['updated_at', 'current_installation']},
+    'tracker.Location': {},
+    'tracker.Tracker': {'exclude': [
+        'current_installation', 'current_car', 'current_location_name', 'status', 'has_closed_installation',
+    ]},
+    'tracker.InstallationHistory': {},
+    'tracker.OrderDocument': {},
+}
+
+
+class AuditRegistry:
+    """Opt-in list of audited models.
+
+    Signal handlers are connected per registered sender, so saves and deletes
+    of anything else (sessions, users, content types, ActionLog itself) never
+    reach the audit code.
+    """
+
+    def __init__(self):
+        self._fields = {}
+
+    def register(self, model, exclude=()):
+        exclude = set(exclude)
+        self._fields[model] = [
+            f for f in model._meta.fields if f.name not in exclude and f.attname not in exclude
+        ]
+        uid = model._meta.label_lower
+        pre_save.connect(_pre_save, sender=model, dispatch_uid=f'audit_pre_save.{uid}')
+        post_save.connect(_post_save, sender=model, dispatch_uid=f'audit_post_save.{uid}')
+        pre_delete.connect(_pre_delete, sender=model, dispatch_uid=f'audit_pre_delete.{uid}')
+        post_delete.connect(_post_delete, sender=model, dispatch_uid=f'audit_post_delete.{uid}')
+
+    def unregister(self, model):
+        self._fields.pop(model, None)
+        uid = model._meta.label_lower
+        pre_save.disconnect(sender=model, dispatch_uid=f'audit_pre_save.{uid}')
+        post_save.disconnect(sender=model, dispatch_uid=f'audit_post_save.{uid}')
+        pre_delete.disconnect(sender=model, dispatch_uid=f'audit_pre_delete.{uid}')
+        post_delete.disconnect(sender=model, dispatch_uid=f'audit_post_delete.{uid}')
+
+    def is_registered(self, model):
+        return model in self._fields
+
+    def models(self):
+        return list(self._fields)
+
+    def fields(self, model):
+        """Audited concrete fields of ``model`` (excluded ones removed)."""
+        return self._fields.get(model, ())
+
+    def configure(self, config):
+        for label, options in config.items():
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as exc:
+                raise ImproperlyConfigured(f'AUDIT_MODELS: {exc}') from exc
+            exclude = options.get('exclude', ())
+            known = {name for f in model._meta.fields for name in (f.name, f.attname)}
+            unknown = sorted(set(exclude) - known)
+            if unknown:
+                raise ImproperlyConfigured(f'AUDIT_MODELS: {label} has no fields {", ".join(unknown)}')
+            self.register(model, exclude=exclude)
+
+
+registry = AuditRegistry()
+
+
+def autodiscover():
+    """Register the models listed in AUDIT_MODELS (called from TrackerConfig.ready)."""
+    registry.configure(getattr(settings, 'AUDIT_MODELS', DEFAULT_AUDIT_MODELS))
+
+
+
+# Whether the ActionLog tables exist. Resolved once per process and reset around
+# migrate, so the hot path does not introspect the schema on every save.
+_ready = None
+
+def is_ready():
+    global _ready
+    if _ready is None:
+        try:
+            tables = set(connection.introspection.table_names())
+        except Exception:
+            return False
+        _ready = {ActionLog._meta.db_table, ActionLogStats._meta.db_table, ContentType._meta.db_table} <= tables
+    return _ready
+
+def _reset_ready(**kwargs):
+    global _ready
+    _ready = None
+
+pre_migrate.connect(_reset_ready, dispatch_uid='audit_reset_ready_pre_migrate')
+post_migrate.connect(_reset_ready, dispatch_uid='audit_reset_ready_post_migrate')
+
+
+def _purge_content_type_logs(sender, instance, **kwargs):
+    # the FK cascade would delete these rows behind ActionLogStats' back
+    ActionLog.objects.filter(content_type=instance).purge()
+
+pre_delete.connect(_purge_content_type_logs, sender=ContentType, dispatch_uid='audit_purge_content_type_logs')
+
+
+def _timed(handler):
+    """Account the handler's run time to the request's Server-Timing header."""
+    @functools.wraps(handler)
+    def wrapper(sender, instance, **kwargs):
+        started = time.perf_counter()
+        try:
+            return handler(sender, instance, **kwargs)
+        finally:
+            record_audit(time.perf_counter() - started)
+    return wrapper
+
+
+def _object_repr(instance):
+    # models whose __str__ follows foreign keys provide audit_repr() built from loaded data only
+    audit_repr = getattr(instance, 'audit_repr', None)
+    return audit_repr() if audit_repr is not None else str(instance)
+
+def _snapshot(sender, instance):
+    # foreign keys are stored by id so taking the snapshot never loads related rows
+    return {f.name: _serialize_value(getattr(instance, f.attname, None)) for f in registry.fields(sender)}
+
+
+def _build_entry(sender, instance, action, changes):
+    user = get_current_user()
+    request = get_current_request()
+    request_path = request.path if request is not None else ''
+    ip = ''
+    if request is not None:
+        ip = request.META.get('REMOTE_ADDR') or request.META.get('HTTP_X_FORWARDED_FOR', '')
+    return ActionLog(
+        user=user if getattr(user, 'is_authenticated', False) else None,
+        content_type=ContentType.objects.get_for_model(sender),
+        object_id=str(getattr(instance, 'pk', '')),
+        object_repr=_object_repr(instance)[:255],
+        action=action,
+        changes=changes,
+        timestamp=now(),
+        request_path=request_path,
+        ip_address=ip
+    )
+
+def _diff(fields, old, instance):
+    """``{name: {'old', 'new'}}`` for ``fields`` whose value differs from ``old`` (keyed by attname)."""
+    diffs = {}
+    for f in fields:
+        new_val = _serialize_value(getattr(instance, f.attname, None))
+        old_val = _serialize_value(old.get(f.attname) if old else None)
+        if old_val != new_val:
+            diffs[f.name] = {'old': old_val, 'new': new_val}
+    return diffs
+
+@_timed
+def _pre_save(sender, instance, update_fields=None, **kwargs):
     if not hasattr(instance, 'pk') or instance.pk is None:
         instance._pre_save_snapshot = None
         return
+    audited = registry.fields(sender)
+    if update_fields is not None and not ({f.name for f in audited} | {f.attname for f in audited}) & set(update_fields):
+        # only excluded fields are written (e.g. auto-touched timestamps); nothing to audit
+        instance._pre_save_snapshot = None
+        instance._audit_skip = True
+        return
+    instance._audit_skip = False
+    # Instances loaded through TrackedFieldsMixin already know their stored values
+    loaded = instance.get_loaded_values() if hasattr(instance, 'get_loaded_values') else None
+    if loaded is not None:
+        instance._pre_save_snapshot = loaded
+        return
     try:
         old = sender.objects.filter(pk=instance.pk).values().first()
         instance._pre_save_snapshot = old
     except Exception:
         instance._pre_save_snapshot = None
 
-@receiver(post_save)
-def _post_save(sender, instance, created, **kwargs):
-    if sender is ActionLog:
-        return
-    user = get_current_user()
-    request = get_current_request()
-    try:
-        ct = ContentType.objects.get_for_model(sender)
-    except Exception:
-        # ContentType table may not be ready during migrations/tests; skip logging
-        return
-    # Ensure ActionLog table exists before attempting to write to it (migrations may be running)
-    from django.db import connection
-    if ActionLog._meta.db_table not in connection.introspection.table_names():
+@_timed
+def _post_save(sender, instance, created, update_fields=None, **kwargs):
+    # TrackedFieldsMixin.save() then remembers the saved values for the next diff
+    if not getattr(instance, '_audit_skip', False):
+        _log_save(sender, instance, created)
+
+def _log_save(sender, instance, created):
+    # ActionLog/ContentType tables may not exist yet while migrations are running
+    if not is_ready():
         return
-    object_repr = str(instance)
-    request_path = request.path if request is not None else ''
-    ip = ''
-    if request is not None:
-        ip = request.META.get('REMOTE_ADDR') or request.META.get('HTTP_X_FORWARDED_FOR', '')
     changes = None
     if created:
-        # Record all fields
-        data = {}
-        for f in instance._meta.fields:
-            name = f.name
-            data[name] = _serialize_value(getattr(instance, name, None))
-        changes = data
+        # Record all audited fields
+        changes = _snapshot(sender, instance)
         action = 'create'
     else:
-        old = getattr(instance, '_pre_save_snapshot', None)
-        new = {}
-        diffs = {}
-        for f in instance._meta.fields:
-            name = f.name
-            new_val = getattr(instance, name, None)
-            new[name] = _serialize_value(new_val)
-            old_val = None
-            if old:
-                old_val = old.get(name)
-            if _serialize_value(old_val) != _serialize_value(new_val):
-                diffs[name] = {'old': _serialize_value(old_val), 'new': _serialize_value(new_val)}
+        # snapshots are keyed by attname (values() / from_db), so compare FKs by id
+        diffs = _diff(registry.fields(sender), getattr(instance, '_pre_save_snapshot', None), instance)
         if diffs:
             changes = diffs
             action = 'update'
@@ -77,77 +510,122 @@ def _post_save(sender, instance, created, **kwargs):
             # nothing changed; skip logging
             return
 
-    # Save ActionLog
     try:
-        ActionLog.objects.create(
-            user=user if getattr(user, 'is_authenticated', False) else None,
-            content_type=ct,
-            object_id=str(getattr(instance, 'pk', '')),
-            object_repr=object_repr,
-            action=action,
-            changes=changes,
-            request_path=request_path,
-            ip_address=ip
-        )
-        # After creating a log, ensure storage doesn't grow beyond threshold
-        try:
-            ActionLog.trim_logs()
-        except Exception:
-            # Never let trimming break user request
-            pass
-    except Exception as e:
+        writer.enqueue(_build_entry(sender, instance, action, changes))
+    except Exception:
         # avoid failing the request because logging failed
-        print('ActionLog save error:', e)
+        logger.exception('Building the ActionLog entry for %s failed', sender.__name__)
 
-@receiver(pre_delete)
+@_timed
 def _pre_delete(sender, instance, **kwargs):
-    if sender is ActionLog:
-        return
     try:
-        data = {}
-        for f in instance._meta.fields:
-            name = f.name
-            data[name] = _serialize_value(getattr(instance, name, None))
-        instance._pre_delete_snapshot = data
+        instance._pre_delete_snapshot = _snapshot(sender, instance)
     except Exception:
         instance._pre_delete_snapshot = None
 
-@receiver(post_delete)
+@_timed
 def _post_delete(sender, instance, **kwargs):
-    if sender is ActionLog:
+    # ActionLog/ContentType tables may not exist yet while migrations are running
+    if not is_ready():
         return
-    user = get_current_user()
-    request = get_current_request()
-    try:
-        ct = ContentType.objects.get_for_model(sender)
-    except Exception:
-        # ContentType table may not be ready during migrations/tests; skip logging
-        return
-    # Ensure ActionLog table exists before attempting to write to it (migrations may be running)
-    from django.db import connection
-    if ActionLog._meta.db_table not in connection.introspection.table_names():
-        return
-    object_repr = str(instance)
-    request_path = request.path if request is not None else ''
-    ip = ''
-    if request is not None:
-        ip = request.META.get('REMOTE_ADDR') or request.META.get('HTTP_X_FORWARDED_FOR', '')
     changes = getattr(instance, '_pre_delete_snapshot', None)
     try:
-        ActionLog.objects.create(
-            user=user if getattr(user, 'is_authenticated', False) else None,
-            content_type=ct,
-            object_id=str(getattr(instance, 'pk', '')),
-            object_repr=object_repr,
-            action='delete',
-            changes=changes,
-            request_path=request_path,
-            ip_address=ip
-        )
-        # Trim logs after delete event as well
-        try:
-            ActionLog.trim_logs()
-        except Exception:
-            pass
-    except Exception as e:
-        print('ActionLog save error (delete):', e)
+        writer.enqueue(_build_entry(sender, instance, 'delete', changes))
+    except Exception:
+        logger.exception('Building the ActionLog delete entry for %s failed', sender.__name__)
+
+
+# Bulk operations. QuerySet.update(), bulk_update() and bulk_create() send no
+# model signals, so they are audited here explicitly (AuditedQuerySet in
+# models.py). Old values are read with one values() query per batch, and the
+# resulting entries are queued together: on commit they are coalesced and
+# written by the same bulk_create as everything else.
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _audited_fields(model, names):
+    names = set(names)
+    return [f for f in registry.fields(model) if f.name in names or f.attname in names]
+
+def audited_update(queryset, batch_size=500, **kwargs):
+    """``queryset.update(**kwargs)`` that logs one 'update' entry per changed row.
+
+    Per batch of ``batch_size`` rows: one SELECT of the old values, the UPDATE
+    and one SELECT of the resulting rows (expressions such as F() are resolved
+    by the database, so the new values are read back rather than guessed).
+    """
+    model = queryset.model
+    fields = _audited_fields(model, kwargs)
+    if not fields or not is_ready():
+        # the plain UPDATE: AuditedQuerySet.audited_update runs the bulk-write follow-up itself
+        return models.QuerySet.update(queryset, **kwargs)
+    attnames = [f.attname for f in fields]
+    manager = model._base_manager.using(queryset.db)
+    updated = 0
+    entries = []
+    with transaction.atomic(using=queryset.db):
+        before = {row['pk']: row for row in queryset.order_by().values('pk', *attnames)}
+        for chunk in _chunks(list(before), batch_size):
+            updated += manager.filter(pk__in=chunk).update(**kwargs)
+            for obj in manager.filter(pk__in=chunk):
+                changes = _diff(fields, before[obj.pk], obj)
+                if changes:
+                    entries.append(_build_entry(model, obj, 'update', changes))
+        writer.enqueue_many(entries)
+    return updated
+
+def audited_bulk_update(queryset, objs, fields, batch_size=None):
+    """``queryset.bulk_update()`` that logs one 'update' entry per changed object.
+
+    Objects loaded through TrackedFieldsMixin are diffed against their loaded
+    values; only the rest cost a SELECT (one per batch).
+    """
+    model = queryset.model
+    objs = list(objs)
+    audited = _audited_fields(model, fields)
+    if not audited or not is_ready():
+        return queryset.bulk_update(objs, fields, batch_size=batch_size)
+    attnames = [f.attname for f in audited]
+    before = {}
+    missing = []
+    for obj in objs:
+        loaded = obj.get_loaded_values() if hasattr(obj, 'get_loaded_values') else None
+        if loaded is not None:
+            before[obj.pk] = loaded
+        else:
+            missing.append(obj.pk)
+    manager = model._base_manager.using(queryset.db)
+    with transaction.atomic(using=queryset.db):
+        for chunk in _chunks(missing, batch_size or 500):
+            for row in manager.filter(pk__in=chunk).values('pk', *attnames):
+                before[row['pk']] = row
+        updated = queryset.bulk_update(objs, fields, batch_size=batch_size)
+        entries = []
+        for obj in objs:
+            changes = _diff(audited, before.get(obj.pk), obj)
+            if changes:
+                entries.append(_build_entry(model, obj, 'update', changes))
+            if hasattr(obj, 'remember_loaded_values'):
+                obj.remember_loaded_values(fields)
+        writer.enqueue_many(entries)
+    return updated
+
+def audited_bulk_create(queryset, objs, **kwargs):
+    """``queryset.bulk_create()`` that logs a 'create' entry per inserted object.
+
+    Needs a backend that returns primary keys from bulk inserts (SQLite,
+    PostgreSQL); objects left without a pk are not logged.
+    """
+    model = queryset.model
+    with transaction.atomic(using=queryset.db):
+        objs = queryset.bulk_create(objs, **kwargs)
+        if registry.is_registered(model) and is_ready():
+            writer.enqueue_many(
+                _build_entry(model, obj, 'create', _snapshot(model, obj)) for obj in objs if obj.pk is not None
+            )
+        for obj in objs:
+            if hasattr(obj, 'remember_loaded_values'):
+                obj.remember_loaded_values()
+    return objs
@@ -0,0 +1,153 @@
+"""Change log for incremental sync (/tracker/api/changes/).
+
+Every write to Car, Tracker and InstallationHistory appends a ChangeEvent
+(``upsert`` or ``delete``) in the same transaction: model signals for
+save()/delete() (cascades included), AuditedQuerySet for bulk operations
+(``update``, ``bulk_update``, ``bulk_create`` and the audited variants), and
+Location renames and deletions for the cars whose location name they change.
+``seq`` is an AUTOINCREMENT key, so it only grows. It is a safe cursor only
+because SQLite serializes writers: events commit in ``seq`` order. With
+concurrent writers (e.g. PostgreSQL) a smaller ``seq`` can commit after a
+reader has moved past it, and that event would be skipped.
+
+``read(since)`` returns the events after ``since``, one per object (its
+latest), with the object's current data read in bulk, so a sync costs
+O(changes). Installations are sent with car and tracker ids only; their
+numbers come with the car and tracker changes.
+
+``prune_changes`` deletes events older than ``CHANGES_KEEP_DAYS``, always
+keeping the newest, and records the last deleted ``seq`` in ChangeLogState. A
+cursor below that watermark cannot be continued (``expired``): the client has
+to download everything again. Gaps in ``seq`` itself do not expire cursors.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.utils import timezone
+from . import api
+from .models import Car, ChangeEvent, ChangeLogState, InstallationHistory, Location, Tracker
+
+CHUNK_SIZE = 500
+
+_INSTALLATION_FIELDS = ('id', 'car.id', 'tracker.id', 'installation_date', 'removal_date', 'is_active', 'comment')
+
+# name in the feed -> (model, row builder)
+MODELS = {
+    'car': (Car, api.Rows(list(api.CAR_FIELDS), api.CAR_FIELDS)),
+    'tracker': (Tracker, api.Rows(list(api.TRACKER_FIELDS), api.TRACKER_FIELDS)),
+    'installation': (InstallationHistory, api.Rows(_INSTALLATION_FIELDS, api.INSTALLATION_FIELDS)),
+}
+
+_NAMES = {model: name for name, (model, _) in MODELS.items()}
+
+
+def record(model, ids, action=ChangeEvent.UPSERT, using=None):
+    ids = sorted({i for i in ids if i is not None})
+    if ids:
+        ChangeEvent.objects.using(using).bulk_create(
+            [ChangeEvent(model=_NAMES[model], object_id=i, action=action) for i in ids], batch_size=CHUNK_SIZE,
+        )
+
+
+def record_bulk(model, ids, fields=None, using=None):
+    """Record a bulk write of ``ids`` (no signals; AuditedQuerySet); ``fields`` is None for an insert."""
+    if model is Location:
+        if fields is not None and 'name' in fields:
+            record(Car, Car._base_manager.using(using).filter(location_id__in=ids).values_list('pk', flat=True), using=using)
+    elif model in _NAMES:
+        record(model, ids, using=using)
+
+
+def latest_seq(using=None):
+    return ChangeEvent.objects.using(using).order_by('-seq').values_list('seq', flat=True).first() or 0
+
+
+def expired(since, using=None):
+    """Whether events after ``since`` may have been pruned already."""
+    pruned = ChangeLogState.objects.using(using).filter(pk=1).values_list('pruned_seq', flat=True).first()
+    return since < (pruned or 0)
+
+
+def read(since=0, limit=100, using=None):
+    """``(changes, cursor, has_more)`` for up to ``limit`` events after ``since``.
+
+    ``changes`` holds one ``{"seq", "model", "id", "action", "data"}`` per
+    object, in the order of its latest event; ``data`` is the current row for
+    an upsert, None for a delete (also when the row is gone by now).
+    """
+    events = list(
+        ChangeEvent.objects.using(using).filter(seq__gt=since).order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+    latest = {}
+    for seq, name, object_id, action in events:
+        latest.pop((name, object_id), None)
+        latest[(name, object_id)] = (seq, action)
+
+    rows = {}
+    for name, (model, rows_of) in MODELS.items():
+        ids = [object_id for (n, object_id), (_, action) in latest.items() if n == name and action == ChangeEvent.UPSERT]
+        for start in range(0, len(ids), CHUNK_SIZE):
+            for values in model._base_manager.using(using).filter(pk__in=ids[start:start + CHUNK_SIZE]).values(*rows_of.lookups):
+                rows[(name, values['id'])] = rows_of(values)
+
+    changes = []
+    for (name, object_id), (seq, action) in latest.items():
+        data = rows.get((name, object_id)) if action == ChangeEvent.UPSERT else None
+        changes.append({
+            'seq': seq, 'model': name, 'id': object_id,
+            'action': ChangeEvent.DELETE if data is None else action, 'data': data,
+        })
+    return changes, events[-1][0] if events else since, has_more
+
+
+def prune(days=None, using=None):
+    """Delete events older than ``days`` (CHANGES_KEEP_DAYS), keeping the newest; returns how many."""
+    days = getattr(settings, 'CHANGES_KEEP_DAYS', 30) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    with transaction.atomic(using=using):
+        old = ChangeEvent.objects.using(using).filter(created_at__lt=cutoff, seq__lt=latest_seq(using))
+        top = old.aggregate(top=Max('seq'))['top']
+        if top is None:
+            return 0
+        state, _ = ChangeLogState.objects.using(using).get_or_create(pk=1)
+        if top > state.pruned_seq:
+            state.pruned_seq = top
+            state.save(update_fields=['pruned_seq'])
+        deleted, _ = old.filter(seq__lte=top).delete()
+    return deleted
+
+
+def _saved(sender, instance, using=None, **kwargs):
+    record(sender, [instance.pk], using=using)
+
+
+def _deleted(sender, instance, using=None, **kwargs):
+    record(sender, [instance.pk], ChangeEvent.DELETE, using=using)
+
+
+def _location_saved(sender, instance, created, using=None, **kwargs):
+    if not created:
+        record(Car, instance.cars.using(using).values_list('pk', flat=True), using=using)
+
+
+def _location_pre_delete(sender, instance, using=None, **kwargs):
+    # the cars' location is SET_NULL with an UPDATE, without signals
+    instance._change_car_ids = list(instance.cars.using(using).values_list('pk', flat=True))
+
+
+def _location_deleted(sender, instance, using=None, **kwargs):
+    record(Car, getattr(instance, '_change_car_ids', ()), using=using)
+
+
+def connect():
+    for model, name in _NAMES.items():
+        post_save.connect(_saved, sender=model, dispatch_uid=f'changes_saved.{name}')
+        post_delete.connect(_deleted, sender=model, dispatch_uid=f'changes_deleted.{name}')
+    post_save.connect(_location_saved, sender=Location, dispatch_uid='changes_location_saved')
+    pre_delete.connect(_location_pre_delete, sender=Location, dispatch_uid='changes_location_pre_delete')
+    post_delete.connect(_location_deleted, sender=Location, dispatch_uid='changes_location_deleted')
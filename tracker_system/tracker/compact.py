@@ -0,0 +1,104 @@
+"""Compact storage of ActionLog.changes (opt-in, ``AUDIT_COMPACT_CHANGES``).
+
+Field names are interned per ContentType into ActionLogField ids and the
+changes are stored in ``ActionLog.changes_packed`` as::
+
+    b'\\x01' + zlib(json([[field_id, old, new], [field_id, value], ...]))
+
+(``b'\\x00'`` + the plain JSON when compression does not pay off). Updates
+keep only the changed fields, as before; create/delete snapshots hold one
+value per field. ``changes`` stays NULL for such rows and is decoded back into
+the usual dict when instances are loaded (``ActionLog.from_db``) and by
+``unpack()`` for ``values()`` readers (exports, archive).
+"""
+import json
+import threading
+import zlib
+from django.db import transaction
+
+RAW = b'\x00'
+ZLIB = b'\x01'
+
+# (content_type_id, name) -> id and id -> name of committed ActionLogField rows
+_ids = {}
+_names = {}
+_lock = threading.Lock()
+
+
+def _remember(rows):
+    # cache only what is committed: ids created or read inside a transaction that
+    # later rolls back would otherwise be reused for other names
+    def store():
+        with _lock:
+            for id_, content_type_id, name in rows:
+                _ids[(content_type_id, name)] = id_
+                _names[id_] = name
+    transaction.on_commit(store)
+
+
+def clear_cache():
+    with _lock:
+        _ids.clear()
+        _names.clear()
+
+
+def intern(content_type_id, names):
+    """Map field ``names`` of a content type to ActionLogField ids, creating missing ones."""
+    from .models import ActionLogField
+    result = {name: _ids[(content_type_id, name)] for name in names if (content_type_id, name) in _ids}
+    missing = [name for name in names if name not in result]
+    if missing:
+        ActionLogField.objects.bulk_create(
+            [ActionLogField(content_type_id=content_type_id, name=name) for name in missing], ignore_conflicts=True
+        )
+        rows = list(
+            ActionLogField.objects.filter(content_type_id=content_type_id, name__in=missing).values_list('id', 'content_type_id', 'name')
+        )
+        result.update({name: id_ for id_, _, name in rows})
+        _remember(rows)
+    return result
+
+
+def field_names(ids):
+    """``{id: name}`` for ActionLogField ids."""
+    from .models import ActionLogField
+    result = {id_: _names[id_] for id_ in ids if id_ in _names}
+    missing = [id_ for id_ in ids if id_ not in result]
+    if missing:
+        rows = list(ActionLogField.objects.filter(pk__in=missing).values_list('id', 'content_type_id', 'name'))
+        result.update({id_: name for id_, _, name in rows})
+        _remember(rows)
+    return result
+
+
+def pack(content_type_id, changes):
+    """Encode a changes dict; returns bytes."""
+    ids = intern(content_type_id, list(changes))
+    items = []
+    for name, value in changes.items():
+        if isinstance(value, dict) and set(value) == {'old', 'new'}:
+            items.append([ids[name], value['old'], value['new']])
+        else:
+            items.append([ids[name], value])
+    raw = json.dumps(items, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    compressed = zlib.compress(raw, 9)
+    return ZLIB + compressed if len(compressed) < len(raw) else RAW + raw
+
+
+def unpack(packed):
+    """Decode bytes produced by ``pack`` back into the changes dict."""
+    packed = bytes(packed)
+    body = zlib.decompress(packed[1:]) if packed[:1] == ZLIB else packed[1:]
+    items = json.loads(body.decode('utf-8'))
+    names = field_names({item[0] for item in items})
+    changes = {}
+    for item in items:
+        name = names.get(item[0], f'#{item[0]}')
+        changes[name] = {'old': item[1], 'new': item[2]} if len(item) == 3 else item[1]
+    return changes
+
+
+def row_changes(row):
+    """``changes`` of a ``values()`` row that also selected ``changes_packed``."""
+    packed = row.get('changes_packed')
+    return unpack(packed) if packed is not None else row['changes']
@@ -0,0 +1,64 @@
+"""Conditional GET for pages and API responses built from the data.
+
+``conditional(models)`` wraps a view in Django's ``condition()`` with:
+
+* ``ETag``: the data versions of ``models`` (tracker/versioning.py), the user
+  (pages show who is logged in), the session key (the forms in the page carry
+  a CSRF token that is rotated on every login) and a salt that changes on
+  every deploy, so new templates are not answered with 304;
+* ``Last-Modified``: the latest change of those models;
+* ``Cache-Control: private, no-cache``: the browser keeps the page but asks
+  every time, instead of guessing a freshness from Last-Modified.
+
+A matching ``If-None-Match`` is answered with 304 after the one small query
+for the versions, before the view runs. Requests with pending flash messages
+get no validators, so the messages are rendered (and consumed) as usual.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from . import versioning
+
+_STARTED = str(int(time.time()))
+
+
+def _salt():
+    # DATA_ETAG_SALT pins it across processes; by default every restart is a new deploy
+    return getattr(settings, 'DATA_ETAG_SALT', None) or _STARTED
+
+
+def _stamp(request, models):
+    # condition() asks for the ETag and Last-Modified separately: one query for both
+    cached = getattr(request, '_data_stamp', None)
+    if cached is None:
+        if len(get_messages(request)):
+            cached = (None, None)
+        else:
+            token, changed_at = versioning.stamp(models)
+            user = getattr(request, 'user', None)
+            user_id = user.pk if user is not None and user.is_authenticated else 0
+            session = getattr(request, 'session', None)
+            # login and logout change the session key, together with the CSRF secret
+            session_key = (session.session_key if session is not None else None) or ''
+            # hashed: If-None-Match is split on commas, which the token contains
+            cached = (hashlib.md5(f'{_salt()}:{user_id}:{session_key}:{token}'.encode()).hexdigest(), changed_at)
+        request._data_stamp = cached
+    return cached
+
+
+def conditional(models=versioning.MODELS):
+    """View decorator: ETag / Last-Modified from the data versions of ``models``."""
+    def etag(request, *args, **kwargs):
+        return _stamp(request, models)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return _stamp(request, models)[1]
+
+    def decorator(view):
+        return cache_control(private=True, no_cache=True)(
+            condition(etag_func=etag, last_modified_func=last_modified)(view)
+        )
+    return decorator
@@ -0,0 +1,133 @@
+"""Aggregate counters for the dashboard and reports.
+
+Each counter is a row of the Counter table. Model signals apply +/-N deltas
+with ``UPDATE ... SET value = value + N`` in the transaction of the change, so
+reading all of them is one small SELECT and no COUNT:
+
+* ``cars``, ``trackers``: create / delete of Car and Tracker;
+* ``active_installations``: create / delete of an active installation and
+  every flip of ``InstallationHistory.is_active``;
+* ``inactive_trackers`` (active trackers with at least one closed
+  installation): flips of ``Tracker.has_closed_installation``, counted by
+  ``pointers.refresh_trackers``, and of ``Tracker.is_active``.
+
+Bulk queryset operations do not send signals; InstallationHistoryQuerySet
+recounts ``active_installations`` after them, anything else (raw SQL,
+``bulk_create`` of cars or trackers) is corrected by ``reconcile()``, which the
+``reconcile_counters`` command runs on a schedule. A counter without a row yet
+is computed on first use.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from .models import Car, Counter, InstallationHistory, Tracker
+
+
+def _inactive_trackers():
+    return Tracker.objects.filter(is_active=True, installations__is_active=False).distinct()
+
+
+# counter name -> queryset whose count() is the true value
+COUNTERS = {
+    'cars': Car.objects.all,
+    'trackers': Tracker.objects.all,
+    'active_installations': lambda: InstallationHistory.objects.filter(is_active=True),
+    'inactive_trackers': _inactive_trackers,
+}
+
+
+def values(using=None):
+    """``{name: value}`` for every counter."""
+    result = dict(Counter.objects.using(using).values_list('name', 'value'))
+    missing = [name for name in COUNTERS if name not in result]
+    if missing:
+        result.update(reconcile(missing, using=using))
+    return result
+
+
+def add(name, delta, using=None):
+    if not delta:
+        return
+    if not Counter.objects.using(using).filter(name=name).update(value=F('value') + delta):
+        # first change since the counter was introduced: start from the true value,
+        # which already includes this change
+        reconcile([name], using=using)
+
+
+def reconcile(names=None, using=None):
+    """Recompute counters (all by default) from the tables. Returns ``{name: value}``."""
+    result = {}
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        for name in names or COUNTERS:
+            value = COUNTERS[name]().using(using).count()
+            Counter.objects.using(using).update_or_create(name=name, defaults={'value': value, 'reconciled_at': now})
+            result[name] = value
+    return result
+
+
+def _loaded(instance, attname):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    return loaded.get(attname)
+
+
+def _created_deleted(name):
+    def created(sender, instance, created, using=None, **kwargs):
+        if created:
+            add(name, 1, using=using)
+
+    def deleted(sender, instance, using=None, **kwargs):
+        add(name, -1, using=using)
+
+    return created, deleted
+
+
+_car_created, _car_deleted = _created_deleted('cars')
+_tracker_created, _tracker_deleted = _created_deleted('trackers')
+
+
+def _stored_is_active(sender, instance, using=None):
+    # what is in the row now: the loaded value, or a lookup for instances built by hand
+    if instance._state.adding:
+        return False
+    stored = _loaded(instance, 'is_active')
+    if stored is None:
+        stored = sender._base_manager.using(using).filter(pk=instance.pk).values_list('is_active', flat=True).first()
+    return bool(stored)
+
+
+def _stash_is_active(sender, instance, using=None, **kwargs):
+    instance._counter_was_active = _stored_is_active(sender, instance, using)
+
+
+def _installation_saved(sender, instance, using=None, **kwargs):
+    add('active_installations', int(bool(instance.is_active)) - int(instance._counter_was_active), using=using)
+
+
+def _installation_deleted(sender, instance, using=None, **kwargs):
+    was_active = _loaded(instance, 'is_active')
+    if was_active is None:
+        was_active = instance.is_active
+    if was_active:
+        add('active_installations', -1, using=using)
+
+
+def _tracker_saved(sender, instance, created, using=None, **kwargs):
+    # a new tracker has no installations; deleting one first deletes (and refreshes) its installations
+    if created or bool(instance.is_active) == instance._counter_was_active:
+        return
+    if Tracker._base_manager.using(using).filter(pk=instance.pk, has_closed_installation=True).exists():
+        add('inactive_trackers', 1 if instance.is_active else -1, using=using)
+
+
+def connect():
+    post_save.connect(_car_created, sender=Car, dispatch_uid='counters_car_created')
+    post_delete.connect(_car_deleted, sender=Car, dispatch_uid='counters_car_deleted')
+    pre_save.connect(_stash_is_active, sender=Tracker, dispatch_uid='counters_tracker_pre_save')
+    post_save.connect(_tracker_created, sender=Tracker, dispatch_uid='counters_tracker_created')
+    post_save.connect(_tracker_saved, sender=Tracker, dispatch_uid='counters_tracker_saved')
+    post_delete.connect(_tracker_deleted, sender=Tracker, dispatch_uid='counters_tracker_deleted')
+    pre_save.connect(_stash_is_active, sender=InstallationHistory, dispatch_uid='counters_installation_pre_save')
+    post_save.connect(_installation_saved, sender=InstallationHistory, dispatch_uid='counters_installation_saved')
+    post_delete.connect(_installation_deleted, sender=InstallationHistory, dispatch_uid='counters_installation_deleted')
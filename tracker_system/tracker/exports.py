@@ -0,0 +1,258 @@
+"""Background report exports.
+
+A download request normalizes its filters (``normalize_filters``) and looks
+for an ExportJob with the same key, kind plus filters:
+
+* a finished job built from the current data (``versioning.token()``) is
+  served as is;
+* a queued job, or one already running on the current data, is reused, so
+  concurrent requests for the same report share one build;
+* otherwise exports of up to ``EXPORT_INLINE_MAX_ROWS`` rows are built inline
+  and larger ones are queued.
+
+``run_export_worker`` claims queued jobs (``claim``: an UPDATE that only one
+worker can win), writes the workbook to ``MEDIA_ROOT/exports/`` and reports
+progress every ``EXPORT_PROGRESS_EVERY`` rows; that report doubles as a
+heartbeat, a running job silent for ``EXPORT_JOB_TIMEOUT`` seconds goes back
+to the queue. A new artifact replaces older ones for the same key; artifacts
+older than ``EXPORT_KEEP_DAYS`` are pruned.
+"""
+import hashlib
+import json
+import os
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Length
+from django.http import FileResponse
+from django.urls import reverse
+from django.utils import timezone
+from . import identifiers, versioning, xlsx
+from .models import ExportJob, InstallationHistory
+
+ROW_CHUNK_SIZE = 2000
+
+INSTALLATION_FILTERS = ('date_from', 'date_to', 'location', 'model', 'imei', 'serial', 'sim')
+# filters matched through tracker/identifiers.py, where 'sn 77' and 'SN77' are the same term
+_IDENTIFIER_FILTERS = {'imei', 'serial', 'sim'}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def normalize_filters(data):
+    """The non-empty installation filters of ``data`` (e.g. request.GET) as a plain dict."""
+    params = {}
+    for name in INSTALLATION_FILTERS:
+        value = (data.get(name) or '').strip()
+        if name in _IDENTIFIER_FILTERS:
+            value = identifiers.normalize(value) or value
+        if value:
+            params[name] = value
+    return params
+
+
+def job_key(kind, params):
+    return hashlib.md5(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+def installations(params):
+    """InstallationHistory queryset for the report filters ``params``, newest first."""
+    qs = InstallationHistory.objects.order_by('-installation_date')
+    if params.get('date_from'):
+        qs = qs.filter(installation_date__gte=params['date_from'])
+    if params.get('date_to'):
+        qs = qs.filter(installation_date__lte=params['date_to'])
+    location = params.get('location')
+    if location:
+        try:
+            qs = qs.filter(car__location__id=int(location))
+        except ValueError:
+            qs = qs.filter(car__location__name=location)
+    if params.get('model'):
+        qs = qs.filter(car__model=params['model'])
+    # partial numbers go through the identifier index (tracker/identifiers.py)
+    if params.get('imei'):
+        qs = qs.filter(identifiers.tracker_q(['imei'], params['imei'], field='tracker'))
+    if params.get('serial'):
+        qs = qs.filter(identifiers.tracker_q(['serial_number'], params['serial'], field='tracker'))
+    if params.get('sim'):
+        qs = qs.filter(identifiers.tracker_q(['sim_old', 'sim_new', 'n_card'], params['sim'], field='tracker'))
+    return qs
+
+
+class Sheet:
+    """What goes into the workbook: title, headers, column lengths, the row count and the rows."""
+
+    def __init__(self, title, headers, lengths, total, rows):
+        self.title = title
+        self.headers = headers
+        self.lengths = lengths
+        self.total = total
+        self.rows = rows
+
+
+def installations_sheet(params):
+    qs = installations(params)
+    columns = (
+        'car__board_number', 'car__state_number', 'car__location__name', 'tracker__serial_number',
+        'installation_date', 'removal_date', 'is_active', 'comment',
+    )
+    # column widths have to be written before the rows: the row count and the longest
+    # values of the text columns in one aggregate
+    stats = qs.order_by().aggregate(total=Count('pk'), **{f'c{i}': Max(Length(columns[i])) for i in (0, 1, 2, 3, 7)})
+    lengths = [stats.get(f'c{i}') for i in range(len(columns))]
+    lengths[4] = lengths[5] = 10  # YYYY-MM-DD
+
+    def rows():
+        for board, state, location_name, serial, installed, removed, active, comment in qs.values_list(*columns).iterator(chunk_size=ROW_CHUNK_SIZE):
+            yield [
+                board or '-',
+                state or '-',
+                location_name or '-',
+                serial,
+                installed.strftime('%Y-%m-%d'),
+                removed.strftime('%Y-%m-%d') if removed else '',
+                'Да' if active else 'Нет',
+                comment or '',
+            ]
+
+    headers = ['Бортовой номер', 'Державний номер', 'Локация', 'Трекер (S/N)', 'Дата установки', 'Дата снятия', 'Активна', 'Комментарий']
+    return Sheet('Installations', headers, lengths, stats['total'], rows())
+
+
+# job kind -> function(params) returning a Sheet
+KINDS = {
+    'installations': installations_sheet,
+}
+
+
+def _has_file(job):
+    return bool(job.file) and job.file.storage.exists(job.file.name)
+
+
+def reusable_job(kind, params):
+    """The newest job that can answer ``kind`` with ``params`` without a new build, or None."""
+    version = versioning.token()
+    for job in ExportJob.objects.filter(key=job_key(kind, params)).filter(
+        Q(status=ExportJob.PENDING) | Q(status__in=[ExportJob.RUNNING, ExportJob.DONE], data_version=version)
+    ).order_by('-created_at'):
+        if job.status != ExportJob.DONE or _has_file(job):
+            return job
+    return None
+
+
+def enqueue(kind, params, user=None, total=None):
+    return ExportJob.objects.create(
+        kind=kind, params=params, key=job_key(kind, params), total=total,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def filename(job):
+    return f"{job.kind}_{timezone.localtime(job.finished_at).strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+
+def download_response(job):
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=filename(job), content_type=xlsx.CONTENT_TYPE)
+
+
+def status(job):
+    """JSON-ready state of ``job`` for the status endpoint."""
+    data = {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'total': job.total,
+        'percent': min(100, int(job.progress * 100 / job.total)) if job.total else (100 if job.status == ExportJob.DONE else 0),
+        'status_url': reverse('tracker:export_job_status', args=[job.pk]),
+        'download_url': None,
+        'error': job.error,
+    }
+    if job.status == ExportJob.DONE:
+        data['download_url'] = reverse('tracker:export_job_download', args=[job.pk])
+    return data
+
+
+# --- worker ---
+
+def requeue_stale():
+    """Put running jobs whose worker stopped reporting back in the queue; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=_setting('EXPORT_JOB_TIMEOUT', 300))
+    return ExportJob.objects.filter(status=ExportJob.RUNNING, heartbeat_at__lt=cutoff).update(
+        status=ExportJob.PENDING, progress=0,
+    )
+
+
+def claim():
+    """Mark the oldest queued job running and return it, or None when the queue is empty."""
+    for pk in ExportJob.objects.filter(status=ExportJob.PENDING).order_by('created_at').values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        # another worker may have taken it since the SELECT
+        if ExportJob.objects.filter(pk=pk, status=ExportJob.PENDING).update(
+            status=ExportJob.RUNNING, started_at=now, heartbeat_at=now, error='',
+        ):
+            return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def _reporting(job, rows):
+    every = _setting('EXPORT_PROGRESS_EVERY', 1000)
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % every == 0:
+            ExportJob.objects.filter(pk=job.pk).update(progress=count, heartbeat_at=timezone.now())
+
+
+def run(job):
+    """Build the file of a claimed ``job``; returns the job, DONE or FAILED."""
+    directory = os.path.join(settings.MEDIA_ROOT, 'exports')
+    name = f'exports/{job.kind}_{job.pk}_{timezone.now().strftime("%Y%m%d%H%M%S")}.xlsx'
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # read the version before the data: a change during the build makes the file stale, never falsely fresh
+        version = versioning.token()
+        sheet = KINDS[job.kind](job.params)
+        ExportJob.objects.filter(pk=job.pk).update(total=sheet.total, heartbeat_at=timezone.now())
+        # written under a temporary name, so a half-built file is never served
+        with open(path + '.part', 'wb') as file:
+            count = xlsx.write(file, sheet.title, sheet.headers, _reporting(job, sheet.rows), sheet.lengths)
+        os.replace(path + '.part', path)
+    except Exception:
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        job.status = ExportJob.FAILED
+        job.error = traceback.format_exc()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+    job.status = ExportJob.DONE
+    job.file.name = name
+    job.data_version = version
+    job.progress = job.total = count
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'data_version', 'progress', 'total', 'finished_at'])
+    # the new file supersedes older ones for the same filters
+    _delete(ExportJob.objects.filter(key=job.key, status=ExportJob.DONE).exclude(pk=job.pk))
+    return job
+
+
+def _delete(jobs):
+    jobs = list(jobs)
+    for job in jobs:
+        if job.file:
+            job.file.storage.delete(job.file.name)
+    ExportJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    return len(jobs)
+
+
+def prune(days=None):
+    """Delete finished and failed jobs older than ``days`` (EXPORT_KEEP_DAYS) with their files; returns how many."""
+    days = _setting('EXPORT_KEEP_DAYS', 7) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return _delete(ExportJob.objects.filter(status__in=[ExportJob.DONE, ExportJob.FAILED], finished_at__lt=cutoff))
@@ -58,9 +58,7 @@ class TrackerForm(forms.ModelForm):
                 help_text='Выберите автомобиль, на который назначить этот трекер (создаст запись установки)'
             )
             if self.instance and getattr(self.instance, 'pk', None):
-                active = self.instance.installations.filter(is_active=True).select_related('car').first()
-                if active:
-                    self.fields['current_car'].initial = active.car
+                self.fields['current_car'].initial = self.instance.current_car_id
 
             # Place current_car after 'holder_number' in the field order for nicer layout
             try:
@@ -0,0 +1,91 @@
+"""SQLite FTS5 shadow index over ActionLog.
+
+``tracker_actionlog_fts`` holds, per ActionLog row (rowid = ActionLog.id),
+its ``object_repr``, the flattened ``changes`` (field names, old and new
+values) and the username. Rows are indexed from Python when they are inserted
+(``ActionLog.save`` and the audit writer's ``bulk_create``); an AFTER DELETE
+trigger removes them, so purges, retention and archiving keep it in sync.
+
+On other database backends, or an SQLite build without FTS5, the table does
+not exist and callers fall back to plain ``icontains`` lookups.
+"""
+import re
+from django.db import connection
+from django.db.models.signals import pre_migrate, post_migrate
+from django.db.models.expressions import RawSQL
+
+TABLE = 'tracker_actionlog_fts'
+
+_available = None
+
+
+def available():
+    """Whether the FTS table exists (checked once per process, reset around migrate)."""
+    global _available
+    if _available is None:
+        try:
+            _available = connection.vendor == 'sqlite' and TABLE in connection.introspection.table_names()
+        except Exception:
+            return False
+    return _available
+
+
+def _reset(**kwargs):
+    global _available
+    _available = None
+
+pre_migrate.connect(_reset, dispatch_uid='fts_reset_pre_migrate')
+post_migrate.connect(_reset, dispatch_uid='fts_reset_post_migrate')
+
+
+def flatten_changes(changes):
+    """``{'imei': {'old': 1, 'new': 2}, 'name': 'x'}`` -> ``'imei 1 2 name x'``."""
+    parts = []
+    for name, value in (changes or {}).items():
+        parts.append(str(name))
+        if isinstance(value, dict):
+            parts.extend(str(v) for v in value.values() if v is not None)
+        elif value is not None:
+            parts.append(str(value))
+    return ' '.join(parts)
+
+
+def index(logs):
+    """Add saved ActionLog instances to the FTS table (no-op when it is unavailable)."""
+    if not available():
+        return
+    from django.contrib.auth import get_user_model
+    logs = [log for log in logs if log.pk is not None]
+    if not logs:
+        return
+    user_field = logs[0]._meta.get_field('user')
+    # entries built by the audit handlers carry the user object already
+    missing = {log.user_id for log in logs if log.user_id and not user_field.is_cached(log)}
+    usernames = dict(get_user_model()._base_manager.filter(pk__in=missing).values_list('pk', 'username')) if missing else {}
+    rows = []
+    for log in logs:
+        if not log.user_id:
+            username = ''
+        elif user_field.is_cached(log):
+            username = log.user.username if log.user is not None else ''
+        else:
+            username = usernames.get(log.user_id, '')
+        rows.append((log.pk, log.object_repr or '', flatten_changes(log.changes), username))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, object_repr, changes, username) VALUES (%s, %s, %s, %s)', rows
+        )
+
+
+def match_query(term):
+    """FTS5 query for a search box string: every word must match (as a prefix), operators are not exposed."""
+    words = re.findall(r'\w+', term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset, term):
+    """``queryset`` narrowed to rows matching ``term``, or None when the index cannot be used."""
+    query = match_query(term)
+    if not query or not available():
+        return None
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', (query,)))
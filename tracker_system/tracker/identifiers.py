@@ -0,0 +1,144 @@
+"""Indexed lookup of trackers by part of a number.
+
+Field staff type a few digits of an IMEI, SIM, N card or serial number, most
+often the last 4-6. ``icontains`` over those columns is a full scan, so every
+tracker's identifiers are kept normalized (``normalize``: separators dropped,
+upper case) in TrackerIdentifier, along with the reversed value, and split
+into TrackerIdentifierGram trigrams:
+
+* a term of three or more characters matches through the trigram index (every
+  trigram of the term must be present), the few candidates are then checked
+  with ``value LIKE '%term%'``;
+* shorter terms match the start of the value or, via ``reversed_value``, its
+  end, with an index range scan.
+
+Rows are rewritten when a tracker is saved with changed identifiers, by
+TrackerQuerySet's bulk writes (``update``, ``bulk_update``, ``bulk_create`` and
+their audited variants) that touch them, and go away with the tracker
+(CASCADE); ``rebuild_identifier_index`` rebuilds them all.
+"""
+import re
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import pre_save, post_save
+from .models import Tracker, TrackerIdentifier, TrackerIdentifierGram
+
+FIELDS = (
+    'imei', 'sim_old', 'sim_new', 'n_card', 'serial_number',
+    'inventory_number_tracker', 'inventory_number_antenna',
+)
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(value):
+    return _SEPARATORS.sub('', str(value or '')).upper()
+
+
+def grams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def _successor(prefix):
+    # smallest string greater than every string starting with ``prefix``
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def index_trackers(trackers, using=None):
+    """Rewrite the identifier rows of ``trackers`` (Tracker instances)."""
+    trackers = list(trackers)
+    if not trackers:
+        return
+    identifiers = []
+    trigrams = []
+    for tracker in trackers:
+        for kind in FIELDS:
+            value = normalize(getattr(tracker, kind))
+            if not value:
+                continue
+            identifiers.append(TrackerIdentifier(tracker=tracker, kind=kind, value=value, reversed_value=value[::-1]))
+            trigrams.extend(TrackerIdentifierGram(tracker=tracker, kind=kind, gram=g) for g in sorted(grams(value)))
+    ids = [tracker.pk for tracker in trackers]
+    with transaction.atomic(using=using):
+        TrackerIdentifier.objects.using(using).filter(tracker_id__in=ids).delete()
+        TrackerIdentifierGram.objects.using(using).filter(tracker_id__in=ids).delete()
+        TrackerIdentifier.objects.using(using).bulk_create(identifiers, batch_size=500)
+        TrackerIdentifierGram.objects.using(using).bulk_create(trigrams, batch_size=500)
+
+
+def reindex(pks, batch_size=500, using=None):
+    """Reindex the trackers with primary keys ``pks`` from their stored values."""
+    pks = list(pks)
+    for start in range(0, len(pks), batch_size):
+        index_trackers(
+            Tracker._base_manager.using(using).filter(pk__in=pks[start:start + batch_size]).only('pk', *FIELDS),
+            using=using,
+        )
+
+
+def rebuild(batch_size=500, using=None):
+    """Reindex every tracker; returns the number of trackers."""
+    total = 0
+    batch = []
+    for tracker in Tracker.objects.using(using).only('pk', *FIELDS).iterator(chunk_size=batch_size):
+        batch.append(tracker)
+        if len(batch) >= batch_size:
+            index_trackers(batch, using=using)
+            total += len(batch)
+            batch = []
+    index_trackers(batch, using=using)
+    return total + len(batch)
+
+
+def matching_trackers(kinds, term):
+    """Subquery of ids of trackers whose ``kinds`` identifiers contain ``term``, or None if it has no letters/digits."""
+    term = normalize(term)
+    if not term:
+        return None
+    identifiers = TrackerIdentifier.objects.filter(kind__in=kinds)
+    if len(term) < 3:
+        return identifiers.filter(
+            Q(value__gte=term, value__lt=_successor(term))
+            | Q(reversed_value__gte=term[::-1], reversed_value__lt=_successor(term[::-1]))
+        ).values('tracker_id')
+    needed = grams(term)
+    candidates = (
+        TrackerIdentifierGram.objects.filter(kind__in=kinds, gram__in=needed)
+        .values('tracker_id', 'kind')
+        .annotate(found=Count('gram', distinct=True))
+        .filter(found=len(needed))
+        .values('tracker_id')
+    )
+    return identifiers.filter(tracker_id__in=candidates, value__contains=term).values('tracker_id')
+
+
+def tracker_q(kinds, term, field='pk'):
+    """Q for ``field`` (the tracker pk, or e.g. ``'tracker'`` on a related model) matching ``term``.
+
+    Falls back to ``icontains`` on the raw columns for terms without letters or digits.
+    """
+    ids = matching_trackers(kinds, term)
+    if ids is not None:
+        return Q(**{f'{field}__in': ids})
+    prefix = '' if field == 'pk' else f'{field}__'
+    q = Q()
+    for kind in kinds:
+        q |= Q(**{f'{prefix}{kind}__icontains': term})
+    return q
+
+
+def _stash(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    instance._identifiers_changed = instance._state.adding or any(
+        kind not in loaded or loaded[kind] != getattr(instance, kind) for kind in FIELDS
+    )
+
+
+def _saved(sender, instance, using=None, **kwargs):
+    if getattr(instance, '_identifiers_changed', True):
+        index_trackers([instance], using=using)
+
+
+def connect():
+    pre_save.connect(_stash, sender=Tracker, dispatch_uid='identifiers_pre_save')
+    post_save.connect(_saved, sender=Tracker, dispatch_uid='identifiers_post_save')
@@ -0,0 +1,33 @@
+# tracker/management/commands/archive_action_logs.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.utils import timezone
+from tracker import archive
+
+class Command(BaseCommand):
+    help = 'Перенос старых записей журнала действий в сжатый архив (по файлу на месяц)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Архивировать записи старше указанного числа дней (по умолчанию AUDIT_ARCHIVE_AFTER_DAYS)',
+            default=None
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Сколько строк переносить за один проход',
+            default=5000
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'AUDIT_ARCHIVE_AFTER_DAYS', 180)
+        cutoff = timezone.now() - timedelta(days=days)
+        moved = archive.archive_before(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено в архив: {moved} записей старше {cutoff:%Y-%m-%d} ({archive.archive_dir()})'
+        ))
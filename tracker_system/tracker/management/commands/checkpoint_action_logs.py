@@ -0,0 +1,20 @@
+# tracker/management/commands/checkpoint_action_logs.py
+from django.core.management.base import BaseCommand
+from tracker import history
+from tracker.models import ActionLog
+
+class Command(BaseCommand):
+    help = 'Запись снимков состояния объектов по журналу действий (для быстрого восстановления на дату)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=int,
+            help='Снимок через каждые N записей объекта (по умолчанию AUDIT_CHECKPOINT_EVERY)',
+            default=None
+        )
+
+    def handle(self, *args, **options):
+        keys = ActionLog.objects.order_by().values_list('content_type_id', 'object_id').distinct()
+        written = history.checkpoint_objects(list(keys), every=options['every'])
+        self.stdout.write(self.style.SUCCESS(f'Записано снимков: {written}'))
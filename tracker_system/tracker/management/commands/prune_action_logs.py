@@ -0,0 +1,67 @@
+# tracker/management/commands/prune_action_logs.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.utils import timezone
+from tracker.models import ActionLog, ActionLogStats
+
+class Command(BaseCommand):
+    help = 'Удаление старых записей журнала действий (запускать по расписанию, напр. из cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Удалить записи старше указанного числа дней',
+            default=None
+        )
+        parser.add_argument(
+            '--max-rows',
+            type=int,
+            help='Оставить не больше указанного числа последних записей',
+            default=None
+        )
+        parser.add_argument(
+            '--max-bytes',
+            type=int,
+            help='Бюджет хранения в байтах (по умолчанию AUDIT_LOG_MAX_BYTES)',
+            default=None
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Сколько строк удалять за одну транзакцию',
+            default=1000
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Пересчитать счётчики строк/размера по таблице перед очисткой'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        deleted = 0
+
+        if options['recount']:
+            stats = ActionLogStats.recount()
+            self.stdout.write(f'Счётчики пересчитаны: {stats.rows} записей, {stats.size} байт')
+
+        if options['days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['days'])
+            deleted += ActionLog.objects.filter(timestamp__lt=cutoff).purge(batch_size=batch_size)
+
+        if options['max_rows'] is not None:
+            excess = ActionLogStats.current().rows - options['max_rows']
+            if excess > 0:
+                deleted += ActionLog.objects.all().purge(batch_size=batch_size, limit=excess)
+
+        max_bytes = options['max_bytes']
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'AUDIT_LOG_MAX_BYTES', 2 * 1024 * 1024)
+        deleted += ActionLog.trim_logs(max_bytes=max_bytes, batch_size=batch_size)
+
+        stats = ActionLogStats.current()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {deleted}. Осталось: {stats.rows} ({stats.size} байт)'
+        ))
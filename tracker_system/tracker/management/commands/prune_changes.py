@@ -0,0 +1,13 @@
+# tracker/management/commands/prune_changes.py
+from django.core.management.base import BaseCommand
+from tracker import changes
+
+class Command(BaseCommand):
+    help = 'Удаление старых записей журнала изменений (/tracker/api/changes/); запускать по расписанию'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Хранить N дней (по умолчанию CHANGES_KEEP_DAYS)')
+
+    def handle(self, *args, **options):
+        deleted = changes.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей журнала изменений: {deleted}'))
@@ -0,0 +1,18 @@
+# tracker/management/commands/rebuild_identifier_index.py
+from django.core.management.base import BaseCommand
+from tracker import identifiers
+
+class Command(BaseCommand):
+    help = 'Перестроение индекса номеров трекеров (IMEI, SIM, N card, S/N) для поиска по части номера'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Сколько трекеров обрабатывать за раз',
+            default=500
+        )
+
+    def handle(self, *args, **options):
+        total = identifiers.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано трекеров: {total}'))
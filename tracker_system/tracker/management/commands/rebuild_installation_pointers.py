@@ -0,0 +1,10 @@
+# tracker/management/commands/rebuild_installation_pointers.py
+from django.core.management.base import BaseCommand
+from tracker import pointers
+
+class Command(BaseCommand):
+    help = 'Пересчёт текущих установок, автомобилей, локаций и статусов трекеров по истории установок'
+
+    def handle(self, *args, **options):
+        trackers, cars = pointers.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено трекеров: {trackers}, автомобилей: {cars}'))
@@ -0,0 +1,13 @@
+# tracker/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from tracker import search
+
+class Command(BaseCommand):
+    help = 'Перестроение полнотекстового индекса автомобилей и трекеров (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            self.stdout.write(self.style.WARNING('Индекс недоступен (нужна SQLite с FTS5 и применённые миграции)'))
+            return
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Индекс поиска перестроен'))
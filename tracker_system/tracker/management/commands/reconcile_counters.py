@@ -0,0 +1,14 @@
+# tracker/management/commands/reconcile_counters.py
+from django.core.management.base import BaseCommand
+from tracker import counters
+
+class Command(BaseCommand):
+    help = 'Сверка счётчиков дашборда и отчётов с настоящими значениями (запускать по расписанию)'
+
+    def handle(self, *args, **options):
+        stored = counters.values()
+        actual = counters.reconcile()
+        for name, value in actual.items():
+            if stored.get(name) != value:
+                self.stdout.write(f'{name}: {stored.get(name)} -> {value}')
+        self.stdout.write(self.style.SUCCESS(f'Сверено счётчиков: {len(actual)}'))
@@ -0,0 +1,41 @@
+# tracker/management/commands/run_export_worker.py
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tracker import exports
+from tracker.models import ExportJob
+
+class Command(BaseCommand):
+    help = 'Обработка очереди выгрузок отчётов: файлы пишутся в MEDIA_ROOT/exports/ (tracker/exports.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать текущую очередь и завершиться')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Пауза между проверками пустой очереди, сек (по умолчанию EXPORT_WORKER_POLL_INTERVAL)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is None:
+            interval = getattr(settings, 'EXPORT_WORKER_POLL_INTERVAL', 2.0)
+        done = 0
+        try:
+            while True:
+                exports.requeue_stale()
+                job = exports.claim()
+                if job is None:
+                    pruned = exports.prune()
+                    if pruned:
+                        self.stdout.write(f'Удалено старых выгрузок: {pruned}')
+                    if options['once']:
+                        break
+                    time.sleep(interval)
+                    continue
+                job = exports.run(job)
+                done += 1
+                if job.status == ExportJob.DONE:
+                    self.stdout.write(f'{job}: {job.total} строк -> {job.file.name}')
+                else:
+                    self.stderr.write(f'{job}: {job.error.strip().splitlines()[-1]}')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Обработано выгрузок: {done}'))
@@ -1,4 +1,5 @@
 from threading import local
+from django.conf import settings
 
 _thread_locals = local()
 
@@ -10,7 +11,19 @@ class ThreadLocalUserMiddleware:
     def __call__(self, request):
         _thread_locals.user = getattr(request, 'user', None)
         _thread_locals.request = request
-        response = self.get_response(request)
+        _thread_locals.audit = [0.0, 0]
+        try:
+            response = self.get_response(request)
+        finally:
+            # don't leak the user/request into work done later on this thread (commands, audit flushes)
+            _thread_locals.user = None
+            _thread_locals.request = None
+            seconds, events = _thread_locals.audit
+            _thread_locals.audit = None
+        if getattr(settings, 'AUDIT_SERVER_TIMING', True):
+            timing = f'audit;dur={seconds * 1000:.2f};desc="{events} events"'
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
         return response
 
 
@@ -20,3 +33,11 @@ def get_current_user():
 
 def get_current_request():
     return getattr(_thread_locals, 'request', None)
+
+
+def record_audit(seconds=0.0, events=0):
+    """Add audit overhead to the current request's Server-Timing metrics (no-op outside requests)."""
+    stats = getattr(_thread_locals, 'audit', None)
+    if stats is not None:
+        stats[0] += seconds
+        stats[1] += events
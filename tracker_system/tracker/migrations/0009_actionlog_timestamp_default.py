@@ -0,0 +1,18 @@
+# ActionLog rows are written in batches by tracker.audit.AuditWriter, so the
+# timestamp is captured when the event happens instead of at insert time.
+from django.db import migrations, models
+import django.utils.timezone
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_add_order_document_to_installation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actionlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Время'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Running size/row totals for ActionLog so retention no longer scans the table.
+import json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_sizes(apps, schema_editor):
+    ActionLog = apps.get_model('tracker', 'ActionLog')
+    ActionLogStats = apps.get_model('tracker', 'ActionLogStats')
+    rows = 0
+    total = 0
+    for log in ActionLog.objects.all().iterator(chunk_size=1000):
+        try:
+            size = len(json.dumps({
+                'object_repr': log.object_repr,
+                'changes': log.changes,
+                'request_path': log.request_path,
+                'ip_address': log.ip_address,
+            }, ensure_ascii=False, default=str).encode('utf-8'))
+        except Exception:
+            size = 0
+        ActionLog.objects.filter(pk=log.pk).update(size=size)
+        rows += 1
+        total += size
+    ActionLogStats.objects.update_or_create(pk=1, defaults={'rows': rows, 'size': total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_actionlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionlog',
+            name='size',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Размер, байт'),
+        ),
+        migrations.AlterField(
+            model_name='actionlog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Время'),
+        ),
+        migrations.CreateModel(
+            name='ActionLogStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rows', models.BigIntegerField(default=0, verbose_name='Записей')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Размер, байт')),
+            ],
+            options={
+                'verbose_name': 'Статистика логов',
+                'verbose_name_plural': 'Статистика логов',
+            },
+        ),
+        migrations.RunPython(backfill_sizes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Composite index for the per-object history timeline.
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracker', '0010_actionlog_size_and_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actionlog',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='actionlog_object_ts_idx'),
+        ),
+    ]
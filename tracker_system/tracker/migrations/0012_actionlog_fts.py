@@ -0,0 +1,51 @@
+# FTS5 shadow index for ActionLog search (tracker/fts.py). SQLite only; a no-op elsewhere.
+from django.conf import settings
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    user_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE tracker_actionlog_fts USING fts5(object_repr, changes, username)'
+            )
+        except Exception:
+            # SQLite built without FTS5: search falls back to icontains
+            return
+        cursor.execute(
+            'CREATE TRIGGER tracker_actionlog_fts_delete AFTER DELETE ON tracker_actionlog BEGIN '
+            'DELETE FROM tracker_actionlog_fts WHERE rowid = old.id; END'
+        )
+        # index existing rows; the json_tree walk flattens changes the same way as fts.flatten_changes
+        cursor.execute(
+            "INSERT INTO tracker_actionlog_fts (rowid, object_repr, changes, username) "
+            "SELECT l.id, COALESCE(l.object_repr, ''), "
+            "COALESCE((SELECT group_concat(CASE WHEN t.parent = 0 THEN t.key || COALESCE(' ' || t.atom, '') ELSE t.atom END, ' ') "
+            "FROM json_tree(l.changes) t WHERE t.parent = 0 OR (t.parent > 0 AND t.atom IS NOT NULL)), ''), "
+            f"COALESCE(u.username, '') FROM tracker_actionlog l LEFT JOIN {user_table} u ON u.id = l.user_id"
+        )
+
+
+def drop_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TRIGGER IF EXISTS tracker_actionlog_fts_delete')
+        cursor.execute('DROP TABLE IF EXISTS tracker_actionlog_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0011_actionlog_object_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
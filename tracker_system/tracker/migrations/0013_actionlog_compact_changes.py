@@ -0,0 +1,32 @@
+# Optional compact storage of ActionLog.changes (AUDIT_COMPACT_CHANGES, tracker/compact.py).
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracker', '0012_actionlog_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionlog',
+            name='changes_packed',
+            field=models.BinaryField(blank=True, editable=False, null=True, verbose_name='Изменения (сжатые)'),
+        ),
+        migrations.CreateModel(
+            name='ActionLogField',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Поле')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Тип объекта')),
+            ],
+            options={
+                'verbose_name': 'Поле журнала действий',
+                'verbose_name_plural': 'Поля журнала действий',
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'name'), name='actionlogfield_unique_name')],
+            },
+        ),
+    ]
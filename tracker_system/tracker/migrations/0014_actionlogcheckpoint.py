@@ -0,0 +1,30 @@
+# Checkpoint snapshots for point-in-time reconstruction (tracker/history.py).
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracker', '0013_actionlog_compact_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionLogCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=255, verbose_name='ID объекта')),
+                ('timestamp', models.DateTimeField(verbose_name='Время')),
+                ('log_id', models.BigIntegerField(verbose_name='Последняя запись журнала')),
+                ('state', models.JSONField(blank=True, null=True, verbose_name='Состояние')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Тип объекта')),
+            ],
+            options={
+                'verbose_name': 'Снимок объекта',
+                'verbose_name_plural': 'Снимки объектов',
+                'indexes': [models.Index(fields=['content_type', 'object_id', 'timestamp'], name='checkpoint_object_ts_idx')],
+            },
+        ),
+    ]
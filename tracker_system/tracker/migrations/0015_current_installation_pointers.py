@@ -0,0 +1,60 @@
+# Denormalized current-installation pointers on Tracker and Car (tracker/pointers.py).
+from django.db import migrations, models
+from django.db.models import Case, Exists, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_pointers(apps, schema_editor):
+    # same set-based UPDATEs as pointers.rebuild(), against the historical models
+    db = schema_editor.connection.alias
+    InstallationHistory = apps.get_model('tracker', 'InstallationHistory')
+    Tracker = apps.get_model('tracker', 'Tracker')
+    Car = apps.get_model('tracker', 'Car')
+    active = InstallationHistory.objects.using(db).filter(is_active=True).order_by('-installation_date', '-id')
+    by_tracker = active.filter(tracker=OuterRef('pk'))
+    Tracker.objects.using(db).update(
+        current_installation=Subquery(by_tracker.values('pk')[:1]),
+        current_car=Subquery(by_tracker.values('car_id')[:1]),
+        current_location_name=Coalesce(Subquery(by_tracker.values('car__location__name')[:1]), Value('')),
+        status=Case(When(Exists(by_tracker), then=Value('installed')), default=Value('free')),
+    )
+    Car.objects.using(db).update(
+        current_installation=Subquery(active.filter(car=OuterRef('pk')).values('pk')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_actionlogcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='current_installation',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tracker.installationhistory', verbose_name='Текущая установка'),
+        ),
+        migrations.AddField(
+            model_name='tracker',
+            name='current_installation',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tracker.installationhistory', verbose_name='Текущая установка'),
+        ),
+        migrations.AddField(
+            model_name='tracker',
+            name='current_car',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='current_trackers', to='tracker.car', verbose_name='Текущий автомобиль'),
+        ),
+        migrations.AddField(
+            model_name='tracker',
+            name='current_location_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=200, verbose_name='Текущая локация'),
+        ),
+        migrations.AddField(
+            model_name='tracker',
+            name='status',
+            field=models.CharField(choices=[('installed', 'Установлен'), ('free', 'Не установлен')], db_index=True, default='free', editable=False, max_length=20, verbose_name='Статус'),
+        ),
+        migrations.RunPython(fill_pointers, migrations.RunPython.noop),
+    ]
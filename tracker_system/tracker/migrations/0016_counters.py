@@ -0,0 +1,43 @@
+# Dashboard/report counters (tracker/counters.py) and the flag behind 'inactive_trackers'.
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def fill_flag(apps, schema_editor):
+    db = schema_editor.connection.alias
+    InstallationHistory = apps.get_model('tracker', 'InstallationHistory')
+    Tracker = apps.get_model('tracker', 'Tracker')
+    Tracker.objects.using(db).update(
+        has_closed_installation=Exists(
+            InstallationHistory.objects.using(db).filter(tracker=OuterRef('pk'), is_active=False)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_current_installation_pointers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tracker',
+            name='has_closed_installation',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Есть закрытые установки'),
+        ),
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Счётчик')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True, verbose_name='Сверен')),
+            ],
+            options={
+                'verbose_name': 'Счётчик',
+                'verbose_name_plural': 'Счётчики',
+            },
+        ),
+        migrations.RunPython(fill_flag, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# FTS5 search index over cars and trackers (tracker/search.py). SQLite only; a no-op elsewhere.
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE tracker_car_fts USING fts5(state_number, board_number, model, location, comment)'
+            )
+        except Exception:
+            # SQLite built without FTS5: the list views fall back to icontains
+            return
+        cursor.execute(
+            'CREATE VIRTUAL TABLE tracker_tracker_fts USING fts5(imei, serial_number, inventory_number_tracker, '
+            'inventory_number_antenna, model, holder_number, sim_old, n_card, sim_new, location, comment)'
+        )
+        cursor.execute(
+            "INSERT INTO tracker_car_fts (rowid, state_number, board_number, model, location, comment) "
+            "SELECT t.id, t.state_number, COALESCE(t.board_number, ''), t.model, COALESCE(l.name, ''), COALESCE(t.comment, '') "
+            "FROM tracker_car t LEFT JOIN tracker_location l ON l.id = t.location_id"
+        )
+        cursor.execute(
+            "INSERT INTO tracker_tracker_fts (rowid, imei, serial_number, inventory_number_tracker, inventory_number_antenna, "
+            "model, holder_number, sim_old, n_card, sim_new, location, comment) "
+            "SELECT t.id, t.imei, t.serial_number, t.inventory_number_tracker, COALESCE(t.inventory_number_antenna, ''), "
+            "t.model, COALESCE(t.holder_number, ''), COALESCE(t.sim_old, ''), COALESCE(t.n_card, ''), "
+            "COALESCE(t.sim_new, ''), t.current_location_name, COALESCE(t.comment, '') FROM tracker_tracker t"
+        )
+
+
+def drop_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS tracker_tracker_fts')
+        cursor.execute('DROP TABLE IF EXISTS tracker_car_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0016_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
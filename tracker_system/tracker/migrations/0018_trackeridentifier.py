@@ -0,0 +1,73 @@
+# Normalized identifiers and their trigrams for partial-number lookups (tracker/identifiers.py).
+import re
+from django.db import migrations, models
+import django.db.models.deletion
+
+FIELDS = (
+    'imei', 'sim_old', 'sim_new', 'n_card', 'serial_number',
+    'inventory_number_tracker', 'inventory_number_antenna',
+)
+
+
+def fill_identifiers(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Tracker = apps.get_model('tracker', 'Tracker')
+    TrackerIdentifier = apps.get_model('tracker', 'TrackerIdentifier')
+    TrackerIdentifierGram = apps.get_model('tracker', 'TrackerIdentifierGram')
+    identifiers = []
+    grams = []
+    for tracker in Tracker.objects.using(db).only('pk', *FIELDS).iterator():
+        for kind in FIELDS:
+            value = re.sub(r'[\W_]+', '', str(getattr(tracker, kind) or '')).upper()
+            if not value:
+                continue
+            identifiers.append(TrackerIdentifier(tracker_id=tracker.pk, kind=kind, value=value, reversed_value=value[::-1]))
+            grams.extend(
+                TrackerIdentifierGram(tracker_id=tracker.pk, kind=kind, gram=g)
+                for g in sorted({value[i:i + 3] for i in range(len(value) - 2)})
+            )
+    TrackerIdentifier.objects.using(db).bulk_create(identifiers, batch_size=500)
+    TrackerIdentifierGram.objects.using(db).bulk_create(grams, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0017_car_tracker_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackerIdentifier',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=40, verbose_name='Поле')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('reversed_value', models.CharField(max_length=100, verbose_name='Значение задом наперёд')),
+                ('tracker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identifiers', to='tracker.tracker', verbose_name='Трекер')),
+            ],
+            options={
+                'verbose_name': 'Идентификатор трекера',
+                'verbose_name_plural': 'Идентификаторы трекеров',
+                'indexes': [
+                    models.Index(fields=['kind', 'value'], name='identifier_value_idx'),
+                    models.Index(fields=['kind', 'reversed_value'], name='identifier_reversed_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackerIdentifierGram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=40, verbose_name='Поле')),
+                ('gram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('tracker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.tracker', verbose_name='Трекер')),
+            ],
+            options={
+                'verbose_name': 'Триграмма идентификатора',
+                'verbose_name_plural': 'Триграммы идентификаторов',
+                'indexes': [models.Index(fields=['gram', 'kind', 'tracker'], name='identifier_gram_idx')],
+            },
+        ),
+        migrations.RunPython(fill_identifiers, migrations.RunPython.noop),
+    ]
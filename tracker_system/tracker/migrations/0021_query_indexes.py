@@ -0,0 +1,42 @@
+# Composite indexes for the installation and document queries (tests/test_query_plans.py).
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0020_changeevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='installationhistory',
+            index=models.Index(fields=['tracker', 'installation_date', 'id'], name='installation_tracker_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='installationhistory',
+            index=models.Index(fields=['car', 'installation_date', 'id'], name='installation_car_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='installationhistory',
+            index=models.Index(
+                condition=models.Q(('is_active', True)), fields=['tracker', 'installation_date', 'id'],
+                name='installation_tracker_act_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='installationhistory',
+            index=models.Index(
+                condition=models.Q(('is_active', True)), fields=['car', 'installation_date', 'id'],
+                name='installation_car_act_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='installationhistory',
+            index=models.Index(fields=['installation_date', 'id'], name='installation_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdocument',
+            index=models.Index(fields=['car', 'issue_date'], name='document_car_date_idx'),
+        ),
+    ]
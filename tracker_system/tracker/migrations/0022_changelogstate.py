@@ -0,0 +1,23 @@
+# Trim watermark of the change log (tracker/changes.py expired()).
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0021_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pruned_seq', models.BigIntegerField(default=0, verbose_name='Очищен до номера')),
+            ],
+            options={
+                'verbose_name': 'Состояние журнала изменений',
+                'verbose_name_plural': 'Состояние журнала изменений',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Indexes for the car and tracker list orderings (tests/test_query_plans.py).
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0022_changelogstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['board_number', 'id'], name='car_board_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tracker',
+            index=models.Index(fields=['status', 'serial_number', 'id'], name='tracker_status_serial_idx'),
+        ),
+    ]
@@ -1,13 +1,173 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
+from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.core.validators import FileExtensionValidator
 import os
+from contextvars import ContextVar
 
 def order_scan_upload_path(instance, filename):
     """Путь для сохранения сканов приказов"""
     return f'orders/car_{instance.car.id}/{filename}'
 
-class Car(models.Model):
+def _related_or_id(instance, field_name, attr):
+    """``attr`` of an already loaded related object, otherwise ``#<fk id>``; never queries."""
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        related = getattr(instance, field_name)
+        return getattr(related, attr) if related is not None else '-'
+    return f'#{getattr(instance, field.attname)}'
+
+
+class TrackedFieldsMixin:
+    """Запоминает значения полей в том виде, в каком они загружены из БД.
+
+    Аудит (tracker/audit.py), счётчики, указатели и индекс номеров сравнивают
+    с ними объект перед сохранением, вместо того чтобы перечитывать строку
+    отдельным SELECT. После save() значения обновляет сам миксин.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # after every post_save handler has compared against the old values; whether or
+        # not the model is audited, the next save diffs against what was just written
+        self.remember_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.remember_loaded_values(fields)
+
+    def remember_loaded_values(self, fields=None):
+        """Mark the current values of ``fields`` (all concrete fields by default) as persisted."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            loaded = self._loaded_values = {}
+        deferred = self.get_deferred_fields()
+        for f in self._meta.concrete_fields:
+            if fields is not None and f.name not in fields and f.attname not in fields:
+                continue
+            if f.attname in deferred:
+                continue
+            loaded[f.attname] = getattr(self, f.attname)
+
+    def get_loaded_values(self):
+        """Return the persisted values keyed by attname, or None when they are not fully known."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        if any(f.attname not in loaded for f in self._meta.concrete_fields):
+            return None
+        return loaded
+
+
+class DenormalizedFieldsMixin:
+    """Поля из DENORMALIZED_FIELDS ведутся отдельными UPDATE (см. tracker/pointers.py).
+
+    Обычный save() уже существующего объекта их не записывает, чтобы
+    устаревшие значения в памяти не затирали то, что обновили сигналы.
+    """
+
+    DENORMALIZED_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            self.DENORMALIZED_FIELDS and not self._state.adding
+            and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+        ):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+# set while QuerySet.bulk_update() runs its UPDATEs through update()
+_in_bulk_update = ContextVar('in_bulk_update', default=False)
+
+
+class AuditedQuerySet(models.QuerySet):
+    """QuerySet с массовыми операциями, которые попадают в журнал действий.
+
+    Обычные update()/bulk_update()/bulk_create() обходят сигналы, а значит и
+    аудит. Методы audited_* вычисляют изменения несколькими запросами на пачку
+    и отдают все записи ActionLog одной bulk_create (см. tracker/audit.py).
+
+    Остальные подписчики сигналов тоже ничего не узнают, поэтому после любой
+    массовой записи вызывается _bulk_written(): версии данных
+    (tracker/versioning.py), журнал изменений (tracker/changes.py) и то, что
+    добавляют подклассы.
+    """
+
+    def _rows_before(self, objs=None):
+        """What a bulk write is about to change: the pks of ``objs``, or of the queryset for update()."""
+        if objs is not None:
+            return [obj.pk for obj in objs]
+        # read before the UPDATE, whose filter may use the fields it writes
+        return list(self.order_by().values_list('pk', flat=True))
+
+    def _bulk_written(self, before, objs=(), fields=None):
+        """Follow-up of a bulk write of the ``before`` rows and ``objs``; ``fields`` is None for an insert."""
+        from . import changes, versioning
+        pks = list(before) + [obj.pk for obj in objs]
+        if pks:
+            versioning.touch([self.model], using=self.db)
+        changes.record_bulk(self.model, pks, fields, using=self.db)
+
+    def update(self, **kwargs):
+        if _in_bulk_update.get():
+            # one of bulk_update()'s UPDATEs; it runs the follow-up once for all of them
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            before = self._rows_before()
+            updated = super().update(**kwargs)
+            self._bulk_written(before, fields=kwargs)
+        return updated
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        # also the write of audited_bulk_update()
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            before = self._rows_before(objs)
+            token = _in_bulk_update.set(True)
+            try:
+                updated = super().bulk_update(objs, fields, batch_size=batch_size)
+            finally:
+                _in_bulk_update.reset(token)
+            self._bulk_written(before, objs, fields)
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # also the write of audited_bulk_create()
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self._bulk_written([], objs)
+        return objs
+
+    def audited_update(self, batch_size=500, **kwargs):
+        # audit.audited_update writes through the base manager, past update() above
+        from . import audit
+        with transaction.atomic(using=self.db):
+            before = self._rows_before()
+            updated = audit.audited_update(self, batch_size=batch_size, **kwargs)
+            self._bulk_written(before, fields=kwargs)
+        return updated
+
+    def audited_bulk_update(self, objs, fields, batch_size=None):
+        from . import audit
+        return audit.audited_bulk_update(self, objs, fields, batch_size=batch_size)
+
+    def audited_bulk_create(self, objs, **kwargs):
+        from . import audit
+        return audit.audited_bulk_create(self, objs, **kwargs)
+
+
+class Car(DenormalizedFieldsMixin, TrackedFieldsMixin, models.Model):
     """Модель автомобиля"""
     CAR_MODELS = [
         ('Volvo', 'Volvo'),
@@ -71,16 +231,35 @@ class Car(models.Model):
         'Дата обновления',
         auto_now=True
     )
-    
+
+    # поддерживается tracker/pointers.py
+    current_installation = models.ForeignKey(
+        'InstallationHistory',
+        verbose_name='Текущая установка',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+
+    DENORMALIZED_FIELDS = ('current_installation',)
+
+    objects = AuditedQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Автомобиль'
         verbose_name_plural = 'Автомобили'
         ordering = ['state_number']
+        indexes = [
+            # список автомобилей: порядок по умолчанию и его keyset-страницы
+            models.Index(fields=['board_number', 'id'], name='car_board_idx'),
+        ]
 
     def __str__(self):
         return f"{self.state_number} - {self.get_model_display()}"
 
-class Location(models.Model):
+class Location(TrackedFieldsMixin, models.Model):
     """Модель для управляемого списка локаций"""
     name = models.CharField('Локация', max_length=200, unique=True)
 
@@ -135,6 +314,8 @@ class Location(models.Model):
         ('Other','Other'),
     ]
 
+    objects = AuditedQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Локация'
         verbose_name_plural = 'Локации'
@@ -143,7 +324,23 @@ class Location(models.Model):
     def __str__(self):
         return self.name
 
-class Tracker(models.Model):
+class TrackerQuerySet(AuditedQuerySet):
+    """Массовые операции над трекерами, которые обновляют индекс номеров (tracker/identifiers.py).
+
+    save() обрабатывается сигналом, а update()/bulk_update()/bulk_create()
+    сигналов не посылают.
+    """
+
+    def _bulk_written(self, before, objs=(), fields=None):
+        super()._bulk_written(before, objs, fields)
+        from . import identifiers
+        if fields is None:
+            identifiers.index_trackers([obj for obj in objs if obj.pk is not None], using=self.db)
+        elif set(fields) & set(identifiers.FIELDS):
+            identifiers.reindex(before, using=self.db)
+
+
+class Tracker(DenormalizedFieldsMixin, TrackedFieldsMixin, models.Model):
     """Модель GPS-трекера"""
     PROTOCOLS = [
         ('wialon', 'Wialon'),
@@ -151,6 +348,11 @@ class Tracker(models.Model):
         ('teltonika', 'Teltonika'),
         ('other', 'Другое'),
     ]
+
+    STATUSES = [
+        ('installed', 'Установлен'),
+        ('free', 'Не установлен'),
+    ]
     
     imei = models.CharField(
         'IMEI',
@@ -238,24 +440,102 @@ class Tracker(models.Model):
         'Дата создания',
         auto_now_add=True
     )
-    
+
+    # текущая установка и производные от неё поля; поддерживаются tracker/pointers.py
+    current_installation = models.ForeignKey(
+        'InstallationHistory',
+        verbose_name='Текущая установка',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+
+    current_car = models.ForeignKey(
+        Car,
+        verbose_name='Текущий автомобиль',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='current_trackers'
+    )
+
+    current_location_name = models.CharField(
+        'Текущая локация',
+        max_length=200,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True
+    )
+
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUSES,
+        default='free',
+        editable=False,
+        db_index=True
+    )
+
+    has_closed_installation = models.BooleanField(
+        'Есть закрытые установки',
+        default=False,
+        editable=False
+    )
+
+    DENORMALIZED_FIELDS = (
+        'current_installation', 'current_car', 'current_location_name', 'status', 'has_closed_installation',
+    )
+
+    objects = TrackerQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Трекер'
         verbose_name_plural = 'Трекеры'
         ordering = ['serial_number']
+        indexes = [
+            # список трекеров с фильтром по статусу в порядке по умолчанию
+            models.Index(fields=['status', 'serial_number', 'id'], name='tracker_status_serial_idx'),
+        ]
     
     def __str__(self):
         return f"{self.serial_number} (IMEI: {self.imei})"
 
     @property
     def current_location(self):
-        """Return the name of the location of the car where this tracker is currently active, or '-' if none."""
-        active = self.installations.filter(is_active=True).select_related('car__location').order_by('-installation_date').first()
-        if active and active.car and active.car.location:
-            return active.car.location.name
-        return '-'
+        """Name of the location of the car the tracker is currently installed on, or '-'; never queries."""
+        return self.current_location_name or '-'
+
+class InstallationHistoryQuerySet(AuditedQuerySet):
+    """Массовые операции над установками, которые обновляют текущие установки трекеров и автомобилей.
+
+    save()/delete() обрабатываются сигналами (tracker/pointers.py), а
+    update()/bulk_update()/bulk_create() сигналов не посылают.
+    """
+
+    def _rows_before(self, objs=None):
+        # with the tracker and car each row was on, for the pointer refresh
+        rows = self if objs is None else self.model._base_manager.using(self.db).filter(pk__in=[obj.pk for obj in objs])
+        return list(rows.order_by().values_list('pk', 'tracker_id', 'car_id'))
+
+    def _bulk_written(self, before, objs=(), fields=None):
+        from . import changes, counters, pointers, versioning
+        pks = [pk for pk, _, _ in before]
+        after = list(self.model._base_manager.using(self.db).filter(pk__in=pks).values_list('pk', 'tracker_id', 'car_id'))
+        rows = list(before) + after + [(obj.pk, obj.tracker_id, obj.car_id) for obj in objs]
+        pointers.refresh_trackers({tracker_id for _, tracker_id, _ in rows}, using=self.db)
+        pointers.refresh_cars({car_id for _, _, car_id in rows}, using=self.db)
+        # no per-row signals here, so recount instead of applying deltas
+        counters.reconcile(['active_installations'], using=self.db)
+        if rows:
+            versioning.touch([self.model], using=self.db)
+            changes.record(self.model, [pk for pk, _, _ in rows], using=self.db)
+
 
-class InstallationHistory(models.Model):
+class InstallationHistory(TrackedFieldsMixin, models.Model):
     """История установки трекеров на автомобили"""
     car = models.ForeignKey(
         Car,
@@ -306,15 +586,46 @@ class InstallationHistory(models.Model):
         auto_now_add=True
     )
     
+    objects = InstallationHistoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'История установки'
         verbose_name_plural = 'История установок'
         ordering = ['-installation_date']
+        indexes = [
+            # история трекера / автомобиля на их карточках, закрытые установки (pointers)
+            models.Index(fields=['tracker', 'installation_date', 'id'], name='installation_tracker_idx'),
+            models.Index(fields=['car', 'installation_date', 'id'], name='installation_car_idx'),
+            # текущая установка трекера / автомобиля (pointers); SQLite не ищет по
+            # условию «is_active» как по колонке индекса, поэтому индексы частичные
+            models.Index(
+                fields=['tracker', 'installation_date', 'id'], condition=models.Q(is_active=True),
+                name='installation_tracker_act_idx',
+            ),
+            models.Index(
+                fields=['car', 'installation_date', 'id'], condition=models.Q(is_active=True),
+                name='installation_car_act_idx',
+            ),
+            # список установок, отчёт и дашборд: сортировка и периоды по дате
+            models.Index(fields=['installation_date', 'id'], name='installation_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.car.board_number} - {self.tracker.serial_number} ({self.installation_date})"
 
-class OrderDocument(models.Model):
+    def save(self, *args, **kwargs):
+        # the row and the current-installation pointers refreshed in post_save commit together
+        # (delete() already sends post_delete inside the collector's transaction)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    def audit_repr(self):
+        """Как __str__, но без ленивой загрузки car/tracker (используется журналом действий)."""
+        car = _related_or_id(self, 'car', 'board_number')
+        tracker = _related_or_id(self, 'tracker', 'serial_number')
+        return f"{car} - {tracker} ({self.installation_date})"
+
+class OrderDocument(TrackedFieldsMixin, models.Model):
     """Модель для хранения сканов приказов"""
     car = models.ForeignKey(
         Car,
@@ -359,20 +670,203 @@ class OrderDocument(models.Model):
         auto_now_add=True
     )
     
+    objects = AuditedQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Скан документа'
         verbose_name_plural = 'Сканы документов'
         ordering = ['-issue_date']
+        indexes = [
+            # документы на карточке автомобиля
+            models.Index(fields=['car', 'issue_date'], name='document_car_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.document_type} {self.document_number or ''} - {self.car.board_number}"
+
+    def audit_repr(self):
+        """Как __str__, но без ленивой загрузки car (используется журналом действий)."""
+        return f"{self.document_type} {self.document_number or ''} - {_related_or_id(self, 'car', 'board_number')}"
     
     def filename(self):
         return os.path.basename(self.document.name)
 
 
+class TrackerIdentifier(models.Model):
+    """Нормализованный идентификатор трекера (IMEI, SIM, N card, S/N, инвентарные номера).
+
+    Значение без пробелов и разделителей, в верхнем регистре, плюс оно же
+    задом наперёд: поиск по началу и по концу номера идёт по индексу.
+    Ведётся tracker/identifiers.py при сохранении трекера.
+    """
+    tracker = models.ForeignKey(Tracker, on_delete=models.CASCADE, related_name='identifiers', verbose_name='Трекер')
+    kind = models.CharField('Поле', max_length=40)
+    value = models.CharField('Значение', max_length=100)
+    reversed_value = models.CharField('Значение задом наперёд', max_length=100)
+
+    class Meta:
+        verbose_name = 'Идентификатор трекера'
+        verbose_name_plural = 'Идентификаторы трекеров'
+        indexes = [
+            models.Index(fields=['kind', 'value'], name='identifier_value_idx'),
+            models.Index(fields=['kind', 'reversed_value'], name='identifier_reversed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}: {self.value}'
+
+
+class TrackerIdentifierGram(models.Model):
+    """Триграмма нормализованного идентификатора: поиск по любой части номера"""
+    tracker = models.ForeignKey(Tracker, on_delete=models.CASCADE, related_name='+', verbose_name='Трекер')
+    kind = models.CharField('Поле', max_length=40)
+    gram = models.CharField('Триграмма', max_length=3)
+
+    class Meta:
+        verbose_name = 'Триграмма идентификатора'
+        verbose_name_plural = 'Триграммы идентификаторов'
+        indexes = [
+            models.Index(fields=['gram', 'kind', 'tracker'], name='identifier_gram_idx'),
+        ]
+
+
+class Counter(models.Model):
+    """Готовые итоги для дашборда и отчётов (число автомобилей, трекеров и т.д.).
+
+    Меняются на +/-N сигналами моделей в той же транзакции (tracker/counters.py),
+    поэтому страницы не выполняют COUNT. Команда reconcile_counters
+    периодически сверяет их с настоящими значениями.
+    """
+    name = models.CharField('Счётчик', max_length=50, unique=True)
+    value = models.BigIntegerField('Значение', default=0)
+    reconciled_at = models.DateTimeField('Сверен', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class DataVersion(models.Model):
+    """Номер версии данных одной модели (car, tracker, location, installationhistory).
+
+    Увеличивается один раз на каждую зафиксированную транзакцию, изменившую
+    модель (tracker/versioning.py); по нему проверяется, не устарели ли
+    готовые выгрузки.
+    """
+    name = models.CharField('Модель', max_length=50, unique=True)
+    version = models.BigIntegerField('Версия', default=0)
+    changed_at = models.DateTimeField('Изменена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка (tracker/exports.py).
+
+    Запрос ставит задание в очередь, файл строит команда run_export_worker.
+    Готовый файл отдаётся повторно для тех же фильтров, пока версия данных
+    не изменилась.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    kind = models.CharField('Выгрузка', max_length=50)
+    params = models.JSONField('Фильтры', default=dict)
+    key = models.CharField('Ключ', max_length=32, db_index=True)
+    status = models.CharField('Статус', max_length=10, choices=STATUSES, default=PENDING, db_index=True)
+    data_version = models.CharField('Версия данных', max_length=255, blank=True)
+    progress = models.PositiveIntegerField('Обработано строк', default=0)
+    total = models.PositiveIntegerField('Всего строк', null=True, blank=True)
+    file = models.FileField('Файл', upload_to='exports/', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    started_at = models.DateTimeField('Начато', null=True, blank=True)
+    heartbeat_at = models.DateTimeField('Последний отчёт', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка'
+        verbose_name_plural = 'Выгрузки'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.get_status_display()})'
+
+
+class ChangeEvent(models.Model):
+    """Журнал изменений для синхронизации внешних систем (/tracker/api/changes/).
+
+    Каждая запись или удаление автомобиля, трекера и установки добавляет
+    строку в той же транзакции (tracker/changes.py); seq растёт монотонно и
+    служит курсором. Старые записи удаляет команда prune_changes.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTIONS = [
+        (UPSERT, 'Создание/изменение'),
+        (DELETE, 'Удаление'),
+    ]
+
+    seq = models.BigAutoField('Номер', primary_key=True)
+    model = models.CharField('Модель', max_length=50)
+    object_id = models.PositiveBigIntegerField('ID объекта')
+    action = models.CharField('Действие', max_length=10, choices=ACTIONS)
+    created_at = models.DateTimeField('Время', default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Изменения'
+        ordering = ['seq']
+
+    def __str__(self):
+        return f'#{self.seq} {self.model} {self.object_id} {self.action}'
+
+
+class ChangeLogState(models.Model):
+    """До какого seq журнал изменений уже очищен (единственная строка с pk=1).
+
+    Записывается командой prune_changes в той же транзакции, что и удаление;
+    по нему changes.expired() отличает очистку от пропусков в нумерации seq.
+    """
+    pruned_seq = models.BigIntegerField('Очищен до номера', default=0)
+
+    class Meta:
+        verbose_name = 'Состояние журнала изменений'
+        verbose_name_plural = 'Состояние журнала изменений'
+
+    def __str__(self):
+        return f'pruned up to #{self.pruned_seq}'
+
+
 # --- Audit log model ---
+import json
+from contextlib import contextmanager
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 try:
@@ -382,6 +876,30 @@ except Exception:
     # For older Django, fallback to TextField
     JSONField = None
 
+class ActionLogQuerySet(models.QuerySet):
+    def purge(self, batch_size=1000, limit=None):
+        """Delete matching rows oldest first in bounded batches.
+
+        Rows are removed by primary key without loading instances or sending
+        signals, and ActionLogStats is decremented in the same transaction.
+        Returns the number of deleted rows.
+        """
+        deleted = 0
+        while limit is None or deleted < limit:
+            size = batch_size if limit is None else min(batch_size, limit - deleted)
+            batch = list(self.order_by('timestamp', 'id').values_list('id', 'size')[:size])
+            if not batch:
+                break
+            ActionLog.delete_rows(batch)
+            deleted += len(batch)
+        return deleted
+
+    def delete(self):
+        """Delete through purge(), so ActionLogStats follows plain ``.delete()`` calls too."""
+        deleted = self.purge()
+        return deleted, {self.model._meta.label: deleted}
+
+
 class ActionLog(models.Model):
     ACTIONS = [
         ('create', 'Create'),
@@ -406,93 +924,194 @@ class ActionLog(models.Model):
     object_repr = models.CharField('Представление объекта', max_length=255)
     action = models.CharField('Действие', max_length=10, choices=ACTIONS)
     changes = JSONField('Изменения', null=True, blank=True) if JSONField else models.TextField('Изменения (JSON)', null=True, blank=True)
-    timestamp = models.DateTimeField('Время', auto_now_add=True)
+    # set when the event happens, not when the write-behind queue flushes it (see tracker/audit.py)
+    timestamp = models.DateTimeField('Время', default=timezone.now, editable=False, db_index=True)
     request_path = models.CharField('Путь запроса', max_length=200, blank=True, null=True)
     ip_address = models.CharField('IP адрес', max_length=100, blank=True, null=True)
+    size = models.PositiveIntegerField('Размер, байт', default=0, editable=False)
+    # компактная форма changes (AUDIT_COMPACT_CHANGES, см. tracker/compact.py); changes тогда пустое
+    changes_packed = models.BinaryField('Изменения (сжатые)', null=True, blank=True, editable=False)
+
+    objects = ActionLogQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Лог действий'
         verbose_name_plural = 'Логи действий'
         ordering = ['-timestamp']
+        indexes = [
+            # история одного объекта (ObjectHistoryView)
+            models.Index(fields=['content_type', 'object_id', 'timestamp'], name='actionlog_object_ts_idx'),
+        ]
 
     @classmethod
-    def trim_logs(cls, max_bytes: int = 2 * 1024 * 1024):
-        """Trim oldest ActionLog entries while estimated size exceeds max_bytes.
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        packed = instance.__dict__.get('changes_packed')
+        if packed is not None:
+            from . import compact
+            instance.changes = compact.unpack(packed)
+        return instance
 
-        Strategy:
-        - If using sqlite with a filesystem DB, use DB file size as approximation.
-        - Otherwise estimate total size by summing JSON-serialized size of each row (object_repr + changes + request_path + ip_address) and delete oldest rows until under limit.
-        """
-        import os
-        import json
-        from django.conf import settings
-
-        # Try to get actual sqlite DB file size when possible
-        db_settings = getattr(settings, 'DATABASES', {}).get('default', {})
-        engine = db_settings.get('ENGINE', '')
-        name = db_settings.get('NAME', '')
-        size = None
+    def compute_size(self):
+        """Estimated storage size of the row: JSON of its variable-length columns."""
+        packed = self.changes_packed
         try:
-            if 'sqlite' in engine and name and os.path.exists(name):
-                size = os.path.getsize(name)
+            return len(json.dumps({
+                'object_repr': self.object_repr,
+                'changes': self.changes if packed is None else None,
+                'request_path': self.request_path,
+                'ip_address': self.ip_address,
+            }, ensure_ascii=False, default=str).encode('utf-8')) + (len(packed) if packed is not None else 0)
         except Exception:
-            size = None
-
-        # Fallback: estimate total size from rows
-        sizes = []
-        if size is None:
-            total = 0
-            for r in cls.objects.order_by('timestamp').values('id', 'object_repr', 'changes', 'request_path', 'ip_address'):
-                try:
-                    s = json.dumps({
-                        'object_repr': r.get('object_repr'),
-                        'changes': r.get('changes'),
-                        'request_path': r.get('request_path'),
-                        'ip_address': r.get('ip_address'),
-                    }, ensure_ascii=False, default=str).encode('utf-8')
-                    sz = len(s)
-                except Exception:
-                    sz = 0
-                sizes.append((r['id'], sz))
-                total += sz
-            size = total
-
-        if size <= max_bytes:
+            return 0
+
+    @classmethod
+    @contextmanager
+    def packed(cls, entries):
+        """Store ``changes`` of unsaved entries in compact form while they are written.
+
+        Inside the block ``changes`` is None and ``changes_packed`` is set (when
+        AUDIT_COMPACT_CHANGES is on); afterwards the dicts are put back, so the
+        saved instances read the same as before.
+        """
+        if not getattr(settings, 'AUDIT_COMPACT_CHANGES', False):
+            yield
             return
+        from . import compact
+        unpacked = []
+        for entry in entries:
+            if entry.changes:
+                unpacked.append((entry, entry.changes))
+                entry.changes_packed = compact.pack(entry.content_type_id, entry.changes)
+                entry.changes = None
+        try:
+            yield
+        finally:
+            for entry, changes in unpacked:
+                entry.changes = changes
 
-        # Delete oldest entries until size <= max_bytes
-        if sizes:
-            # we have per-row sizes from oldest to newest
-            to_delete = []
-            for id_, sz in sizes:
-                to_delete.append(id_)
-                size -= sz
-                if size <= max_bytes:
-                    break
-            if to_delete:
-                cls.objects.filter(id__in=to_delete).delete()
-        else:
-            # As a last resort delete oldest rows in batches
-            while size > max_bytes:
-                oldest = list(cls.objects.order_by('timestamp')[:100])
-                if not oldest:
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with ActionLog.packed([self] if adding else []):
+            if not self.size:
+                self.size = self.compute_size()
+            super().save(*args, **kwargs)
+        if adding:
+            from . import fts
+            ActionLogStats.add(rows=1, size=self.size)
+            fts.index([self])
+
+    def delete(self, using=None, keep_parents=False):
+        return ActionLog.objects.using(using or self._state.db).filter(pk=self.pk).delete()
+
+    @classmethod
+    def delete_rows(cls, rows):
+        """Fast-delete ``rows`` given as (id, size) pairs and update the running totals."""
+        from django.db import transaction
+        with transaction.atomic():
+            # the base QuerySet.delete(), not the purge() override: ActionLog has no dependents
+            # and no delete signal listeners, so the collector issues one DELETE by pk
+            models.QuerySet.delete(cls.objects.filter(pk__in=[id_ for id_, _ in rows]))
+            ActionLogStats.add(rows=-len(rows), size=-sum(sz for _, sz in rows))
+
+    @classmethod
+    def trim_logs(cls, max_bytes=None, batch_size=1000):
+        """Delete the oldest entries while the tracked total size exceeds max_bytes.
+
+        The check is O(1): it reads the running totals in ActionLogStats instead
+        of measuring the table. Only when the budget is exceeded are the oldest
+        rows removed, in batches of ``batch_size`` via the timestamp index.
+        Returns the number of deleted rows.
+        """
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'AUDIT_LOG_MAX_BYTES', 2 * 1024 * 1024)
+        excess = ActionLogStats.current().size - max_bytes
+        deleted = 0
+        while excess > 0:
+            batch = list(cls.objects.order_by('timestamp', 'id').values_list('id', 'size')[:batch_size])
+            if not batch:
+                break
+            rows = []
+            for id_, sz in batch:
+                rows.append((id_, sz))
+                excess -= sz
+                if excess <= 0:
                     break
-                sub = 0
-                ids = []
-                for o in oldest:
-                    try:
-                        s = json.dumps({
-                            'object_repr': o.object_repr,
-                            'changes': o.changes,
-                            'request_path': o.request_path,
-                            'ip_address': o.ip_address,
-                        }, ensure_ascii=False, default=str).encode('utf-8')
-                        sub += len(s)
-                    except Exception:
-                        pass
-                    ids.append(o.id)
-                cls.objects.filter(id__in=ids).delete()
-                size -= sub
+            cls.delete_rows(rows)
+            deleted += len(rows)
+        return deleted
 
     def __str__(self):
         return f"{self.timestamp} - {self.user or 'system'} - {self.action} - {self.object_repr}"
+
+
+class ActionLogCheckpoint(models.Model):
+    """Снимок объекта, собранный из журнала действий (для восстановления на дату, tracker/history.py)"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name='Тип объекта')
+    object_id = models.CharField('ID объекта', max_length=255)
+    # position of the last folded ActionLog entry: (timestamp, log_id)
+    timestamp = models.DateTimeField('Время')
+    log_id = models.BigIntegerField('Последняя запись журнала')
+    # None: the object was deleted at this point
+    state = JSONField('Состояние', null=True, blank=True) if JSONField else models.TextField('Состояние (JSON)', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Снимок объекта'
+        verbose_name_plural = 'Снимки объектов'
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'timestamp'], name='checkpoint_object_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type_id}:{self.object_id} @ {self.timestamp}'
+
+
+class ActionLogField(models.Model):
+    """Имя поля в компактном формате журнала (AUDIT_COMPACT_CHANGES): номер вместо строки"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name='Тип объекта')
+    name = models.CharField('Поле', max_length=100)
+
+    class Meta:
+        verbose_name = 'Поле журнала действий'
+        verbose_name_plural = 'Поля журнала действий'
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'name'], name='actionlogfield_unique_name'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type_id}:{self.name}'
+
+
+class ActionLogStats(models.Model):
+    """Текущие итоги по ActionLog (число строк и суммарный размер).
+
+    Обновляются при вставке и удалении логов, поэтому проверка бюджета
+    хранения не требует сканировать таблицу. Единственная строка с pk=1.
+    """
+    rows = models.BigIntegerField('Записей', default=0)
+    size = models.BigIntegerField('Размер, байт', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика логов'
+        verbose_name_plural = 'Статистика логов'
+
+    @classmethod
+    def current(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj
+
+    @classmethod
+    def add(cls, rows=0, size=0):
+        qs = cls.objects.filter(pk=1)
+        if not qs.update(rows=models.F('rows') + rows, size=models.F('size') + size):
+            cls.current()
+            qs.update(rows=models.F('rows') + rows, size=models.F('size') + size)
+
+    @classmethod
+    def recount(cls):
+        """Rebuild the totals from the table (for scheduled reconciliation)."""
+        totals = ActionLog.objects.aggregate(rows=models.Count('id'), size=models.Sum('size'))
+        obj, _ = cls.objects.update_or_create(
+            pk=1, defaults={'rows': totals['rows'] or 0, 'size': totals['size'] or 0}
+        )
+        return obj
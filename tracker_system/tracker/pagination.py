@@ -0,0 +1,198 @@
+"""Keyset (seek) pagination.
+
+Unlike Django's Paginator it never runs COUNT(*) or OFFSET: each page is a
+range query that continues from the sort key of the last row shown, so the
+cost of a page does not depend on how deep it is or on the table size as long
+as the ordering is served by an index.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _resolve(model, path):
+    """Model fields along a lookup path such as ``'location__name'`` or ``'pk'``."""
+    fields = []
+    opts = model._meta
+    for part in path.split('__'):
+        field = opts.pk if part == 'pk' else opts.get_field(part)
+        fields.append(field)
+        if field.is_relation:
+            opts = field.related_model._meta
+    return fields
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` by ``ordering`` (e.g. ``('-timestamp', '-id')``).
+
+    Ordering entries are field names, lookups through forward relations
+    (``'location__name'``, annotated under an alias) or annotations already on
+    the queryset, and the last one must be
+    unique so every row has a distinct key. Nullable columns are ordered with
+    NULL as the smallest value on every backend, so rows with NULL keys are
+    neither skipped nor repeated.
+    Cursors are opaque url-safe strings; ``page(None)`` is the first page.
+    """
+
+    def __init__(self, queryset, ordering, per_page=50):
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = []
+        annotations = {}
+        for i, name in enumerate(self.ordering):
+            path = name.lstrip('-')
+            alias = path
+            if path in queryset.query.annotations:
+                # e.g. a search rank; assumed not NULL
+                field = queryset.query.annotations[path].output_field
+                self.fields.append((alias, name.startswith('-'), False, field))
+                continue
+            chain = _resolve(queryset.model, path)
+            if '__' in path:
+                alias = f'_keyset_{i}'
+                annotations[alias] = F(path)
+            nullable = any(f.null for f in chain)
+            self.fields.append((alias, name.startswith('-'), nullable, chain[-1]))
+        self.queryset = queryset.annotate(**annotations) if annotations else queryset
+
+    def page(self, cursor=None):
+        backwards, values = self.decode(cursor) if cursor else (False, None)
+        qs = self.queryset
+        if values is not None:
+            qs = qs.filter(self._seek(values, backwards))
+        rows = list(qs.order_by(*self._order_by(backwards))[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        # coming from a cursor means there is something on the other side of it
+        has_next = values is not None if backwards else more
+        has_previous = more if backwards else values is not None
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode(rows[-1], False) if has_next and rows else None,
+            previous_cursor=self.encode(rows[0], True) if has_previous and rows else None,
+        )
+
+    def _order_by(self, backwards):
+        for alias, desc, nullable, _ in self.fields:
+            desc = desc != backwards
+            if not nullable:
+                yield f'-{alias}' if desc else alias
+            else:
+                yield F(alias).desc(nulls_last=True) if desc else F(alias).asc(nulls_first=True)
+
+    def _seek(self, values, backwards):
+        # (a, b, c) > (x, y, z) spelled out as a > x OR (a = x AND b > y) OR ...,
+        # with NULL sorting below every value
+        condition = Q()
+        equal = Q()
+        for (alias, desc, nullable, _), value in zip(self.fields, values):
+            ascending = desc == backwards
+            if value is None:
+                step = Q(**{f'{alias}__isnull': False}) if ascending else None
+                same = Q(**{f'{alias}__isnull': True})
+            else:
+                step = Q(**{f"{alias}__{'gt' if ascending else 'lt'}": value})
+                if nullable and not ascending:
+                    step |= Q(**{f'{alias}__isnull': True})
+                same = Q(**{alias: value})
+            if step is not None:
+                condition |= equal & step
+            equal &= same
+        return condition
+
+    def _key(self, obj):
+        # model instances, or dicts from a values() queryset
+        if isinstance(obj, dict):
+            return [obj[alias] for alias, _, _, _ in self.fields]
+        return [getattr(obj, alias) for alias, _, _, _ in self.fields]
+
+    def encode(self, obj, backwards):
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in self._key(obj)]
+        raw = json.dumps(['p' if backwards else 'n', values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw.decode('utf-8'))
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            values = [
+                None if value is None else field.to_python(value)
+                for (_, _, _, field), value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError, binascii.Error, UnicodeDecodeError) as e:
+            raise InvalidCursor(cursor) from e
+        return direction == 'p', values
+
+
+class KeysetPaginationMixin:
+    """ListView paginated by cursor (``?cursor=``) instead of ``?page=``.
+
+    The keyset is the queryset's ordering (as left by the view's ``sort``
+    whitelist, or the model's Meta.ordering) plus the pk as a tie-breaker.
+    The total is optional: ``total_count`` in the context is evaluated only if
+    the template renders it, and cached for ``LIST_COUNT_CACHE_TIMEOUT``
+    seconds per filter combination (None in the setting disables it).
+    """
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(name.lstrip('-') in ('pk', queryset.model._meta.pk.name) for name in ordering):
+            ordering.append('-pk' if ordering and ordering[0].startswith('-') else 'pk')
+        paginator = KeysetPaginator(queryset, ordering, per_page=page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor') or None)
+        except InvalidCursor:
+            raise Http404('Неверный курсор страницы')
+        return paginator, page, page.object_list, page.has_other_pages
+
+    def get_total_count(self):
+        queryset = self.object_list.order_by()
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}|{params!r}'.encode('utf-8')).hexdigest()
+        key = f'list-count:{queryset.model._meta.label_lower}:{digest}'
+        return cache.get_or_set(key, queryset.count, getattr(settings, 'LIST_COUNT_CACHE_TIMEOUT', 60))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if getattr(settings, 'LIST_COUNT_CACHE_TIMEOUT', 60) is not None:
+            context['total_count'] = self.get_total_count
+        return context
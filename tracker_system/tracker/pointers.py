@@ -0,0 +1,155 @@
+"""Denormalized current-installation pointers.
+
+A tracker's current installation is its active InstallationHistory row with
+the latest ``installation_date`` (ties broken by id). Tracker keeps it in
+``current_installation``, together with ``current_car``, the name of that
+car's location (``current_location_name``), ``status`` and whether it has any
+closed installation (``has_closed_installation``, behind the
+'inactive_trackers' counter); Car keeps its own ``current_installation``. List pages, sorting by location and filtering by
+status then read a single table.
+
+The columns are recomputed set-based, with one UPDATE per table, from:
+
+* post_save / post_delete of InstallationHistory (inside the same transaction,
+  see ``InstallationHistory.save``), including the previous tracker and car
+  when an installation is moved;
+* InstallationHistoryQuerySet's update(), bulk_update(), bulk_create() and
+  audited_update();
+* post_save of Car (location changed) and post_save / post_delete of Location
+  (renamed or removed).
+
+They are written with ``QuerySet.update()``, so they are not audited and never
+clobbered by ``save()`` of a stale instance (DenormalizedFieldsMixin); the
+rewritten tables are marked changed for tracker/versioning.py.
+``rebuild_installation_pointers`` recomputes everything.
+"""
+from django.db import transaction
+from django.db.models import Case, Exists, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save, post_save, post_delete
+from . import counters, search, versioning
+from .models import Car, InstallationHistory, Location, Tracker
+
+# ids per UPDATE ... WHERE id IN (...), below SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+
+def _active(**lookups):
+    return InstallationHistory.objects.filter(is_active=True, **lookups).order_by('-installation_date', '-id')
+
+
+def _in_chunks(queryset, ids):
+    if ids is None:
+        yield queryset
+        return
+    ids = sorted(i for i in ids if i is not None)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield queryset.filter(pk__in=ids[start:start + CHUNK_SIZE])
+
+
+def refresh_trackers(ids=None, using=None):
+    """Recompute the pointers of trackers ``ids`` (all trackers when None). Returns the number of rows updated."""
+    active = _active(tracker=OuterRef('pk'))
+    closed = InstallationHistory.objects.filter(tracker=OuterRef('pk'), is_active=False)
+    updated = 0
+    flipped = 0
+    for queryset in _in_chunks(Tracker._base_manager.using(using), ids):
+        # the 'inactive_trackers' counter follows has_closed_installation of active trackers
+        flagged = queryset.filter(is_active=True, has_closed_installation=True)
+        before = flagged.count()
+        updated += queryset.update(
+            current_installation=Subquery(active.values('pk')[:1]),
+            current_car=Subquery(active.values('car_id')[:1]),
+            current_location_name=Coalesce(Subquery(active.values('car__location__name')[:1]), Value('')),
+            status=Case(When(Exists(active), then=Value('installed')), default=Value('free')),
+            has_closed_installation=Exists(closed),
+        )
+        flipped += flagged.count() - before
+    counters.add('inactive_trackers', flipped, using=using)
+    # the search index carries current_location_name
+    search.TRACKERS.reindex(ids, using=using or 'default')
+    if updated:
+        versioning.touch([Tracker], using=using or 'default')
+    return updated
+
+
+def refresh_cars(ids=None, using=None):
+    """Recompute ``Car.current_installation`` for cars ``ids`` (all cars when None). Returns the number of rows updated."""
+    active = _active(car=OuterRef('pk'))
+    updated = 0
+    for queryset in _in_chunks(Car._base_manager.using(using), ids):
+        updated += queryset.update(current_installation=Subquery(active.values('pk')[:1]))
+    if updated:
+        versioning.touch([Car], using=using or 'default')
+    return updated
+
+
+def rebuild(using=None):
+    """Recompute every pointer; returns ``(trackers, cars)`` row counts."""
+    with transaction.atomic(using=using):
+        return refresh_trackers(using=using), refresh_cars(using=using)
+
+
+def _loaded(instance, attname):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    return loaded.get(attname)
+
+
+def _installation_pre_save(sender, instance, using=None, **kwargs):
+    # where the installation was before this save: the values it was loaded with, or a
+    # lookup for instances built by hand with a pk or loaded with only()/defer()
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if instance.pk is None:
+        previous = None
+    elif 'tracker_id' in loaded and 'car_id' in loaded:
+        previous = (loaded['tracker_id'], loaded['car_id'])
+    else:
+        previous = sender._base_manager.using(using).filter(pk=instance.pk).values_list('tracker_id', 'car_id').first()
+    instance._pointer_previous = previous or (None, None)
+
+
+def _installation_post_save(sender, instance, using=None, **kwargs):
+    previous_tracker, previous_car = getattr(instance, '_pointer_previous', (None, None))
+    refresh_trackers({instance.tracker_id, previous_tracker}, using=using)
+    refresh_cars({instance.car_id, previous_car}, using=using)
+
+
+def _installation_post_delete(sender, instance, using=None, **kwargs):
+    refresh_trackers({instance.tracker_id}, using=using)
+    refresh_cars({instance.car_id}, using=using)
+
+
+def _car_pre_save(sender, instance, **kwargs):
+    instance._pointer_location_changed = (
+        instance._state.adding or _loaded(instance, 'location_id') != instance.location_id
+    )
+
+
+def _car_post_save(sender, instance, created, using=None, **kwargs):
+    if created or not getattr(instance, '_pointer_location_changed', True):
+        return
+    ids = Tracker._base_manager.using(using).filter(current_car=instance).values_list('pk', flat=True)
+    refresh_trackers(list(ids), using=using)
+
+
+def _location_post_save(sender, instance, created, using=None, **kwargs):
+    if created:
+        return
+    ids = Tracker._base_manager.using(using).filter(current_car__location=instance).values_list('pk', flat=True)
+    refresh_trackers(list(ids), using=using)
+
+
+def _location_post_delete(sender, instance, using=None, **kwargs):
+    # the cars' location is already SET_NULL; their trackers still show the old name
+    ids = Tracker._base_manager.using(using).filter(current_location_name=instance.name).values_list('pk', flat=True)
+    refresh_trackers(list(ids), using=using)
+
+
+def connect():
+    pre_save.connect(_installation_pre_save, sender=InstallationHistory, dispatch_uid='pointers_installation_pre_save')
+    post_save.connect(_installation_post_save, sender=InstallationHistory, dispatch_uid='pointers_installation_post_save')
+    post_delete.connect(_installation_post_delete, sender=InstallationHistory, dispatch_uid='pointers_installation_post_delete')
+    pre_save.connect(_car_pre_save, sender=Car, dispatch_uid='pointers_car_pre_save')
+    post_save.connect(_car_post_save, sender=Car, dispatch_uid='pointers_car_post_save')
+    post_save.connect(_location_post_save, sender=Location, dispatch_uid='pointers_location_post_save')
+    post_delete.connect(_location_post_delete, sender=Location, dispatch_uid='pointers_location_post_delete')
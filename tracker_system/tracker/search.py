@@ -0,0 +1,147 @@
+"""SQLite FTS5 search over cars and trackers.
+
+``tracker_car_fts`` and ``tracker_tracker_fts`` hold one row per Car/Tracker
+(rowid = pk) with the searchable text: the model's own fields, its comment and
+the location name (the car's location; for a tracker, the location of its
+current car, see tracker/pointers.py). Rows are rebuilt from the tables with
+one ``INSERT OR REPLACE ... SELECT`` by signals on Car, Tracker and Location
+and after every pointer refresh; ``rebuild_search_index`` rebuilds everything.
+
+``search()`` narrows a queryset to the matching rows and annotates
+``search_rank`` (FTS5 bm25, lower is better). Without FTS5 the tables do not
+exist and the list views fall back to ``icontains`` filters. FTS matches
+words by prefix only, while numbers are searched by their tail as often as
+not: the list views pass terms with digits to ``search(also=...)`` with a
+substring match of the number columns (tracker/identifiers.py for trackers,
+``icontains`` on the plate and board numbers for cars).
+"""
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import pre_migrate, post_migrate, post_save, post_delete
+from .fts import match_query
+from .models import Car, Location, Tracker
+
+
+class SearchIndex:
+    def __init__(self, model, table, columns, select):
+        self.model = model
+        self.table = table
+        self.columns = columns
+        # SELECT of (pk, *columns) from the model's table, aliased as "t"
+        self.select = select
+
+    def reindex(self, ids=None, using='default'):
+        """(Re)write the rows of ``ids`` (all rows when None)."""
+        if not available(using):
+            return
+        sql = f'INSERT OR REPLACE INTO {self.table} (rowid, {", ".join(self.columns)}) {self.select}'
+        with connections[using].cursor() as cursor:
+            if ids is None:
+                cursor.execute(f'DELETE FROM {self.table}')
+                cursor.execute(sql)
+                return
+            ids = sorted(i for i in ids if i is not None)
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cursor.execute(f'{sql} WHERE t.id IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+    def remove(self, ids, using='default'):
+        ids = list(ids)
+        if not ids or not available(using):
+            return
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({", ".join(["%s"] * len(ids))})', ids)
+
+    def search(self, queryset, term, also=None):
+        """``queryset`` narrowed to matches of ``term`` and annotated with ``search_rank``, or None.
+
+        ``also`` (a Q) adds rows found some other way; they rank after every full-text match.
+        """
+        query = match_query(term)
+        if not query or not available(queryset.db):
+            return None
+        pk = f'"{self.model._meta.db_table}"."{self.model._meta.pk.column}"'
+        matches = Q(pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (query,)))
+        # bm25 ranks are negative, so 0 puts the rows found only through ``also`` last
+        return queryset.filter(matches | also if also is not None else matches).annotate(search_rank=RawSQL(
+            f'COALESCE((SELECT rank FROM {self.table} WHERE {self.table} MATCH %s AND rowid = {pk}), 0)', (query,),
+            output_field=FloatField(),
+        ))
+
+
+CARS = SearchIndex(
+    Car, 'tracker_car_fts', ('state_number', 'board_number', 'model', 'location', 'comment'),
+    "SELECT t.id, t.state_number, COALESCE(t.board_number, ''), t.model, COALESCE(l.name, ''), COALESCE(t.comment, '') "
+    "FROM tracker_car t LEFT JOIN tracker_location l ON l.id = t.location_id",
+)
+
+TRACKERS = SearchIndex(
+    Tracker, 'tracker_tracker_fts',
+    ('imei', 'serial_number', 'inventory_number_tracker', 'inventory_number_antenna', 'model',
+     'holder_number', 'sim_old', 'n_card', 'sim_new', 'location', 'comment'),
+    "SELECT t.id, t.imei, t.serial_number, t.inventory_number_tracker, COALESCE(t.inventory_number_antenna, ''), "
+    "t.model, COALESCE(t.holder_number, ''), COALESCE(t.sim_old, ''), COALESCE(t.n_card, ''), "
+    "COALESCE(t.sim_new, ''), t.current_location_name, COALESCE(t.comment, '') FROM tracker_tracker t",
+)
+
+INDEXES = {Car: CARS, Tracker: TRACKERS}
+
+_available = {}
+
+
+def available(using='default'):
+    """Whether the FTS tables exist on ``using`` (checked once per process, reset around migrate)."""
+    if using not in _available:
+        connection = connections[using]
+        try:
+            _available[using] = connection.vendor == 'sqlite' and CARS.table in connection.introspection.table_names()
+        except Exception:
+            return False
+    return _available[using]
+
+
+def _reset(**kwargs):
+    _available.clear()
+
+pre_migrate.connect(_reset, dispatch_uid='search_reset_pre_migrate')
+post_migrate.connect(_reset, dispatch_uid='search_reset_post_migrate')
+
+
+def rebuild(using='default'):
+    for index in INDEXES.values():
+        index.reindex(using=using)
+
+
+def _saved(sender, instance, using=None, **kwargs):
+    INDEXES[sender].reindex([instance.pk], using=using or 'default')
+
+
+def _deleted(sender, instance, using=None, **kwargs):
+    INDEXES[sender].remove([instance.pk], using=using or 'default')
+
+
+def _location_saved(sender, instance, created, using=None, **kwargs):
+    if not created:
+        using = using or 'default'
+        CARS.reindex(list(instance.cars.using(using).values_list('pk', flat=True)), using=using)
+
+
+def _location_deleted(sender, instance, using=None, **kwargs):
+    # the cars' location is already SET_NULL; refresh the rows still carrying the name
+    using = using or 'default'
+    if not available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {CARS.table} WHERE location = %s', [instance.name])
+        ids = [row[0] for row in cursor.fetchall()]
+    CARS.reindex(ids, using=using)
+
+
+def connect():
+    for model in INDEXES:
+        uid = model._meta.model_name
+        post_save.connect(_saved, sender=model, dispatch_uid=f'search_saved.{uid}')
+        post_delete.connect(_deleted, sender=model, dispatch_uid=f'search_deleted.{uid}')
+    post_save.connect(_location_saved, sender=Location, dispatch_uid='search_location_saved')
+    post_delete.connect(_location_deleted, sender=Location, dispatch_uid='search_location_deleted')
@@ -19,7 +19,8 @@ def sort_url(context, field_name):
     else:
         new = field_name
     params['sort'] = new
-    params.pop('page', None)
+    # a cursor belongs to one ordering; a new sort starts from the first page
+    params.pop('cursor', None)
     qs = params.urlencode()
     return f'?{qs}' if qs else ''
 
@@ -37,12 +38,13 @@ def sort_indicator(context, field_name):
     return ''
 
 @register.simple_tag(takes_context=True)
-def url_with_page(context, page_num):
+def url_with_cursor(context, cursor):
+    """Query string for the page at ``cursor`` (see tracker/pagination.py), preserving other GET params."""
     request = context.get('request')
     if not request:
-        return f'?page={page_num}'
+        return f'?cursor={cursor}'
     params = request.GET.copy()
-    params['page'] = page_num
+    params['cursor'] = cursor
     qs = params.urlencode()
     return f'?{qs}' if qs else ''
 
@@ -0,0 +1,100 @@
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.urls import reverse
+from tracker import archive
+from tracker.models import ActionLog, ActionLogStats, Car
+
+class ActionLogArchiveTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        override = override_settings(AUDIT_ARCHIVE_DIR=self.dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        User = get_user_model()
+        self.user = User.objects.create_superuser('arch', 'arch@example.com', 'pw')
+        ct = ContentType.objects.get_for_model(Car)
+        ActionLog.objects.all().delete()
+        ActionLogStats.recount()
+        for month, day in [(1, 5), (1, 20), (2, 3), (3, 1)]:
+            ActionLog.objects.create(
+                user=self.user, content_type=ct, object_id=str(month * 100 + day), object_repr=f'car {month}-{day}',
+                action='update', changes={'comment': {'old': 'a', 'new': 'b'}},
+                timestamp=datetime(2024, month, day, 12, tzinfo=dt_timezone.utc),
+            )
+
+    def test_rows_are_moved_into_monthly_segments(self):
+        moved = archive.archive_before(datetime(2024, 3, 1, tzinfo=dt_timezone.utc), batch_size=2)
+        self.assertEqual(moved, 3)
+        self.assertEqual(list(ActionLog.objects.values_list('object_repr', flat=True)), ['car 3-1'])
+        self.assertEqual(ActionLogStats.current().rows, 1)
+        self.assertEqual(archive.months(), ['2024-01', '2024-02'])
+        segment, index = archive._paths('2024-01')
+        # a plain multi-member gzip file
+        lines = gzip.decompress(segment.read_bytes()).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(l)['object_repr'] for l in lines], ['car 1-5', 'car 1-20'])
+        self.assertEqual(json.loads(lines[0])['user'], 'arch')
+        self.assertEqual(len(json.loads(index.read_text())['members']), 1)
+        self.assertEqual(archive.archived_until(), datetime(2024, 2, 3, 12, tzinfo=dt_timezone.utc))
+
+    def test_read_filters_by_time_range(self):
+        archive.archive_before(datetime(2024, 4, 1, tzinfo=dt_timezone.utc), batch_size=1)
+        since = datetime(2024, 1, 10, tzinfo=dt_timezone.utc)
+        until = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual([r['object_repr'] for r in archive.read(since, until)], ['car 1-20', 'car 2-3'])
+
+    def test_unindexed_tail_is_dropped_on_next_append(self):
+        archive.archive_before(datetime(2024, 1, 10, tzinfo=dt_timezone.utc))
+        segment, _ = archive._paths('2024-01')
+        with open(segment, 'ab') as f:
+            f.write(gzip.compress(b'{"partial": true}\n'))
+        archive.archive_before(datetime(2024, 2, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual([r['object_repr'] for r in archive.read()], ['car 1-5', 'car 1-20'])
+        self.assertEqual(len(gzip.decompress(segment.read_bytes()).splitlines()), 2)
+
+    def test_rerun_after_a_failed_delete_does_not_duplicate(self):
+        cutoff = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        # both months are appended and indexed, then the delete fails
+        with mock.patch.object(ActionLog, 'delete_rows', side_effect=RuntimeError('killed')):
+            with self.assertRaises(RuntimeError):
+                archive.archive_before(cutoff)
+        self.assertEqual(ActionLog.objects.count(), 4)
+        self.assertEqual(archive.archive_before(cutoff), 3)
+        self.assertEqual([r['object_repr'] for r in archive.read()], ['car 1-5', 'car 1-20', 'car 2-3'])
+        self.assertEqual(list(ActionLog.objects.values_list('object_repr', flat=True)), ['car 3-1'])
+        # later rows of the same month still get a member of their own
+        ActionLog.objects.create(
+            content_type=ContentType.objects.get_for_model(Car), object_id='1', object_repr='car 2-9', action='update',
+            timestamp=datetime(2024, 2, 9, 12, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(archive.archive_before(cutoff), 1)
+        self.assertEqual([r['object_repr'] for r in archive.read()], ['car 1-5', 'car 1-20', 'car 2-3', 'car 2-9'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_action_logs', days=0, stdout=out)
+        self.assertIn('4', out.getvalue())
+        self.assertFalse(ActionLog.objects.exists())
+
+    def test_admin_changelist_shows_archived_rows_for_date_filter(self):
+        archive.archive_before(datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+        client = Client()
+        client.login(username='arch', password='pw')
+        url = reverse('admin:tracker_actionlog_changelist')
+        r = client.get(url)
+        self.assertNotIn('archived_logs', r.context)
+        r = client.get(url, {'timestamp__gte': '2024-01-15 00:00:00+00:00', 'timestamp__lt': '2024-12-31 00:00:00+00:00'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([l['object_repr'] for l in r.context['archived_logs']], ['car 2-3', 'car 1-20'])
+        self.assertContains(r, 'car 1-20')
+        r = client.get(url, {'timestamp__gte': '2024-01-01 00:00:00+00:00', 'q': '2-3'})
+        self.assertEqual(r.context['archived_count'], 1)
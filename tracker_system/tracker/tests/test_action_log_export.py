@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker.models import ActionLog, Car, Location
+
+class ActionLogExportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser('exp', 'exp@example.com', 'pw')
+        self.client = Client()
+        self.client.login(username='exp', password='pw')
+        car_ct = ContentType.objects.get_for_model(Car)
+        loc_ct = ContentType.objects.get_for_model(Location)
+        for i in range(20):
+            ActionLog.objects.create(
+                user=self.admin if i % 2 else None, content_type=car_ct if i % 3 else loc_ct,
+                object_id=str(i), object_repr=f'obj {i}', action='update',
+                changes={'comment': {'old': 'a', 'new': f'ü{i}'}}, request_path='/x/', ip_address='127.0.0.1',
+            )
+
+    def export(self, action):
+        ids = [str(pk) for pk in ActionLog.objects.values_list('pk', flat=True)]
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post(reverse('admin:tracker_actionlog_changelist'), {'action': action, '_selected_action': ids})
+            self.assertTrue(r.streaming)
+            body = b''.join(r.streaming_content).decode('utf-8')
+        return r, body, ctx
+
+    def test_csv_export_streams_all_rows(self):
+        r, body, _ = self.export('export_logs_csv')
+        self.assertEqual(r['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 20)
+        row = next(r for r in rows if r['object_id'] == '1')
+        self.assertEqual(row['user'], 'exp')
+        self.assertEqual(row['content_type'], str(ContentType.objects.get_for_model(Car)))
+        self.assertEqual(json.loads(row['changes']), {'comment': {'old': 'a', 'new': 'ü1'}})
+        self.assertEqual(next(r for r in rows if r['object_id'] == '0')['user'], '')
+
+    def test_json_export_is_valid_array(self):
+        r, body, _ = self.export('export_logs_json')
+        data = json.loads(body)
+        self.assertEqual(len(data), 20)
+        item = next(d for d in data if d['object_id'] == '0')
+        self.assertIsNone(item['user'])
+        self.assertEqual(item['content_type'], str(ContentType.objects.get_for_model(Location)))
+        self.assertEqual(item['changes']['comment']['new'], 'ü0')
+
+    def test_query_count_does_not_grow_with_rows(self):
+        _, _, small = self.export('export_logs_json')
+        ct = ContentType.objects.get_for_model(Car)
+        ActionLog.objects.bulk_create([
+            ActionLog(user=self.admin, content_type=ct, object_id=str(i), object_repr='bulk', action='create')
+            for i in range(100, 200)
+        ])
+        _, _, large = self.export('export_logs_json')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from io import StringIO
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from tracker import audit
+from tracker.models import ActionLog, ActionLogStats, Car
+
+class ActionLogRetentionTests(TestCase):
+    def setUp(self):
+        self.ct = ContentType.objects.get_for_model(Car)
+        now = timezone.now()
+        for i in range(10):
+            ActionLog.objects.create(
+                content_type=self.ct, object_id=str(i), object_repr=f'car {i}', action='update',
+                changes={'comment': {'old': 'x' * 50, 'new': 'y' * 50}}, timestamp=now - timedelta(days=10 - i, hours=-1)
+            )
+
+    def test_stats_track_inserts(self):
+        stats = ActionLogStats.current()
+        self.assertEqual(stats.rows, 10)
+        self.assertEqual(stats.size, sum(ActionLog.objects.values_list('size', flat=True)))
+        self.assertGreater(stats.size, 0)
+
+    def test_writer_flush_updates_stats(self):
+        writer = audit.AuditWriter()
+        writer._queue.append(ActionLog(content_type=self.ct, object_id='99', object_repr='new', action='create'))
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(ActionLogStats.current().rows, 11)
+
+    def test_trim_under_budget_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(ActionLog.trim_logs(max_bytes=10 ** 9), 0)
+
+    def test_trim_deletes_oldest_until_under_budget(self):
+        row_size = ActionLog.objects.first().size
+        deleted = ActionLog.trim_logs(max_bytes=row_size * 7)
+        self.assertEqual(deleted, 3)
+        self.assertEqual(sorted(ActionLog.objects.values_list('object_id', flat=True)), [str(i) for i in range(3, 10)])
+        stats = ActionLogStats.current()
+        self.assertEqual(stats.rows, 7)
+        self.assertLessEqual(stats.size, row_size * 7)
+
+    def test_prune_command_by_age_and_count(self):
+        call_command('prune_action_logs', days=5, max_bytes=10 ** 9, batch_size=2, stdout=StringIO())
+        self.assertEqual(ActionLog.objects.count(), 5)
+        call_command('prune_action_logs', max_rows=2, max_bytes=10 ** 9, stdout=StringIO())
+        self.assertEqual(sorted(ActionLog.objects.values_list('object_id', flat=True)), ['8', '9'])
+        self.assertEqual(ActionLogStats.current().rows, 2)
+
+    def test_recount_repairs_drift(self):
+        ActionLogStats.objects.filter(pk=1).update(rows=0, size=0)
+        call_command('prune_action_logs', recount=True, max_bytes=10 ** 9, stdout=StringIO())
+        self.assertEqual(ActionLogStats.current().rows, 10)
+
+    def test_admin_clear_all_uses_bulk_path(self):
+        User = get_user_model()
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pw')
+        c = Client()
+        c.login(username='admin', password='pw')
+        r = c.post(reverse('admin:tracker_actionlog_clear_logs'))
+        self.assertEqual(r.status_code, 302)
+        self.assertFalse(ActionLog.objects.exists())
+        stats = ActionLogStats.current()
+        self.assertEqual((stats.rows, stats.size), (0, 0))
+
+    def assertStatsMatchTable(self):
+        stats = ActionLogStats.current()
+        self.assertEqual(stats.rows, ActionLog.objects.count())
+        self.assertEqual(stats.size, sum(ActionLog.objects.values_list('size', flat=True)))
+
+    def test_every_delete_path_updates_stats(self):
+        User = get_user_model()
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='pw')
+        c = Client()
+        c.login(username='admin', password='pw')
+        log = ActionLog.objects.get(object_id='0')
+        r = c.post(reverse('admin:tracker_actionlog_delete', args=[log.pk]), {'post': 'yes'})
+        self.assertEqual(r.status_code, 302)
+        self.assertStatsMatchTable()
+        ActionLog.objects.get(object_id='1').delete()
+        self.assertStatsMatchTable()
+        self.assertEqual(ActionLog.objects.filter(object_id__in=['2', '3']).delete(), (2, {'tracker.ActionLog': 2}))
+        self.assertStatsMatchTable()
+        # a content type going away cascades to its logs
+        stale = ContentType.objects.create(app_label='tracker', model='gone')
+        ActionLog.objects.create(content_type=stale, object_id='1', object_repr='gone', action='create')
+        stale.delete()
+        self.assertEqual(ActionLog.objects.count(), 6)
+        self.assertStatsMatchTable()
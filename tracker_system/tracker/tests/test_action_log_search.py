@@ -0,0 +1,66 @@
+from unittest import mock
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker import fts
+from tracker.models import ActionLog, Car, Tracker
+
+def fts_rows():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {fts.TABLE} ORDER BY rowid')
+        return [row[0] for row in cursor.fetchall()]
+
+
+@override_settings(AUDIT_WRITE_BEHIND=False)
+class ActionLogSearchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser('searcher', 's@example.com', 'pw')
+        self.client = Client()
+        self.client.login(username='searcher', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracker = Tracker.objects.create(imei='123456789012345', serial_number='SNF', inventory_number_tracker='INVF', model='M')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracker.imei = '999999999999999'
+            self.tracker.save()
+        ct = ContentType.objects.get_for_model(Car)
+        ActionLog.objects.create(user=self.admin, content_type=ct, object_id='1', object_repr='Грузовик 17', action='update',
+                                 changes={'comment': {'old': 'старый', 'new': 'новый'}})
+
+    def search(self, term):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(reverse('admin:tracker_actionlog_changelist'), {'q': term})
+        self.assertEqual(r.status_code, 200)
+        return list(r.context['cl'].result_list), ctx
+
+    def test_index_follows_inserts(self):
+        self.assertEqual(fts_rows(), sorted(ActionLog.objects.values_list('pk', flat=True)))
+
+    def test_search_by_field_and_value_uses_index(self):
+        found, ctx = self.search('imei 9999')
+        self.assertEqual([(l.action, l.changes['imei']['new']) for l in found], [('update', '999999999999999')])
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('"tracker_actionlog"."changes" LIKE', sql)
+
+    def test_search_by_username_and_cyrillic_repr(self):
+        found, _ = self.search('searcher грузов')
+        self.assertEqual([l.object_repr for l in found], ['Грузовик 17'])
+
+    def test_operators_in_search_box_are_plain_words(self):
+        found, _ = self.search('imei" -(')
+        self.assertEqual(len(found), 2)
+
+    def test_delete_removes_index_rows(self):
+        ActionLog.objects.filter(action='create').purge()
+        ActionLog.objects.filter(object_repr='Грузовик 17').delete()
+        self.assertEqual(fts_rows(), list(ActionLog.objects.values_list('pk', flat=True)))
+
+    def test_falls_back_to_icontains_without_index(self):
+        with mock.patch.object(fts, 'available', return_value=False):
+            found, ctx = self.search('Грузовик')
+        self.assertEqual(len(found), 1)
+        self.assertNotIn('MATCH', ' '.join(q['sql'] for q in ctx.captured_queries))
@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from tracker import changes
+from tracker.models import Car, ChangeEvent, InstallationHistory, Location, Tracker
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ChangesApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('u', 'u@example.com', 'pw'))
+        self.loc = Location.objects.create(name='L1')
+        self.car = Car.objects.create(board_number='B1', state_number='S1', location=self.loc)
+        self.tracker = Tracker.objects.create(imei='356000000000001', serial_number='SN1', inventory_number_tracker='INV1', model='M')
+        self.inst = InstallationHistory.objects.create(car=self.car, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        self.cursor = self.sync()['cursor']
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        r = self.client.get(reverse('tracker:changes_api'), params)
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def delta(self):
+        data = self.sync(self.cursor)
+        self.cursor = data['cursor']
+        return [(c['model'], c['id'], c['action']) for c in data['changes']], data
+
+    def test_initial_sync_returns_current_rows(self):
+        data = self.sync()
+        by_model = {c['model']: c for c in data['changes']}
+        self.assertEqual(by_model['car']['data']['location'], {'id': self.loc.pk, 'name': 'L1'})
+        self.assertEqual(by_model['tracker']['data']['imei'], '356000000000001')
+        self.assertEqual(by_model['installation']['data']['car'], {'id': self.car.pk})
+
+    def test_only_the_delta_one_entry_per_object(self):
+        self.assertEqual(self.delta()[0], [])
+        self.car.comment = 'a'
+        self.car.save()
+        self.car.comment = 'b'
+        self.car.save()
+        delta, data = self.delta()
+        self.assertEqual(delta, [('car', self.car.pk, 'upsert')])
+        self.assertEqual(data['changes'][0]['data']['comment'], 'b')
+        self.assertEqual(self.delta()[0], [])
+
+    def test_deletes_and_cascades(self):
+        car_id = self.car.pk
+        self.car.delete()
+        delta, _ = self.delta()
+        self.assertEqual(sorted(delta), [('car', car_id, 'delete'), ('installation', self.inst.pk, 'delete')])
+
+    def test_updated_then_deleted_is_reported_as_delete(self):
+        self.tracker.comment = 'x'
+        self.tracker.save()
+        seq = ChangeEvent.objects.latest('seq').seq
+        self.tracker.delete()
+        data = self.sync(int(self.cursor), limit=1)
+        self.assertEqual(data['cursor'], str(seq))
+        self.assertTrue(data['has_more'])
+        self.assertEqual(data['changes'][0]['action'], 'delete')
+
+    def test_bulk_and_location_writes(self):
+        InstallationHistory.objects.filter(pk=self.inst.pk).update(is_active=False)
+        self.loc.name = 'L2'
+        self.loc.save()
+        self.assertEqual(sorted(self.delta()[0]), [('car', self.car.pk, 'upsert'), ('installation', self.inst.pk, 'upsert')])
+        self.loc.delete()
+        delta, data = self.delta()
+        self.assertEqual(delta, [('car', self.car.pk, 'upsert')])
+        self.assertEqual(data['changes'][0]['data']['location'], {'id': None, 'name': None})
+
+    def test_pages_follow_the_cursor(self):
+        for i in range(5):
+            Car.objects.create(state_number=f'P{i}')
+        seen = []
+        while True:
+            data = self.sync(self.cursor, limit=2)
+            seen += [c['data']['state_number'] for c in data['changes']]
+            self.cursor = data['cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, [f'P{i}' for i in range(5)])
+
+    def test_pruned_cursor_requires_full_sync(self):
+        ChangeEvent.objects.update(created_at=timezone.now() - timedelta(days=60))
+        Car.objects.create(state_number='NEW')
+        out = StringIO()
+        call_command('prune_changes', stdout=out)
+        # the car, tracker and installation of setUp; the newest event stays
+        self.assertIn(': 3', out.getvalue())
+        r = self.client.get(reverse('tracker:changes_api'), {'since': '0'})
+        self.assertEqual(r.status_code, 410)
+        self.assertEqual(r.json()['cursor'], str(changes.latest_seq()))
+        # a cursor at the newest pruned event still continues
+        self.assertEqual([c['data']['state_number'] for c in self.sync(self.cursor)['changes']], ['NEW'])
+
+    def test_gaps_in_seq_are_not_pruning(self):
+        # sequence numbers taken by rolled-back writes never show up in the log
+        Car.objects.create(state_number='LOST')
+        Car.objects.create(state_number='KEPT')
+        ChangeEvent.objects.filter(seq__lte=changes.latest_seq() - 1).delete()
+        self.assertEqual([c['data']['state_number'] for c in self.sync(self.cursor)['changes']], ['KEPT'])
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('tracker:changes_api')).status_code, 302)
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get(reverse('tracker:changes_api'), {'since': 'abc'}).status_code, 400)
+
+    def test_bulk_car_and_tracker_writes(self):
+        other = Car.objects.create(state_number='S2', location=self.loc)
+        self.delta()
+        Car.objects.filter(pk=self.car.pk).update(comment='bulk')
+        Tracker.objects.filter(pk=self.tracker.pk).audited_update(is_active=False)
+        delta, data = self.delta()
+        self.assertEqual(sorted(delta), [('car', self.car.pk, 'upsert'), ('tracker', self.tracker.pk, 'upsert')])
+        self.assertFalse(next(c for c in data['changes'] if c['model'] == 'tracker')['data']['is_active'])
+        self.car.comment = 'again'
+        Car.objects.audited_bulk_update([self.car], ['comment'])
+        created = Tracker.objects.bulk_create([
+            Tracker(imei='356000000000002', serial_number='SN2', inventory_number_tracker='INV2', model='M'),
+        ])
+        self.assertEqual(sorted(self.delta()[0]), [('car', self.car.pk, 'upsert'), ('tracker', created[0].pk, 'upsert')])
+        # a location renamed in bulk changes the location name of its cars
+        Location.objects.filter(pk=self.loc.pk).update(name='L3')
+        self.assertEqual(sorted(self.delta()[0]), [('car', self.car.pk, 'upsert'), ('car', other.pk, 'upsert')])
@@ -0,0 +1,119 @@
+from datetime import date
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker import versioning
+from tracker.models import Car, InstallationHistory, Location, OrderDocument, Tracker
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], AUDIT_WRITE_BEHIND=False)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user('u', 'u@example.com', 'pw')
+        User.objects.create_user('v', 'v@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            # also bumps whatever earlier tests left marked (TestCase never commits)
+            self.car = Car.objects.create(board_number='B1', state_number='S1')
+            tracker = Tracker.objects.create(imei='356000000000001', serial_number='SN1', inventory_number_tracker='INV1', model='M')
+            InstallationHistory.objects.create(car=self.car, tracker=tracker, installation_date=date(2024, 1, 1))
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        return first['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_pages_answer_304_without_running_the_view(self):
+        for name in ('car_list', 'tracker_list', 'installation_list', 'reports', 'dashboard', 'installation_api'):
+            url = reverse(f'tracker:{name}')
+            self.client.get(url)
+            first = self.client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(r.status_code, 304, name)
+            self.assertTrue(r.has_header('Last-Modified'), name)
+            # session, user and the one data version query
+            self.assertLessEqual(len(ctx.captured_queries), 3, [q['sql'] for q in ctx.captured_queries])
+
+    def test_a_committed_change_invalidates(self):
+        url = reverse('tracker:car_list')
+        etag, r = self.revalidate(url)
+        self.assertEqual(r.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.comment = 'changed'
+            self.car.save()
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, 'changed')
+
+    def test_bulk_writes_invalidate(self):
+        tracker = Tracker.objects.get()
+        for url, write in (
+            (reverse('tracker:car_list'), lambda: Car.objects.filter(pk=self.car.pk).update(comment='bulk')),
+            (reverse('tracker:tracker_list'), lambda: Tracker.objects.filter(pk=tracker.pk).audited_update(comment='bulk')),
+        ):
+            etag, _ = self.revalidate(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 200, url)
+            self.assertContains(r, 'bulk')
+
+    def test_order_documents_invalidate_the_installation_list(self):
+        # the list only shows a prompt while no order document exists
+        url = reverse('tracker:installation_list')
+        etag, _ = self.revalidate(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderDocument.objects.create(car=self.car, document='orders/a.pdf', issue_date=date(2024, 1, 1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_api_ignores_locations(self):
+        etag, _ = self.revalidate(reverse('tracker:installation_api'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(name='L')
+        self.assertEqual(self.client.get(reverse('tracker:installation_api'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('tracker:car_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        etag, _ = self.revalidate(reverse('tracker:dashboard'))
+        self.client.login(username='v', password='pw')
+        self.assertEqual(self.client.get(reverse('tracker:dashboard'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_a_new_login_gets_a_fresh_page(self):
+        # the cached page's CSRF tokens belong to the old session
+        etag, _ = self.revalidate(reverse('tracker:car_list'))
+        self.client.logout()
+        self.client.login(username='u', password='pw')
+        self.assertEqual(self.client.get(reverse('tracker:car_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_login_redirect_has_no_validators(self):
+        etag, _ = self.revalidate(reverse('tracker:dashboard'))
+        self.client.logout()
+        r = self.client.get(reverse('tracker:dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 302)
+        self.assertFalse(r.has_header('ETag'))
+        self.assertFalse(r.has_header('Last-Modified'))
+
+    def test_pending_messages_are_rendered(self):
+        url = reverse('tracker:car_list')
+        etag = self.client.get(url)['ETag']
+        # the modal form answers 'OK' and the list reloads with the message pending; the versions
+        # are unchanged (nothing commits in a TestCase), so only the message prevents a 304
+        r = self.client.post(reverse('tracker:car_update', args=[self.car.pk]), {
+            'board_number': 'B1', 'state_number': 'S1', 'model': 'Other', 'comment': 'saved',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(r.content, b'OK')
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(r.has_header('ETag'))
+        self.assertContains(r, 'Изменения сохранены')
+
+    def test_bump_is_deferred_to_commit(self):
+        before = versioning.token()
+        with self.captureOnCommitCallbacks(execute=False):
+            Car.objects.create(state_number='S2')
+            self.assertEqual(versioning.token(), before)
@@ -0,0 +1,104 @@
+from datetime import date
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker import audit, counters
+from tracker.models import Car, Counter, Tracker, InstallationHistory, Location
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        loc = Location.objects.create(name='L1')
+        self.car1 = Car.objects.create(board_number='B1', state_number='S1', location=loc)
+        self.car2 = Car.objects.create(board_number='B2', state_number='S2', location=loc)
+        self.tracker1 = Tracker.objects.create(imei='111111111111111', serial_number='SN1', inventory_number_tracker='INV1', model='M')
+        self.tracker2 = Tracker.objects.create(imei='222222222222222', serial_number='SN2', inventory_number_tracker='INV2', model='M')
+
+    def assertCounters(self):
+        """Stored counters equal the values recomputed from the tables."""
+        stored = counters.values()
+        actual = {name: queryset().count() for name, queryset in counters.COUNTERS.items()}
+        self.assertEqual(stored, actual)
+        return stored
+
+    def test_creates_and_deletes(self):
+        self.assertEqual(self.assertCounters()['cars'], 2)
+        Car.objects.create(board_number='B3', state_number='S3')
+        self.car2.delete()
+        Tracker.objects.create(imei='333333333333333', serial_number='SN3', inventory_number_tracker='INV3', model='M')
+        stored = self.assertCounters()
+        self.assertEqual((stored['cars'], stored['trackers']), (2, 3))
+
+    def test_installation_lifecycle(self):
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker1, installation_date=date(2024, 1, 1))
+        self.assertEqual(self.assertCounters()['active_installations'], 1)
+        inst.is_active = False
+        inst.save()
+        stored = self.assertCounters()
+        self.assertEqual((stored['active_installations'], stored['inactive_trackers']), (0, 1))
+        InstallationHistory.objects.create(car=self.car2, tracker=self.tracker1, installation_date=date(2024, 2, 1), is_active=False)
+        self.assertEqual(self.assertCounters()['inactive_trackers'], 1)
+        self.tracker1.is_active = False
+        self.tracker1.save()
+        self.assertEqual(self.assertCounters()['inactive_trackers'], 0)
+        self.tracker1.is_active = True
+        self.tracker1.save()
+        self.assertEqual(self.assertCounters()['inactive_trackers'], 1)
+        inst.delete()
+        self.assertEqual(self.assertCounters()['inactive_trackers'], 1)
+
+    def test_loaded_values_follow_saves_of_unaudited_models(self):
+        audit.registry.unregister(InstallationHistory)
+        self.addCleanup(audit.registry.register, InstallationHistory)
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker1, installation_date=date(2024, 1, 1))
+        inst = InstallationHistory.objects.get(pk=inst.pk)
+        inst.is_active = False
+        inst.save()
+        inst.save()
+        self.assertEqual(self.assertCounters()['active_installations'], 0)
+
+    def test_cascading_deletes(self):
+        for day in (1, 2, 3):
+            InstallationHistory.objects.create(car=self.car1, tracker=self.tracker1, installation_date=date(2024, 1, day), is_active=day == 3)
+        InstallationHistory.objects.create(car=self.car2, tracker=self.tracker2, installation_date=date(2024, 1, 1), is_active=False)
+        self.assertCounters()
+        self.tracker1.delete()
+        self.assertEqual(self.assertCounters()['inactive_trackers'], 1)
+        self.car2.delete()
+        self.assertEqual(self.assertCounters(), {'cars': 1, 'trackers': 1, 'active_installations': 0, 'inactive_trackers': 0})
+
+    def test_bulk_update_recounts(self):
+        InstallationHistory.objects.bulk_create([
+            InstallationHistory(car=self.car1, tracker=self.tracker1, installation_date=date(2024, 1, 1)),
+            InstallationHistory(car=self.car2, tracker=self.tracker2, installation_date=date(2024, 1, 1)),
+        ])
+        self.assertEqual(self.assertCounters()['active_installations'], 2)
+        InstallationHistory.objects.filter(tracker=self.tracker1).update(is_active=False)
+        self.assertCounters()
+
+    def test_reconcile_command_fixes_drift(self):
+        counters.values()
+        Counter.objects.filter(name='cars').update(value=99)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('cars: 99 -> 2', out.getvalue())
+        self.assertEqual(counters.values()['cars'], 2)
+
+
+class DashboardCounterTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        Car.objects.create(board_number='B1', state_number='S1')
+
+    def test_dashboard_runs_no_count_queries(self):
+        self.client.get(reverse('tracker:dashboard'))
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(reverse('tracker:dashboard'))
+        self.assertEqual(r.context['cars_count'], 1)
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
@@ -0,0 +1,165 @@
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from tracker import exports, versioning
+from tracker.models import Car, ExportJob, InstallationHistory, Location, Tracker
+
+
+# executed on_commit callbacks include the audit log's; keep them off the background thread
+@override_settings(AUDIT_WRITE_BEHIND=False)
+class VersioningTests(TestCase):
+    def setUp(self):
+        # TestCase never commits: bump what earlier tests left marked
+        with self.captureOnCommitCallbacks(execute=True):
+            versioning.touch([])
+
+    def test_one_bump_per_committed_transaction(self):
+        before = versioning.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            car = Car.objects.create(board_number='B1', state_number='S1')
+            car.comment = 'x'
+            car.save()
+        after = versioning.current()
+        self.assertEqual(after['car'], before['car'] + 1)
+        self.assertEqual(after['tracker'], before['tracker'])
+
+    def test_installation_bumps_pointer_tables(self):
+        car = Car.objects.create(board_number='B1', state_number='S1')
+        tracker = Tracker.objects.create(imei='111111111111111', serial_number='SN1', inventory_number_tracker='INV1', model='M')
+        before = versioning.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            InstallationHistory.objects.filter(pk__in=[]).update(is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            InstallationHistory.objects.create(car=car, tracker=tracker, installation_date=date(2024, 1, 1))
+        after = versioning.current()
+        for name in ('installationhistory', 'tracker', 'car'):
+            self.assertEqual(after[name], before[name] + 1, name)
+        self.assertEqual(after['location'], before['location'])
+
+    def test_token_is_stable_until_a_change(self):
+        token = versioning.token()
+        self.assertEqual(versioning.token(), token)
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(name='L')
+        self.assertNotEqual(versioning.token(), token)
+
+
+@override_settings(AUDIT_WRITE_BEHIND=False)
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, EXPORT_INLINE_MAX_ROWS=2, ALLOWED_HOSTS=['testserver'])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        User = get_user_model()
+        User.objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        self.car = Car.objects.create(board_number='B1', state_number='S1', location=Location.objects.create(name='L1'))
+        for i in range(3):
+            tracker = Tracker.objects.create(imei=f'11111111111111{i}', serial_number=f'SN{i}', inventory_number_tracker=f'INV{i}', model='M')
+            InstallationHistory.objects.create(car=self.car, tracker=tracker, installation_date=date(2024, 1, 1 + i))
+
+    def export(self, **params):
+        return self.client.get(reverse('tracker:export_installations'), params, HTTP_ACCEPT='application/json')
+
+    def work(self):
+        call_command('run_export_worker', '--once', stdout=StringIO(), stderr=StringIO())
+
+    def test_small_export_stays_inline(self):
+        r = self.export(imei='1110')
+        self.assertTrue(r.streaming)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_large_export_is_queued_built_and_reused(self):
+        r = self.export(serial='sn')
+        self.assertEqual(r.status_code, 202)
+        state = r.json()
+        self.assertEqual((state['status'], state['total']), ('pending', 3))
+        # the same filters, spelled differently, join the queued job
+        self.assertEqual(self.export(serial=' SN ').json()['id'], state['id'])
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+        self.work()
+        state = self.client.get(state['status_url']).json()
+        self.assertEqual((state['status'], state['progress'], state['percent']), ('done', 3, 100))
+        job = ExportJob.objects.get()
+        self.assertTrue(job.file.name.startswith('exports/installations_'))
+
+        r = self.client.get(state['download_url'])
+        ws = load_workbook(BytesIO(b''.join(r.streaming_content))).active
+        self.assertEqual([row[3] for row in ws.iter_rows(min_row=2, values_only=True)], ['SN2', 'SN1', 'SN0'])
+        # unchanged data: the artifact is served without a new job
+        r = self.export(serial='sn')
+        self.assertTrue(r.streaming)
+        r.close()
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_data_change_makes_the_artifact_stale(self):
+        self.export(serial='sn')
+        self.work()
+        old = ExportJob.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.comment = 'changed'
+            self.car.save()
+        r = self.export(serial='sn')
+        self.assertEqual(r.status_code, 202)
+        self.work()
+        self.assertEqual(list(ExportJob.objects.values_list('status', flat=True)), ['done'])
+        self.assertFalse(old.file.storage.exists(old.file.name))
+
+    def test_bulk_change_makes_the_artifact_stale(self):
+        self.export(serial='sn')
+        self.work()
+        for write in (
+            lambda: Car.objects.filter(pk=self.car.pk).update(board_number='B2'),
+            lambda: Tracker.objects.filter(serial_number='SN0').audited_update(comment='bulk'),
+        ):
+            old = ExportJob.objects.get(status=ExportJob.DONE)
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            r = self.export(serial='sn')
+            self.assertEqual(r.status_code, 202)
+            self.assertNotEqual(r.json()['id'], old.pk)
+            self.work()
+        state = self.client.get(r.json()['status_url']).json()
+        r = self.client.get(state['download_url'])
+        ws = load_workbook(BytesIO(b''.join(r.streaming_content))).active
+        self.assertEqual({row[0] for row in ws.iter_rows(min_row=2, values_only=True)}, {'B2'})
+
+    def test_html_request_gets_progress_page(self):
+        r = self.client.get(reverse('tracker:export_installations'))
+        self.assertEqual(r.status_code, 200)
+        self.assertTemplateUsed(r, 'tracker/export_job.html')
+        self.assertContains(r, reverse('tracker:export_job_status', args=[ExportJob.objects.get().pk]))
+
+    def test_claim_is_exclusive_and_stale_jobs_requeue(self):
+        job = exports.enqueue('installations', {})
+        self.assertEqual(exports.claim().pk, job.pk)
+        self.assertIsNone(exports.claim())
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(exports.requeue_stale(), 1)
+        self.assertEqual(exports.claim().pk, job.pk)
+
+    def test_failed_build_is_reported(self):
+        exports.enqueue('unknown', {})
+        self.work()
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('KeyError', job.error)
+        self.assertEqual(self.client.get(reverse('tracker:export_job_download', args=[job.pk])).status_code, 404)
+
+    def test_prune_removes_old_files(self):
+        self.export(serial='sn')
+        self.work()
+        job = ExportJob.objects.get()
+        ExportJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(exports.prune(), 1)
+        self.assertFalse(job.file.storage.exists(job.file.name))
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.urls import reverse
+from tracker import history
+from tracker.models import ActionLog, ActionLogCheckpoint, Tracker
+
+T0 = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+class ReconstructionTests(TestCase):
+    def setUp(self):
+        self.ct = ContentType.objects.get_for_model(Tracker)
+        ActionLog.objects.all().delete()
+
+    def log(self, minutes, action, changes, object_id='7'):
+        return ActionLog.objects.create(content_type=self.ct, object_id=object_id, object_repr='t', action=action,
+                                        changes=changes, timestamp=T0 + timedelta(minutes=minutes))
+
+    def build_long_history(self, updates=120):
+        self.log(0, 'create', {'imei': '0', 'comment': 'new'})
+        for i in range(1, updates + 1):
+            self.log(i, 'update', {'imei': {'old': str(i - 1), 'new': str(i)}})
+
+    def test_folds_create_updates_and_delete(self):
+        self.log(0, 'create', {'imei': '1', 'comment': 'a'})
+        self.log(10, 'update', {'comment': {'old': 'a', 'new': 'b'}})
+        self.log(20, 'delete', {'imei': '1', 'comment': 'b'})
+        self.assertIsNone(history.reconstruct(self.ct, 7, T0 - timedelta(minutes=1)).state)
+        self.assertEqual(history.reconstruct(self.ct, 7, T0 + timedelta(minutes=5)).state, {'imei': '1', 'comment': 'a'})
+        self.assertEqual(history.reconstruct(Tracker, '7', T0 + timedelta(minutes=10)).state, {'imei': '1', 'comment': 'b'})
+        self.assertIsNone(history.reconstruct(self.ct.pk, 7, T0 + timedelta(minutes=30)).state)
+
+    def test_checkpoints_bound_the_replay(self):
+        self.build_long_history()
+        full = [history.reconstruct(self.ct, 7, T0 + timedelta(minutes=m)) for m in (30, 75, 200)]
+        self.assertEqual(history.checkpoint(self.ct, 7, every=50), 2)
+        self.assertEqual(history.checkpoint(self.ct, 7, every=50), 0)
+        for minutes, before in zip((30, 75, 200), full):
+            after = history.reconstruct(self.ct, 7, T0 + timedelta(minutes=minutes))
+            self.assertEqual(after.state, before.state)
+            self.assertLess(after.replayed, 50)
+        self.assertEqual(history.reconstruct(self.ct, 7, T0 + timedelta(minutes=200)).state['imei'], '120')
+
+    def test_checkpoints_survive_retention(self):
+        self.build_long_history(updates=60)
+        history.checkpoint(self.ct, 7, every=50)
+        ActionLog.objects.filter(timestamp__lt=T0 + timedelta(minutes=55)).purge()
+        state = history.reconstruct(self.ct, 7, T0 + timedelta(minutes=100)).state
+        self.assertEqual(state, {'imei': '60', 'comment': 'new'})
+
+    def test_command_checkpoints_every_object(self):
+        self.build_long_history(updates=10)
+        self.log(0, 'create', {'imei': 'x'}, object_id='8')
+        out = StringIO()
+        call_command('checkpoint_action_logs', every=5, stdout=out)
+        self.assertEqual(ActionLogCheckpoint.objects.filter(object_id='7').count(), 2)
+        self.assertFalse(ActionLogCheckpoint.objects.filter(object_id='8').exists())
+
+
+class ReconstructionViewTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_superuser('asof', 'asof@example.com', 'pw')
+        self.client = Client()
+        self.client.login(username='asof', password='pw')
+        self.ct = ContentType.objects.get_for_model(Tracker)
+        ActionLog.objects.all().delete()
+        self.create = ActionLog.objects.create(content_type=self.ct, object_id='5', object_repr='t', action='create',
+                                               changes={'serial_number': 'OLD'}, timestamp=T0)
+        ActionLog.objects.create(content_type=self.ct, object_id='5', object_repr='t', action='update',
+                                 changes={'serial_number': {'old': 'OLD', 'new': 'NEW'}}, timestamp=T0 + timedelta(days=1))
+
+    def test_api(self):
+        url = reverse('tracker:object_state_api', kwargs={'model_name': 'tracker', 'pk': 5})
+        data = self.client.get(url, {'at': '2024-01-01T12:00:00+00:00'}).json()
+        self.assertEqual((data['exists'], data['state']), (True, {'serial_number': 'OLD'}))
+        self.assertEqual(self.client.get(url).json()['state'], {'serial_number': 'NEW'})
+        self.assertEqual(self.client.get(url, {'at': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('tracker:object_state_api', kwargs={'model_name': 'user', 'pk': 1})).status_code, 404)
+
+    def test_admin_view_as_of_action(self):
+        r = self.client.post(reverse('admin:tracker_actionlog_changelist'), {'action': 'view_as_of', '_selected_action': [self.create.pk]})
+        self.assertEqual(r.status_code, 302)
+        r = self.client.get(r['Location'])
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, 'OLD')
+        self.assertNotContains(r, 'NEW')
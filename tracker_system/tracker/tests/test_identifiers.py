@@ -0,0 +1,99 @@
+from datetime import date
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from tracker import identifiers
+from tracker.models import Car, Tracker, TrackerIdentifier, InstallationHistory
+
+
+class IdentifierIndexTests(TestCase):
+    def setUp(self):
+        self.t1 = Tracker.objects.create(
+            imei='356938035643809', serial_number='sn-7781', inventory_number_tracker='INV1', model='M',
+            sim_old='+380 67 123 4567', n_card='N-0042',
+        )
+        self.t2 = Tracker.objects.create(
+            imei='356938035600001', serial_number='SN7790', inventory_number_tracker='INV2', model='M', sim_new='0501114567',
+        )
+
+    def find(self, kinds, term):
+        return sorted(Tracker.objects.filter(identifiers.tracker_q(kinds, term)).values_list('serial_number', flat=True))
+
+    def test_rows_are_normalized(self):
+        values = dict(self.t1.identifiers.values_list('kind', 'value'))
+        self.assertEqual(values['sim_old'], '380671234567')
+        self.assertEqual(values['serial_number'], 'SN7781')
+        self.assertNotIn('sim_new', values)
+        self.assertEqual(self.t1.identifiers.get(kind='imei').reversed_value, '908346530839653')
+
+    def test_suffix_prefix_and_middle(self):
+        self.assertEqual(self.find(['imei'], '3809'), ['sn-7781'])
+        self.assertEqual(self.find(['imei'], '09'), ['sn-7781'])
+        self.assertEqual(self.find(['imei'], '35693803'), ['SN7790', 'sn-7781'])
+        self.assertEqual(self.find(['imei'], '8035'), ['SN7790', 'sn-7781'])
+        self.assertEqual(self.find(['imei'], '1234'), [])
+
+    def test_separators_and_case_are_ignored(self):
+        self.assertEqual(self.find(['serial_number'], 'sn 77'), ['SN7790', 'sn-7781'])
+        self.assertEqual(self.find(['sim_old', 'sim_new', 'n_card'], '4567'), ['SN7790', 'sn-7781'])
+        self.assertEqual(self.find(['sim_old', 'sim_new', 'n_card'], 'n0042'), ['sn-7781'])
+
+    def test_trigrams_must_come_from_one_value(self):
+        # "567" is in sim_old and "N00" in n_card of the same tracker, but no single value contains both
+        self.assertEqual(self.find(['sim_old', 'n_card'], '567N00'), [])
+
+    def test_index_follows_saves(self):
+        self.t1.imei = '111111111111222'
+        self.t1.save()
+        self.assertEqual(self.find(['imei'], '3809'), [])
+        self.assertEqual(self.find(['imei'], '1222'), ['sn-7781'])
+        self.t1.delete()
+        self.assertFalse(TrackerIdentifier.objects.filter(tracker_id=self.t1.pk).exists())
+
+    def test_index_follows_bulk_writes(self):
+        Tracker.objects.filter(imei='356938035643809').update(imei='111111111111222')
+        self.assertEqual(self.find(['imei'], '3809'), [])
+        self.assertEqual(self.find(['imei'], '1222'), ['sn-7781'])
+        Tracker.objects.filter(pk=self.t1.pk).audited_update(sim_old='0991112233')
+        self.assertEqual(self.find(['sim_old'], '2233'), ['sn-7781'])
+        self.t2.n_card = 'N-5150'
+        Tracker.objects.audited_bulk_update([self.t2], ['n_card'])
+        self.assertEqual(self.find(['n_card'], '5150'), ['SN7790'])
+        Tracker.objects.bulk_create([
+            Tracker(imei='356000000098765', serial_number='SN9', inventory_number_tracker='INV9', model='M'),
+        ])
+        self.assertEqual(self.find(['imei'], '98765'), ['SN9'])
+
+    def test_unchanged_identifiers_are_not_rewritten(self):
+        tracker = Tracker.objects.get(pk=self.t2.pk)
+        tracker.comment = 'x'
+        ids = list(tracker.identifiers.values_list('pk', flat=True))
+        tracker.save()
+        self.assertEqual(list(tracker.identifiers.values_list('pk', flat=True)), ids)
+
+    def test_rebuild_command(self):
+        TrackerIdentifier.objects.all().delete()
+        call_command('rebuild_identifier_index', stdout=StringIO())
+        self.assertEqual(self.find(['imei'], '3809'), ['sn-7781'])
+
+    def test_punctuation_only_term_falls_back(self):
+        self.assertEqual(self.find(['serial_number'], '-'), ['sn-7781'])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ReportIdentifierFilterTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        car = Car.objects.create(board_number='B1', state_number='S1')
+        for imei, sim in (('356938035643809', '0671234567'), ('356938035600001', '0501110000')):
+            tracker = Tracker.objects.create(imei=imei, serial_number=f'SN{imei[-4:]}', inventory_number_tracker=imei, model='M', sim_new=sim)
+            InstallationHistory.objects.create(car=car, tracker=tracker, installation_date=date(2024, 1, 1))
+
+    def test_report_filters_by_last_digits(self):
+        r = self.client.get('/tracker/reports/', {'imei': '3809'})
+        self.assertEqual([i.tracker.imei for i in r.context['installations']], ['356938035643809'])
+        r = self.client.get('/tracker/reports/', {'sim': '0000'})
+        self.assertEqual([i.tracker.sim_new for i in r.context['installations']], ['0501110000'])
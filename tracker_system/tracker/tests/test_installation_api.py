@@ -0,0 +1,76 @@
+import json
+from datetime import date
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker.models import Car, Tracker, InstallationHistory
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class InstallationApiTests(TestCase):
+    def setUp(self):
+        self.car = Car.objects.create(board_number='B1', state_number='S1', model='MAN')
+        other = Car.objects.create(board_number='B2', state_number='S2')
+        self.tracker = Tracker.objects.create(imei='356000000000001', serial_number='SN1', inventory_number_tracker='INV1', model='FMB920')
+        self.installations = [
+            InstallationHistory.objects.create(
+                car=self.car if day % 2 else other, tracker=self.tracker, installation_date=date(2024, 1, day),
+                removal_date=date(2024, 1, day + 1), is_active=False,
+            )
+            for day in range(1, 8)
+        ]
+
+    def get(self, url=None, **params):
+        r = self.client.get(url or reverse('tracker:installation_api'), params)
+        return r, r.json()
+
+    def test_full_row_shape(self):
+        _, data = self.get(limit=1)
+        self.assertEqual(data['results'], [{
+            'id': self.installations[0].pk,
+            'car': {'id': self.car.pk, 'board_number': 'B1', 'model': self.car.get_model_display()},
+            'tracker': {'id': self.tracker.pk, 'serial_number': 'SN1', 'imei': '356000000000001', 'model': 'FMB920'},
+            'installation_date': '2024-01-01',
+            'removal_date': '2024-01-02',
+            'is_active': False,
+            'comment': self.installations[0].comment,
+        }])
+
+    def test_cursor_pages_cover_everything_once(self):
+        seen = []
+        r, data = self.get(limit=3)
+        self.assertIsNone(data['previous'])
+        while True:
+            seen += [row['id'] for row in data['results']]
+            if not data['next']:
+                break
+            r, data = self.get(data['next'])
+        self.assertEqual(seen, [i.pk for i in self.installations])
+        self.assertIsNotNone(data['previous'])
+
+    def test_sparse_fields_skip_joins(self):
+        with CaptureQueriesContext(connection) as ctx:
+            _, data = self.get(fields='id,installation_date')
+        self.assertEqual(set(data['results'][0]), {'id', 'installation_date'})
+        self.assertNotIn('JOIN', ctx.captured_queries[-1]['sql'])
+        _, data = self.get(fields='tracker.imei,car')
+        self.assertEqual(data['results'][0], {'car': {'id': self.car.pk, 'board_number': 'B1', 'model': self.car.get_model_display()}, 'tracker': {'imei': '356000000000001'}})
+
+    def test_filters(self):
+        _, data = self.get(date_from='2024-01-03', date_to='2024-01-05', fields='installation_date')
+        self.assertEqual([row['installation_date'] for row in data['results']], ['2024-01-03', '2024-01-04', '2024-01-05'])
+        _, data = self.get(reverse('tracker:installation_api_car', args=[self.car.pk]), fields='id')
+        self.assertEqual(len(data['results']), 4)
+
+    def test_bad_parameters(self):
+        for params in ({'fields': 'id,secret'}, {'date_from': '2024-13-01'}, {'limit': 'x'}, {'cursor': 'garbage'}):
+            r, data = self.get(**params)
+            self.assertEqual(r.status_code, 400, params)
+            self.assertIn('error', data)
+
+    def test_all_streams_a_plain_array(self):
+        r = self.client.get(reverse('tracker:installation_api'), {'all': '1', 'fields': 'id'})
+        self.assertTrue(r.streaming)
+        data = json.loads(b''.join(r.streaming_content))
+        self.assertEqual(data, [{'id': i.pk} for i in self.installations])
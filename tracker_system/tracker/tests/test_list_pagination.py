@@ -0,0 +1,83 @@
+from urllib.parse import parse_qs, urlparse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker.models import Car, Location
+from tracker.pagination import KeysetPaginator
+
+
+class ListKeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        User.objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        locations = [Location.objects.create(name=f'L{i}') for i in range(3)]
+        for i in range(45):
+            Car.objects.create(
+                state_number=f'S{i:02d}',
+                # NULL sort keys and duplicates must neither be skipped nor repeated
+                board_number=None if i % 4 == 0 else f'B{i % 7}',
+                location=None if i % 5 == 0 else locations[i % 3],
+            )
+
+    def walk(self, sort):
+        url = reverse('tracker:car_list')
+        cursor = None
+        pages = []
+        while True:
+            params = {'sort': sort}
+            if cursor:
+                params['cursor'] = cursor
+            r = self.client.get(url, params)
+            self.assertEqual(r.status_code, 200)
+            page = r.context['page_obj']
+            pages.append([car.pk for car in page])
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_every_row_once_for_each_sort(self):
+        expected = sorted(Car.objects.values_list('pk', flat=True))
+        for sort in ('state_number', '-board_number', 'board_number', 'location', '-location'):
+            pages = self.walk(sort)
+            self.assertEqual(len(pages), 3, sort)
+            self.assertEqual(sorted(pk for page in pages for pk in page), expected, sort)
+
+    def test_previous_cursor_returns_previous_page(self):
+        qs = Car.objects.order_by('board_number')
+        paginator = KeysetPaginator(qs, ('board_number', 'pk'), per_page=20)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual([c.pk for c in back], [c.pk for c in first])
+        self.assertFalse(back.has_previous)
+
+    def test_links_keep_sort_and_filters(self):
+        r = self.client.get(reverse('tracker:car_list'), {'sort': '-location'})
+        self.assertContains(r, 'cursor=')
+        link = [line for line in r.content.decode().splitlines() if 'cursor=' in line][0]
+        query = parse_qs(urlparse(link.split('href="')[1].split('"')[0].replace('&amp;', '&')).query)
+        self.assertEqual(query['sort'], ['-location'])
+
+    def test_invalid_cursor_is_404(self):
+        r = self.client.get(reverse('tracker:car_list'), {'cursor': 'garbage'})
+        self.assertEqual(r.status_code, 404)
+
+    def test_pages_do_not_count_or_offset(self):
+        url = reverse('tracker:car_list')
+        self.client.get(url)  # fills the cached total
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(url)
+        self.assertContains(r, 'Всего: 45')
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    @override_settings(LIST_COUNT_CACHE_TIMEOUT=None)
+    def test_total_can_be_disabled(self):
+        r = self.client.get(reverse('tracker:car_list'))
+        self.assertNotContains(r, 'Всего:')
@@ -0,0 +1,99 @@
+from datetime import date
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from tracker import search
+from tracker.models import Car, Tracker, InstallationHistory, Location
+
+
+class ListSearchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        self.loc = Location.objects.create(name='Коростень')
+        self.car1 = Car.objects.create(board_number='B1', state_number='AA1111', location=self.loc, comment='новая резина')
+        self.car2 = Car.objects.create(board_number='B2', state_number='BB2222', comment='резина резина, ремонт')
+        self.tracker1 = Tracker.objects.create(imei='356000000000001', serial_number='SN1', inventory_number_tracker='INV1', model='FMB920')
+        self.tracker2 = Tracker.objects.create(imei='356000000000002', serial_number='SN2', inventory_number_tracker='INV2', model='FMB125', comment='на складе')
+
+    def cars(self, term, **params):
+        r = self.client.get(reverse('tracker:car_list'), {'search': term, **params})
+        return [car.pk for car in r.context['cars']]
+
+    def trackers(self, term):
+        r = self.client.get(reverse('tracker:tracker_list'), {'search': term})
+        return [t.pk for t in r.context['trackers']]
+
+    def test_fts_tables_exist(self):
+        self.assertTrue(search.available())
+
+    def test_car_search_by_location_and_comment(self):
+        self.assertEqual(self.cars('короСТЕНЬ'), [self.car1.pk])
+        self.assertEqual(self.cars('AA11'), [self.car1.pk])
+        # both match; the comment with more hits ranks first unless a sort is chosen
+        self.assertEqual(self.cars('резина'), [self.car2.pk, self.car1.pk])
+        self.assertEqual(self.cars('резина', sort='state_number'), [self.car1.pk, self.car2.pk])
+
+    def test_index_follows_location_changes(self):
+        self.loc.name = 'Малин'
+        self.loc.save()
+        self.assertEqual(self.cars('Малин'), [self.car1.pk])
+        self.assertEqual(self.cars('Коростень'), [])
+        self.car2.location = self.loc
+        self.car2.save()
+        self.assertEqual(sorted(self.cars('Малин')), sorted([self.car1.pk, self.car2.pk]))
+        self.loc.delete()
+        self.assertEqual(self.cars('Малин'), [])
+
+    def test_tracker_search_by_imei_model_and_current_location(self):
+        self.assertEqual(self.trackers('3560000000000'), [self.tracker1.pk, self.tracker2.pk])
+        self.assertEqual(self.trackers('FMB125'), [self.tracker2.pk])
+        self.assertEqual(self.trackers('складе'), [self.tracker2.pk])
+        InstallationHistory.objects.create(car=self.car1, tracker=self.tracker1, installation_date=date(2024, 1, 1))
+        self.assertEqual(self.trackers('Коростень'), [self.tracker1.pk])
+
+    def test_tracker_search_by_the_tail_of_a_number(self):
+        tracker = Tracker.objects.create(
+            imei='356000000012345', serial_number='SN3', inventory_number_tracker='INV3', model='FMB920', sim_new='+380 67 555 44 33',
+        )
+        self.assertEqual(self.trackers('12345'), [tracker.pk])
+        self.assertEqual(self.trackers('4433'), [tracker.pk])
+        self.assertEqual(self.trackers('00000000000'), [self.tracker1.pk, self.tracker2.pk])
+
+    def test_car_search_by_part_of_a_number(self):
+        car = Car.objects.create(board_number='10457', state_number='АА1234ВВ', comment='склад 2024')
+        self.assertEqual(self.cars('457'), [car.pk])
+        self.assertEqual(self.cars('1234'), [car.pk])
+        self.assertEqual(self.cars('1111'), [self.car1.pk])
+        # full-text matches still count, and rank before the substring ones
+        other = Car.objects.create(board_number='12024', state_number='CC0001')
+        self.assertEqual(self.cars('2024'), [car.pk, other.pk])
+
+    def test_tracker_number_terms_keep_full_text_matches(self):
+        shelf = Tracker.objects.create(imei='356000000000003', serial_number='SN3', inventory_number_tracker='INV3', model='M', comment='полка 77')
+        self.assertEqual(self.trackers('920'), [self.tracker1.pk])
+        self.assertEqual(self.trackers('77'), [shelf.pk])
+        with mock.patch.object(search, 'available', return_value=False):
+            self.assertEqual(self.trackers('920'), [self.tracker1.pk])
+            self.assertEqual(self.trackers('0003'), [shelf.pk])
+
+    def test_deleted_rows_leave_the_index(self):
+        self.tracker2.delete()
+        self.assertEqual(self.trackers('FMB125'), [])
+
+    def test_fallback_without_fts(self):
+        with mock.patch.object(search, 'available', return_value=False):
+            self.assertEqual(self.cars('Коростень'), [self.car1.pk])
+            self.assertEqual(self.trackers('FMB125'), [self.tracker2.pk])
+
+    def test_search_results_paginate(self):
+        for i in range(30):
+            Car.objects.create(state_number=f'CC{i:04d}', comment='резина')
+        r = self.client.get(reverse('tracker:car_list'), {'search': 'резина'})
+        page = r.context['page_obj']
+        second = self.client.get(reverse('tracker:car_list'), {'search': 'резина', 'cursor': page.next_cursor})
+        seen = [c.pk for c in page] + [c.pk for c in second.context['page_obj']]
+        self.assertEqual(len(seen), 32)
+        self.assertEqual(len(set(seen)), 32)
@@ -0,0 +1,74 @@
+from datetime import timedelta
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from tracker.models import ActionLog, Car, Tracker
+from tracker.pagination import KeysetPaginator, InvalidCursor
+
+class ObjectHistoryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user('hist', 'hist@example.com', 'pw')
+        self.client = Client()
+        self.client.login(username='hist', password='pw')
+        self.car = Car.objects.create(board_number='H1', state_number='HS1', model='Other')
+        ct = ContentType.objects.get_for_model(Car)
+        now = timezone.now()
+        ActionLog.objects.all().delete()
+        # identical timestamps in pairs exercise the id tie-breaker
+        ActionLog.objects.bulk_create([
+            ActionLog(content_type=ct, object_id=str(self.car.pk), object_repr='H1', action='update',
+                      changes={'comment': {'old': str(i), 'new': str(i + 1)}}, timestamp=now - timedelta(minutes=i // 2))
+            for i in range(25)
+        ] + [ActionLog(content_type=ct, object_id=str(self.car.pk + 1), object_repr='other', action='update', timestamp=now)])
+        self.logs = ActionLog.objects.filter(content_type=ct, object_id=str(self.car.pk))
+
+    def test_paginator_walks_forward_and_back(self):
+        expected = list(self.logs.order_by('-timestamp', '-id').values_list('pk', flat=True))
+        paginator = KeysetPaginator(self.logs, ('-timestamp', '-id'), per_page=10)
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual([log.pk for p in pages for log in p], expected)
+        self.assertFalse(pages[0].has_previous)
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual([log.pk for log in back], [log.pk for log in pages[1]])
+        self.assertTrue(back.has_next)
+        self.assertFalse(paginator.page(back.previous_cursor).has_previous)
+
+    def test_bad_cursor(self):
+        paginator = KeysetPaginator(self.logs, ('-timestamp', '-id'))
+        with self.assertRaises(InvalidCursor):
+            paginator.page('garbage')
+        r = self.client.get(reverse('tracker:car_history', kwargs={'pk': self.car.pk}), {'cursor': 'garbage'})
+        self.assertEqual(r.status_code, 404)
+
+    def test_history_page_shows_only_this_object(self):
+        r = self.client.get(reverse('tracker:car_history', kwargs={'pk': self.car.pk}))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.context['entries']), 25)
+        self.assertNotContains(r, 'other')
+
+    def test_history_of_deleted_object(self):
+        tracker = Tracker.objects.create(imei='555555555555555', serial_number='SNH', inventory_number_tracker='INVH', model='M')
+        pk = tracker.pk
+        ct = ContentType.objects.get_for_model(Tracker)
+        ActionLog.objects.create(content_type=ct, object_id=str(pk), object_repr='SNH', action='delete', changes={'serial_number': 'SNH'})
+        tracker.delete()
+        r = self.client.get(reverse('tracker:tracker_history', kwargs={'pk': pk}))
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, 'SNH')
+
+    def test_page_query_uses_composite_index(self):
+        paginator = KeysetPaginator(self.logs, ('-timestamp', '-id'), per_page=10)
+        qs = self.logs.filter(paginator._seek(paginator.decode(paginator.page().next_cursor)[1], False)).order_by('-timestamp', '-id')[:11]
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('actionlog_object_ts_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,142 @@
+from datetime import date
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker.models import Car, Tracker, InstallationHistory, Location
+
+
+class InstallationPointerTests(TestCase):
+    def setUp(self):
+        self.loc1 = Location.objects.create(name='L1')
+        self.loc2 = Location.objects.create(name='L2')
+        self.car1 = Car.objects.create(board_number='B1', state_number='S1', location=self.loc1)
+        self.car2 = Car.objects.create(board_number='B2', state_number='S2', location=self.loc2)
+        self.tracker = Tracker.objects.create(imei='111111111111111', serial_number='SN1', inventory_number_tracker='INV1', model='M')
+
+    def assertPointers(self, installation, car, location, status):
+        self.tracker.refresh_from_db()
+        self.assertEqual(self.tracker.current_installation_id, installation.pk if installation else None)
+        self.assertEqual(self.tracker.current_car_id, car.pk if car else None)
+        self.assertEqual(self.tracker.current_location_name, location)
+        self.assertEqual(self.tracker.status, status)
+
+    def test_new_tracker_is_free(self):
+        self.assertPointers(None, None, '', 'free')
+        self.assertEqual(self.tracker.current_location, '-')
+
+    def test_create_close_and_delete_installation(self):
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        self.assertPointers(inst, self.car1, 'L1', 'installed')
+        self.car1.refresh_from_db()
+        self.assertEqual(self.car1.current_installation_id, inst.pk)
+
+        inst.is_active = False
+        inst.removal_date = date(2024, 2, 1)
+        inst.save()
+        self.assertPointers(None, None, '', 'free')
+        self.car1.refresh_from_db()
+        self.assertIsNone(self.car1.current_installation_id)
+
+        newer = InstallationHistory.objects.create(car=self.car2, tracker=self.tracker, installation_date=date(2024, 3, 1))
+        self.assertPointers(newer, self.car2, 'L2', 'installed')
+        newer.delete()
+        self.assertPointers(None, None, '', 'free')
+
+    def test_latest_active_installation_wins(self):
+        InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        latest = InstallationHistory.objects.create(car=self.car2, tracker=self.tracker, installation_date=date(2024, 5, 1))
+        self.assertPointers(latest, self.car2, 'L2', 'installed')
+
+    def test_moving_installation_refreshes_previous_tracker(self):
+        other = Tracker.objects.create(imei='222222222222222', serial_number='SN2', inventory_number_tracker='INV2', model='M')
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        inst.tracker = other
+        inst.save()
+        self.assertPointers(None, None, '', 'free')
+        other.refresh_from_db()
+        self.assertEqual(other.current_installation_id, inst.pk)
+
+    def test_moving_an_instance_without_loaded_values(self):
+        other = Tracker.objects.create(imei='222222222222222', serial_number='SN2', inventory_number_tracker='INV2', model='M')
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        partial = InstallationHistory.objects.only('pk', 'is_active').get(pk=inst.pk)
+        partial.tracker = other
+        partial.car = self.car2
+        partial.save()
+        self.assertPointers(None, None, '', 'free')
+        self.car1.refresh_from_db()
+        self.assertIsNone(self.car1.current_installation_id)
+        # built by hand: nothing was loaded at all
+        InstallationHistory(
+            pk=inst.pk, car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1), created_at=inst.created_at,
+        ).save()
+        self.assertPointers(inst, self.car1, 'L1', 'installed')
+        other.refresh_from_db()
+        self.assertIsNone(other.current_installation_id)
+
+    def test_car_location_change_and_location_rename(self):
+        InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        self.car1.location = self.loc2
+        self.car1.save()
+        self.tracker.refresh_from_db()
+        self.assertEqual(self.tracker.current_location_name, 'L2')
+        self.loc2.name = 'L2 renamed'
+        self.loc2.save()
+        self.tracker.refresh_from_db()
+        self.assertEqual(self.tracker.current_location_name, 'L2 renamed')
+        self.loc2.delete()
+        self.tracker.refresh_from_db()
+        self.assertEqual(self.tracker.current_location_name, '')
+
+    def test_stale_instance_save_keeps_pointers(self):
+        stale = Tracker.objects.get(pk=self.tracker.pk)
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        stale.comment = 'edited'
+        stale.save()
+        self.assertPointers(inst, self.car1, 'L1', 'installed')
+
+    def test_bulk_operations_refresh_pointers(self):
+        objs = InstallationHistory.objects.bulk_create([
+            InstallationHistory(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1)),
+        ])
+        self.assertPointers(objs[0], self.car1, 'L1', 'installed')
+        InstallationHistory.objects.filter(tracker=self.tracker).update(is_active=False)
+        self.assertPointers(None, None, '', 'free')
+        InstallationHistory.objects.filter(tracker=self.tracker).audited_update(is_active=True)
+        self.assertPointers(objs[0], self.car1, 'L1', 'installed')
+
+    def test_rebuild_command(self):
+        inst = InstallationHistory.objects.create(car=self.car1, tracker=self.tracker, installation_date=date(2024, 1, 1))
+        Tracker.objects.update(current_installation=None, current_car=None, current_location_name='', status='free')
+        call_command('rebuild_installation_pointers', stdout=StringIO())
+        self.assertPointers(inst, self.car1, 'L1', 'installed')
+
+
+class TrackerListPointerTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        loc = Location.objects.create(name='L1')
+        car = Car.objects.create(board_number='B1', state_number='S1', location=loc)
+        for i in range(5):
+            tracker = Tracker.objects.create(imei=f'33333333333333{i}', serial_number=f'SN{i}', inventory_number_tracker=f'INV{i}', model='M')
+            if i % 2 == 0:
+                InstallationHistory.objects.create(car=car, tracker=tracker, installation_date=date(2024, 1, 1))
+
+    def test_status_filter(self):
+        r = self.client.get(reverse('tracker:tracker_list') + '?status=installed')
+        self.assertEqual(len(r.context['trackers']), 3)
+        r = self.client.get(reverse('tracker:tracker_list') + '?status=free')
+        self.assertEqual(len(r.context['trackers']), 2)
+
+    def test_location_column_does_not_query_per_row(self):
+        url = reverse('tracker:tracker_list') + '?sort=location'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertFalse([q for q in ctx.captured_queries if 'tracker_installationhistory' in q['sql']])
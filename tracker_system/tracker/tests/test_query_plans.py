@@ -0,0 +1,123 @@
+import re
+from datetime import date
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from tracker import pointers
+from tracker.models import Car, InstallationHistory, OrderDocument, Tracker
+
+TABLES = ('tracker_installationhistory', 'tracker_orderdocument', 'tracker_car', 'tracker_tracker')
+
+# unfiltered, in primary key order and limited: the table's own b-tree is read
+# from the start and the scan stops after LIMIT rows
+FIRST_ROWS = re.compile(r'^(?!.* WHERE ).* ORDER BY (1|"\w+"\."id") ASC LIMIT \d+$')
+
+
+def plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], AUDIT_WRITE_BEHIND=False)
+class QueryPlanTests(TestCase):
+    """The queries behind the pages must find their rows through an index.
+
+    Without ANALYZE statistics SQLite prefers any usable index, so a plan that
+    still scans the table (or sorts all of it) means the index is missing or the
+    query stopped matching it.
+    """
+
+    def setUp(self):
+        get_user_model().objects.create_user('u', 'u@example.com', 'pw')
+        self.client.login(username='u', password='pw')
+        # more rows than a list page, so the lists have a second page
+        self.cars = Car.objects.bulk_create([Car(board_number=f'B{i:02d}', state_number=f'S{i:02d}') for i in range(25)])
+        self.trackers = Tracker.objects.bulk_create([
+            Tracker(imei=f'3560000000000{i:02d}', serial_number=f'SN{i:02d}', inventory_number_tracker=f'INV{i:02d}', model='M')
+            for i in range(25)
+        ])
+        # signals are not under test here; one INSERT instead of 25 saves
+        InstallationHistory.objects.bulk_create([
+            InstallationHistory(
+                car=self.cars[day % 3], tracker=self.trackers[day % 3], installation_date=date(2024, 1, day),
+                is_active=day > 22,
+            )
+            for day in range(1, 26)
+        ])
+        OrderDocument.objects.create(car=self.cars[0], document='orders/a.pdf', issue_date=date(2024, 1, 1))
+
+    def assertIndexed(self, queries):
+        checked = 0
+        for sql in queries:
+            names = [t for t in TABLES if f'"{t}"' in sql]
+            if not names:
+                continue
+            # correlated subqueries use aliases: "tracker_installationhistory" U0
+            names += re.findall(r'"(?:%s)" (\w+)' % '|'.join(TABLES), sql)
+            for line in plan(sql):
+                match = re.fullmatch(r'SCAN (\w+)', line)
+                if match and FIRST_ROWS.match(sql):
+                    continue
+                self.assertFalse(match and match.group(1) in names, f'{line}\n{sql}')
+                self.assertNotEqual(line, 'USE TEMP B-TREE FOR ORDER BY', sql)
+            checked += 1
+        self.assertTrue(checked)
+
+    def page_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(url, params)
+        self.assertEqual(r.status_code, 200)
+        return r, [q['sql'] for q in ctx.captured_queries]
+
+    def test_dashboard(self):
+        _, queries = self.page_queries(reverse('tracker:dashboard'))
+        self.assertIndexed(queries)
+
+    def test_installation_list_pages(self):
+        r, queries = self.page_queries(reverse('tracker:installation_list'))
+        self.assertIndexed(queries)
+        _, queries = self.page_queries(reverse('tracker:installation_list'), cursor=r.context['page_obj'].next_cursor)
+        self.assertIndexed(queries)
+
+    def list_pages(self, name, **params):
+        r, queries = self.page_queries(reverse(f'tracker:{name}'), **params)
+        self.assertIndexed(queries)
+        _, queries = self.page_queries(reverse(f'tracker:{name}'), cursor=r.context['page_obj'].next_cursor, **params)
+        self.assertIndexed(queries)
+
+    def test_car_list_pages(self):
+        for params in ({}, {'sort': 'state_number'}, {'sort': '-board_number'}):
+            self.list_pages('car_list', **params)
+
+    def test_tracker_list_pages(self):
+        for params in ({}, {'sort': 'imei'}, {'sort': '-serial_number'}, {'status': 'free'}):
+            self.list_pages('tracker_list', **params)
+
+    def test_report_period(self):
+        _, queries = self.page_queries(reverse('tracker:reports'), date_from='2024-01-05', date_to='2024-01-20')
+        self.assertIndexed(queries)
+
+    def test_car_card(self):
+        _, queries = self.page_queries(reverse('tracker:car_detail', args=[self.cars[0].pk]))
+        self.assertIndexed(queries)
+
+    def test_api_pages(self):
+        r, queries = self.page_queries(reverse('tracker:installation_api'), limit=5)
+        self.assertIndexed(queries)
+        _, queries = self.page_queries(r.json()['next'])
+        self.assertIndexed(queries)
+        for name, obj in (('installation_api_tracker', self.trackers[0]), ('installation_api_car', self.cars[0])):
+            _, queries = self.page_queries(reverse(f'tracker:{name}', args=[obj.pk]))
+            self.assertIndexed(queries)
+
+    def test_current_installation_lookups(self):
+        tracker = self.trackers[0]
+        with CaptureQueriesContext(connection) as ctx:
+            pointers.refresh_trackers([tracker.pk])
+            pointers.refresh_cars([self.cars[0].pk])
+            tracker.installations.filter(is_active=True).first()
+            tracker.installations.filter(is_active=False).exists()
+        self.assertIndexed([q['sql'] for q in ctx.captured_queries])
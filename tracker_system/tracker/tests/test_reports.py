@@ -1,5 +1,8 @@
-from django.test import TestCase, Client
+from io import BytesIO
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
+from django.urls import reverse
+from openpyxl import load_workbook
 from tracker.models import Car, Tracker, InstallationHistory, Location
 from datetime import date
 
@@ -24,3 +27,47 @@ class ReportsExportTests(TestCase):
         r = self.client.get('/tracker/reports/export/?date_from=2026-01-01&date_to=2026-12-31&location=%s' % Location.objects.first().id, HTTP_HOST='127.0.0.1')
         self.assertEqual(r.status_code, 200)
         self.assertEqual(r['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class InstallationsXlsxTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user('x', 'x@example.com', 'pw')
+        self.client.login(username='x', password='pw')
+        loc = Location.objects.create(name='Коростень')
+        car = Car.objects.create(board_number='B1', state_number='AA1111', location=loc)
+        bare = Car.objects.create(state_number='BB2222')
+        for i in range(3):
+            tracker = Tracker.objects.create(imei=f'35600000000000{i}', serial_number=f'SN{i}', inventory_number_tracker=f'INV{i}', model='M')
+            InstallationHistory.objects.create(
+                car=car if i else bare, tracker=tracker, installation_date=date(2026, 1, 1 + i),
+                removal_date=date(2026, 2, 1) if i == 1 else None, is_active=i != 1, comment='x' * (60 if i == 2 else 5),
+            )
+
+    def export(self, **params):
+        r = self.client.get(reverse('tracker:export_installations'), params)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        self.assertIn('attachment; filename="installations_', r['Content-Disposition'])
+        return load_workbook(BytesIO(b''.join(r.streaming_content))).active
+
+    def test_rows_and_widths(self):
+        ws = self.export()
+        rows = [[cell.value for cell in row] for row in ws.iter_rows(min_row=2)]
+        self.assertEqual(rows[0][:7], ['B1', 'AA1111', 'Коростень', 'SN2', '2026-01-03', None, 'Да'])
+        self.assertEqual(rows[1][4:7], ['2026-01-02', '2026-02-01', 'Нет'])
+        self.assertEqual(rows[2][:3], ['-', 'BB2222', '-'])
+        self.assertEqual(ws.column_dimensions['A'].width, len('Бортовой номер') + 2)
+        self.assertEqual(ws.column_dimensions['C'].width, len('Коростень') + 2)
+        self.assertEqual(ws.column_dimensions['H'].width, 50)
+        self.assertEqual(ws['A1'].fill.fgColor.value, 'FFDDEAF6')
+        self.assertEqual([ws[i][7].fill.fgColor.value for i in (2, 3, 4)], ['FFEDF7FF', 'FFFFFFFF', 'FFEDF7FF'])
+
+    def test_filters_apply(self):
+        ws = self.export(imei='0001')
+        self.assertEqual([row[3] for row in ws.iter_rows(min_row=2, values_only=True)], ['SN1'])
+
+    def test_empty_export_has_header_only(self):
+        ws = self.export(date_from='2030-01-01')
+        self.assertEqual(ws.max_row, 1)
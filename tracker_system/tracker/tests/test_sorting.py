@@ -101,10 +101,10 @@ class SortingTests(TestCase):
         url = reverse('tracker:export_installations')
         r = self.client.get(url)
         self.assertEqual(r.status_code, 200)
-        # load workbook from response content
+        # load workbook from the streamed response
         from openpyxl import load_workbook
         from io import BytesIO
-        wb = load_workbook(BytesIO(r.content))
+        wb = load_workbook(BytesIO(b''.join(r.streaming_content)))
         ws = wb.active
         # headers should contain separate columns
         headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
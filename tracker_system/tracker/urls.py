@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from .models import Car, Tracker, InstallationHistory
 
 app_name = 'tracker'
 
@@ -10,6 +11,7 @@ urlpatterns = [
     path('cars/<int:pk>/', views.CarDetailView.as_view(), name='car_detail'),
     path('cars/<int:pk>/update/', views.CarUpdateView.as_view(), name='car_update'),
     path('cars/<int:pk>/delete/', views.CarDeleteView.as_view(), name='car_delete'),
+    path('cars/<int:pk>/history/', views.ObjectHistoryView.as_view(model=Car), name='car_history'),
     
     # Трекеры
     path('trackers/', views.TrackerListView.as_view(), name='tracker_list'),
@@ -17,20 +19,26 @@ urlpatterns = [
     path('trackers/<int:pk>/', views.TrackerDetailView.as_view(), name='tracker_detail'),
     path('trackers/<int:pk>/update/', views.TrackerUpdateView.as_view(), name='tracker_update'),
     path('trackers/<int:pk>/delete/', views.TrackerDeleteView.as_view(), name='tracker_delete'),
+    path('trackers/<int:pk>/history/', views.ObjectHistoryView.as_view(model=Tracker), name='tracker_history'),
     
     # История установок
     path('installations/', views.InstallationListView.as_view(), name='installation_list'),
     path('installations/create/', views.InstallationCreateView.as_view(), name='installation_create'),
     path('installations/<int:pk>/update/', views.InstallationUpdateView.as_view(), name='installation_update'),
+    path('installations/<int:pk>/history/', views.ObjectHistoryView.as_view(model=InstallationHistory), name='installation_history'),
     
     # API
     path('api/installations/', views.installation_history_api, name='installation_api'),
     path('api/installations/car/<int:car_id>/', views.installation_history_api, name='installation_api_car'),
     path('api/installations/tracker/<int:tracker_id>/', views.installation_history_api, name='installation_api_tracker'),
+    path('api/history/<str:model_name>/<int:pk>/', views.object_state_api, name='object_state_api'),
+    path('api/changes/', views.changes_api, name='changes_api'),
     
     # Отчеты
     path('reports/', views.ReportView.as_view(), name='reports'),
     path('reports/export/', views.export_installations_xlsx, name='export_installations'),
+    path('reports/export/<int:pk>/', views.export_job_status, name='export_job_status'),
+    path('reports/export/<int:pk>/download/', views.export_job_download, name='export_job_download'),
     
     # Главная страница
     path('', views.DashboardView.as_view(), name='dashboard'),
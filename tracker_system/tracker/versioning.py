@@ -0,0 +1,104 @@
+"""Per-model data versions.
+
+A DataVersion row per model name (``car``, ``tracker``, ``location``,
+``installationhistory``, ``orderdocument``) is incremented once for every
+committed transaction that changed the model: signals only note the model as
+dirty, an on_commit callback bumps all the dirty names with one UPDATE. Rolled
+back transactions leave their names dirty until the next commit, which then
+bumps them too: a spurious bump only costs a rebuild, a missed one would serve
+stale data.
+
+The version is bumped after the commit, so a reader can see new rows with the
+old version, never the other way round; anything built from the data should
+read ``token()`` first and label the result with it.
+
+Bulk queryset operations (``update``, ``bulk_update``, ``bulk_create`` and
+the audited variants) mark their model dirty through AuditedQuerySet; raw SQL
+should call ``touch()`` itself.
+"""
+import threading
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from .models import Car, DataVersion, InstallationHistory, Location, OrderDocument, Tracker
+
+# OrderDocument: the installation list shows whether any order document exists
+MODELS = (Car, Tracker, Location, InstallationHistory, OrderDocument)
+
+_dirty = threading.local()
+
+
+def _name(model):
+    return model if isinstance(model, str) else model._meta.model_name
+
+
+def touch(models, using='default'):
+    """Mark ``models`` (classes or names) changed; their versions go up when the transaction commits."""
+    dirty = getattr(_dirty, using, None)
+    if dirty is None:
+        dirty = set()
+        setattr(_dirty, using, dirty)
+    dirty.update(_name(model) for model in models)
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def _flush(using):
+    names = getattr(_dirty, using, None)
+    if not names:
+        return
+    setattr(_dirty, using, None)
+    bump(names, using=using)
+
+
+def bump(names, using='default'):
+    """Increment the versions of ``names`` now."""
+    names = sorted(names)
+    now = timezone.now()
+    versions = DataVersion.objects.using(using)
+    if versions.filter(name__in=names).update(version=F('version') + 1, changed_at=now) < len(names):
+        existing = set(versions.filter(name__in=names).values_list('name', flat=True))
+        versions.bulk_create(
+            [DataVersion(name=name, version=1, changed_at=now) for name in names if name not in existing],
+            ignore_conflicts=True,
+        )
+
+
+def current(models=MODELS, using='default'):
+    """``{name: version}`` of ``models``; 0 for a model that never changed."""
+    return {name: version for name, (version, _) in _state(models, using).items()}
+
+
+def _state(models, using):
+    names = [_name(model) for model in models]
+    rows = {name: (version, at) for name, version, at in (
+        DataVersion.objects.using(using).filter(name__in=names).values_list('name', 'version', 'changed_at')
+    )}
+    return {name: rows.get(name, (0, None)) for name in names}
+
+
+def _token(versions):
+    return ','.join(f'{name}={version}' for name, version in sorted(versions.items()))
+
+
+def token(models=MODELS, using='default'):
+    """The versions of ``models`` as one string, e.g. ``'car=3,tracker=7'``."""
+    return _token(current(models, using=using))
+
+
+def stamp(models=MODELS, using='default'):
+    """``(token, changed_at)`` of ``models`` from one query; ``changed_at`` is the latest change or None."""
+    state = _state(models, using)
+    changes = [at for _, at in state.values() if at is not None]
+    return _token({name: version for name, (version, _) in state.items()}), max(changes, default=None)
+
+
+def _changed(sender, using=None, **kwargs):
+    touch([sender], using=using or 'default')
+
+
+def connect():
+    for model in MODELS:
+        uid = model._meta.model_name
+        post_save.connect(_changed, sender=model, dispatch_uid=f'versioning_saved.{uid}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'versioning_deleted.{uid}')
@@ -4,28 +4,46 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.db.models import Q
 import json
 from datetime import datetime
-from .models import Car, Tracker, InstallationHistory, OrderDocument, Location
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from .models import Car, Tracker, InstallationHistory, OrderDocument, Location, ActionLog
 from .forms import CarForm, TrackerForm, InstallationForm
+from .pagination import KeysetPaginator, KeysetPaginationMixin, InvalidCursor
+from .conditional import conditional
+from . import api, audit, changes, counters, history, identifiers, search
 
 # Представление для карточек автомобилей
-class CarListView(LoginRequiredMixin, ListView):
+@method_decorator(conditional(), name='get')
+class CarListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Car
     template_name = 'tracker/car_list.html'
     context_object_name = 'cars'
     paginate_by = 20
     
     def get_queryset(self):
-        queryset = Car.objects.all()
+        queryset = Car.objects.select_related('location')
         search_query = self.request.GET.get('search', '')
         if search_query:
-            queryset = queryset.filter(
+            # ranked full-text search (tracker/search.py); LIKE scans when FTS5 is unavailable.
+            # FTS only matches word prefixes, so numbers are also looked up by any part
+            numbers = None
+            if any(ch.isdigit() for ch in search_query):
+                term = search_query.strip()
+                numbers = Q(state_number__icontains=term) | Q(board_number__icontains=term)
+            found = search.CARS.search(queryset, search_query, also=numbers)
+            queryset = found if found is not None else queryset.filter(
+                Q(state_number__icontains=search_query) |
                 Q(board_number__icontains=search_query) |
                 Q(model__icontains=search_query) |
-                Q(location__icontains=search_query) |
+                Q(location__name__icontains=search_query) |
                 Q(comment__icontains=search_query)
             )
         # Sorting
@@ -45,6 +63,8 @@ class CarListView(LoginRequiredMixin, ListView):
             field = allowed.get(key)
             if field:
                 queryset = queryset.order_by(f"{'-' if desc else ''}{field}")
+        elif 'search_rank' in queryset.query.annotations:
+            queryset = queryset.order_by('search_rank')
         else:
             queryset = queryset.order_by('board_number')
         return queryset
@@ -58,7 +78,7 @@ class CarDetailView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         context['documents'] = self.object.order_documents.all()
         context['installations'] = self.object.installations.all().select_related('tracker')
-        context['active_installation'] = self.object.installations.filter(is_active=True).first()
+        context['active_installation'] = self.object.current_installation
         return context
 
 class CarCreateView(LoginRequiredMixin, CreateView):
@@ -101,7 +121,8 @@ class CarDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 # Представление для карточек трекеров (аналогично Car)
-class TrackerListView(LoginRequiredMixin, ListView):
+@method_decorator(conditional(), name='get')
+class TrackerListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Tracker
     template_name = 'tracker/tracker_list.html'
     context_object_name = 'trackers'
@@ -111,12 +132,22 @@ class TrackerListView(LoginRequiredMixin, ListView):
         queryset = Tracker.objects.all()
         search_query = self.request.GET.get('search', '')
         if search_query:
-            queryset = queryset.filter(
+            # numbers are searched by any part, usually the tail, which FTS prefix matching cannot
+            # do: the identifier index and the model code (FMB920) besides the full-text matches
+            numbers = None
+            if identifiers.normalize(search_query).isdigit():
+                numbers = identifiers.tracker_q(identifiers.FIELDS, search_query) | Q(model__icontains=search_query.strip())
+            found = search.TRACKERS.search(queryset, search_query, also=numbers)
+            queryset = found if found is not None else queryset.filter(
                 Q(serial_number__icontains=search_query) |
                 Q(imei__icontains=search_query) |
                 Q(model__icontains=search_query) |
-                Q(comment__icontains=search_query)
+                Q(comment__icontains=search_query) |
+                (numbers or Q())
             )
+        status = self.request.GET.get('status')
+        if status in dict(Tracker.STATUSES):
+            queryset = queryset.filter(status=status)
         sort = self.request.GET.get('sort')
         allowed = {
             'serial_number': 'serial_number',
@@ -132,7 +163,8 @@ class TrackerListView(LoginRequiredMixin, ListView):
             'n_card': 'n_card',
             'sim_new': 'sim_new',
             'comment': 'comment',
-            'location': 'installations__car__location__name',
+            'location': 'current_location_name',
+            'status': 'status',
         }
         if sort:
             desc = sort.startswith('-')
@@ -140,57 +172,156 @@ class TrackerListView(LoginRequiredMixin, ListView):
             field = allowed.get(key)
             if field:
                 queryset = queryset.order_by(f"{'-' if desc else ''}{field}")
+        elif 'search_rank' in queryset.query.annotations:
+            queryset = queryset.order_by('search_rank')
         else:
             queryset = queryset.order_by('serial_number')
-        # prevent duplicate trackers due to joins on reverse FK when sorting by related fields
-        return queryset.distinct()
+        return queryset
 
 # API для получения истории установок в JSON
+API_CHUNK_SIZE = 2000
+
+
+def _api_error(message):
+    return JsonResponse({'error': message}, status=400)
+
+
+# rows carry car and tracker numbers, not locations
+@conditional([Car, Tracker, InstallationHistory])
 def installation_history_api(request, car_id=None, tracker_id=None):
-    """API для получения истории установок"""
+    """API для получения истории установок
+
+    ?fields=id,car,tracker.imei — только эти поля; ?date_from= / ?date_to= — по дате установки.
+    Ответ — страница {"results": [...], "next": ..., "previous": ...} из ?limit= строк по
+    возрастанию id; ?all=1 — весь результат одним потоковым JSON-массивом.
+    """
+    try:
+        fields = api.parse_fields(request.GET.get('fields'), api.INSTALLATION_FIELDS)
+    except ValueError as e:
+        return _api_error(f'Неизвестное поле: {e}')
     installations = InstallationHistory.objects.all()
     
     if car_id:
         installations = installations.filter(car_id=car_id)
     if tracker_id:
         installations = installations.filter(tracker_id=tracker_id)
-    
-    data = []
-    for install in installations.select_related('car', 'tracker'):
-        data.append({
-            'id': install.id,
-            'car': {
-                'id': install.car.id,
-                'board_number': install.car.board_number,
-                'model': install.car.get_model_display(),
-            },
-            'tracker': {
-                'id': install.tracker.id,
-                'serial_number': install.tracker.serial_number,
-                'imei': install.tracker.imei,
-                'model': install.tracker.model,
-            },
-            'installation_date': install.installation_date.strftime('%Y-%m-%d'),
-            'removal_date': install.removal_date.strftime('%Y-%m-%d') if install.removal_date else None,
-            'is_active': install.is_active,
-            'comment': install.comment,
-        })
-    
-    return JsonResponse(data, safe=False)
+    for param, lookup in (('date_from', 'installation_date__gte'), ('date_to', 'installation_date__lte')):
+        if request.GET.get(param):
+            try:
+                day = parse_date(request.GET[param])
+            except ValueError:
+                day = None
+            if day is None:
+                return _api_error(f'Неверная дата {param} (ожидается ГГГГ-ММ-ДД)')
+            installations = installations.filter(**{lookup: day})
+
+    rows = api.Rows(fields)
+    # the id is the page key even when it is not among the fields
+    installations = installations.order_by('id').values(*dict.fromkeys(rows.lookups + ['id']))
+
+    if request.GET.get('all') in ('1', 'true'):
+        def chunks():
+            # a JSON array written element by element, one object per line
+            yield '['
+            separator = '\n'
+            for values in installations.iterator(chunk_size=API_CHUNK_SIZE):
+                yield separator + json.dumps(rows(values), ensure_ascii=False)
+                separator = ',\n'
+            yield '\n]\n'
+        return StreamingHttpResponse(chunks(), content_type='application/json')
+
+    limit = getattr(settings, 'API_PAGE_SIZE', 100)
+    if request.GET.get('limit'):
+        try:
+            limit = int(request.GET['limit'])
+        except ValueError:
+            return _api_error('limit должен быть числом')
+        limit = max(1, min(limit, getattr(settings, 'API_MAX_PAGE_SIZE', 1000)))
+    paginator = KeysetPaginator(installations, ('id',), per_page=limit)
+    try:
+        page = paginator.page(request.GET.get('cursor') or None)
+    except InvalidCursor:
+        return _api_error('Неверный курсор')
+
+    def link(cursor):
+        if cursor is None:
+            return None
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return JsonResponse({
+        'results': [rows(values) for values in page],
+        'next_cursor': page.next_cursor,
+        'next': link(page.next_cursor),
+        'previous': link(page.previous_cursor),
+    })
+
+# API: изменения автомобилей, трекеров и установок после курсора
+@login_required
+def changes_api(request):
+    """?since=<cursor из предыдущего ответа>; без since — с начала журнала.
+
+    {"changes": [...], "cursor": "...", "has_more": false}: по одной записи на объект
+    (последнее изменение), "data" — текущие поля или null для удалённых.
+    410 — журнал до курсора уже очищен, нужна полная выгрузка; её стоит начинать
+    после получения "cursor" из ответа 410, чтобы не пропустить изменения.
+    """
+    since = request.GET.get('since') or '0'
+    if not since.isdigit():
+        return _api_error('Неверный курсор')
+    since = int(since)
+    limit = getattr(settings, 'API_PAGE_SIZE', 100)
+    if request.GET.get('limit'):
+        try:
+            limit = int(request.GET['limit'])
+        except ValueError:
+            return _api_error('limit должен быть числом')
+        limit = max(1, min(limit, getattr(settings, 'API_MAX_PAGE_SIZE', 1000)))
+    found, cursor, has_more = changes.read(since, limit)
+    # checked after reading: a prune that ran meanwhile is caught here, not silently skipped
+    if changes.expired(since):
+        return JsonResponse({
+            'error': 'Журнал изменений до этого курсора уже очищен, нужна полная синхронизация',
+            'cursor': str(changes.latest_seq()),
+        }, status=410)
+    return JsonResponse({'changes': found, 'cursor': str(cursor), 'has_more': has_more})
+
+# API: состояние объекта на заданный момент, восстановленное из журнала действий
+@login_required
+def object_state_api(request, model_name, pk):
+    """?at=2024-05-01T12:00:00+03:00 (по умолчанию — сейчас)"""
+    model = next((m for m in audit.registry.models() if m._meta.model_name == model_name), None)
+    if model is None:
+        raise Http404('Модель не журналируется')
+    at = timezone.now()
+    if request.GET.get('at'):
+        at = parse_datetime(request.GET['at'])
+        if at is None:
+            return JsonResponse({'error': 'Неверный формат даты (ожидается ISO 8601)'}, status=400)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+    result = history.reconstruct(model, pk, at)
+    return JsonResponse({
+        'model': model_name,
+        'id': pk,
+        'at': at.isoformat(),
+        'exists': result.state is not None,
+        'state': result.state,
+    })
 
 # Представление для отчетов
+@method_decorator(conditional(), name='get')
 class ReportView(LoginRequiredMixin, TemplateView):
     template_name = 'tracker/reports.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cars_count'] = Car.objects.count()
-        context['trackers_count'] = Tracker.objects.count()
-        context['active_installations'] = InstallationHistory.objects.filter(is_active=True).count()
-        context['inactive_trackers'] = Tracker.objects.filter(
-            is_active=True,
-            installations__is_active=False
-        ).distinct().count()
+        totals = counters.values()
+        context['cars_count'] = totals['cars']
+        context['trackers_count'] = totals['trackers']
+        context['active_installations'] = totals['active_installations']
+        context['inactive_trackers'] = totals['inactive_trackers']
 
         # Filters from GET
         date_from = self.request.GET.get('date_from')
@@ -234,12 +365,13 @@ class ReportView(LoginRequiredMixin, TemplateView):
                 qs = qs.filter(car__location__name=location)
         if model_filter:
             qs = qs.filter(car__model=model_filter)
+        # partial numbers go through the identifier index (tracker/identifiers.py)
         if imei:
-            qs = qs.filter(tracker__imei__icontains=imei)
+            qs = qs.filter(identifiers.tracker_q(['imei'], imei, field='tracker'))
         if serial:
-            qs = qs.filter(tracker__serial_number__icontains=serial)
+            qs = qs.filter(identifiers.tracker_q(['serial_number'], serial, field='tracker'))
         if sim:
-            qs = qs.filter(Q(tracker__sim_old__icontains=sim) | Q(tracker__sim_new__icontains=sim) | Q(tracker__n_card__icontains=sim))
+            qs = qs.filter(identifiers.tracker_q(['sim_old', 'sim_new', 'n_card'], sim, field='tracker'))
 
         context['installations'] = qs[:100]
         from .models import Location
@@ -251,94 +383,45 @@ class ReportView(LoginRequiredMixin, TemplateView):
 
 
 # Export installations to XLSX
-from django.utils import timezone
-import openpyxl
-from openpyxl.utils import get_column_letter
-from io import BytesIO
+from . import exports, xlsx
+from .models import ExportJob
+
+
+def _export_job_response(request, job):
+    # a queued or running export: JSON for scripts, a page that polls the status otherwise
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'application/json' in request.headers.get('accept', ''):
+        return JsonResponse(exports.status(job), status=202)
+    return render(request, 'tracker/export_job.html', {'job': job, 'job_status': exports.status(job)})
 
-from django.http import HttpResponse
 
 @login_required
 def export_installations_xlsx(request):
-    qs = InstallationHistory.objects.select_related('car__location', 'tracker').order_by('-installation_date')
-
     # Support filters from GET (same as reports)
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    location = request.GET.get('location')
-    model_filter = request.GET.get('model')
-    imei = request.GET.get('imei')
-    serial = request.GET.get('serial')
-    sim = request.GET.get('sim')
-
-    if date_from:
-        qs = qs.filter(installation_date__gte=date_from)
-    if date_to:
-        qs = qs.filter(installation_date__lte=date_to)
-    if location:
-        try:
-            loc_id = int(location)
-            qs = qs.filter(car__location__id=loc_id)
-        except ValueError:
-            qs = qs.filter(car__location__name=location)
-    if model_filter:
-        qs = qs.filter(car__model=model_filter)
-    if imei:
-        qs = qs.filter(tracker__imei__icontains=imei)
-    if serial:
-        qs = qs.filter(tracker__serial_number__icontains=serial)
-    if sim:
-        qs = qs.filter(Q(tracker__sim_old__icontains=sim) | Q(tracker__sim_new__icontains=sim) | Q(tracker__n_card__icontains=sim))
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Installations'
-
-    from openpyxl.styles import PatternFill
-
-    headers = ['Бортовой номер', 'Державний номер', 'Локация', 'Трекер (S/N)', 'Дата установки', 'Дата снятия', 'Активна', 'Комментарий']
-    ws.append(headers)
-
-    # header fill
-    header_fill = PatternFill(fill_type='solid', fgColor='FFDDEAF6')
-    for c in ws[1]:
-        c.fill = header_fill
-
-    # Write rows and apply zebra fill
-    odd_fill = PatternFill(fill_type='solid', fgColor='FFFFFFFF')
-    even_fill = PatternFill(fill_type='solid', fgColor='FFEDF7FF')
-    row_idx = 2
-    for inst in qs:
-        loc_value = inst.car.location.name if inst.car.location else '-'
-        row = [
-            inst.car.board_number or '-',
-            inst.car.state_number or '-',
-            loc_value,
-            inst.tracker.serial_number,
-            inst.installation_date.strftime('%Y-%m-%d'),
-            inst.removal_date.strftime('%Y-%m-%d') if inst.removal_date else '',
-            'Да' if inst.is_active else 'Нет',
-            inst.comment or '',
-        ]
-        ws.append(row)
-        # apply fill to the newly appended row
-        fill = even_fill if row_idx % 2 == 0 else odd_fill
-        for cell in ws[row_idx]:
-            cell.fill = fill
-        row_idx += 1
-
-    # Auto width
-    for i, column_cells in enumerate(ws.columns, 1):
-        length = max(len(str(cell.value or '')) for cell in column_cells)
-        ws.column_dimensions[get_column_letter(i)].width = min(50, length + 2)
-
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    filename = f"installations_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response = HttpResponse(bio.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    params = exports.normalize_filters(request.GET)
+    job = exports.reusable_job('installations', params)
+    if job is not None and job.status == ExportJob.DONE:
+        return exports.download_response(job)
+    if job is None:
+        sheet = exports.installations_sheet(params)
+        if sheet.total <= getattr(settings, 'EXPORT_INLINE_MAX_ROWS', 5000):
+            filename = f"installations_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            return xlsx.response(filename, sheet.title, sheet.headers, sheet.rows, sheet.lengths)
+        job = exports.enqueue('installations', params, user=request.user, total=sheet.total)
+    return _export_job_response(request, job)
+
+
+@login_required
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk)
+    return JsonResponse(exports.status(job))
+
+
+@login_required
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, status=ExportJob.DONE)
+    if not job.file or not job.file.storage.exists(job.file.name):
+        raise Http404('Файл выгрузки удалён')
+    return exports.download_response(job)
 
 
 class TrackerDetailView(LoginRequiredMixin, DetailView):
@@ -353,6 +436,7 @@ class TrackerCreateView(LoginRequiredMixin, CreateView):
     template_name = 'tracker/tracker_form.html'
     success_url = reverse_lazy('tracker:tracker_list')
 
+    @transaction.atomic
     def form_valid(self, form):
         messages.success(self.request, 'Трекер успешно создан')
         response = super().form_valid(form)
@@ -377,6 +461,8 @@ class TrackerUpdateView(LoginRequiredMixin, UpdateView):
         context['modal'] = (self.request.headers.get('x-requested-with') == 'XMLHttpRequest')
         return context
 
+    # one transaction: the tracker, the closed and the new installation are audited together
+    @transaction.atomic
     def form_valid(self, form):
         messages.success(self.request, 'Изменения сохранены')
         # capture selection before save
@@ -414,7 +500,8 @@ class TrackerDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class InstallationListView(LoginRequiredMixin, ListView):
+@method_decorator(conditional(), name='get')
+class InstallationListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = InstallationHistory
     template_name = 'tracker/installation_list.html'
     context_object_name = 'installations'
@@ -426,7 +513,7 @@ class InstallationListView(LoginRequiredMixin, ListView):
         allowed = {
             'car': 'car__board_number',
             'tracker': 'tracker__serial_number',
-            'tracker_location': 'tracker__installations__car__location__name',
+            'tracker_location': 'tracker__current_location_name',
             'installation_date': 'installation_date',
             'removal_date': 'removal_date',
             'is_active': 'is_active',
@@ -487,6 +574,52 @@ class InstallationUpdateView(LoginRequiredMixin, UpdateView):
         return response
 
 
+
+# История изменений одного объекта по журналу действий
+class ObjectHistoryView(LoginRequiredMixin, TemplateView):
+    """Лента ActionLog для одного объекта, новые записи сверху.
+
+    Страницы листаются по курсору (?cursor=) через индекс
+    (content_type, object_id, timestamp), без COUNT и OFFSET.
+    Работает и для уже удаленных объектов.
+    """
+    template_name = 'tracker/object_history.html'
+    model = None
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        pk = self.kwargs['pk']
+        logs = ActionLog.objects.filter(
+            content_type=ContentType.objects.get_for_model(self.model), object_id=str(pk)
+        ).select_related('user')
+        paginator = KeysetPaginator(logs, ('-timestamp', '-id'), per_page=self.paginate_by)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Неверный курсор страницы')
+        context['object'] = self.model._default_manager.filter(pk=pk).first()
+        context['object_pk'] = pk
+        context['verbose_name'] = self.model._meta.verbose_name
+        context['page'] = page
+        context['entries'] = [(log, self._changes(log)) for log in page]
+        return context
+
+    @staticmethod
+    def _changes(log):
+        """(поле, старое, новое) для шаблона; create/delete хранят снимок значений."""
+        rows = []
+        for name, value in (log.changes or {}).items():
+            if log.action == 'update' and isinstance(value, dict):
+                rows.append((name, value.get('old'), value.get('new')))
+            elif log.action == 'delete':
+                rows.append((name, value, None))
+            else:
+                rows.append((name, None, value))
+        return rows
+
+
+@method_decorator(conditional(), name='get')
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'tracker/dashboard.html'
 
@@ -519,6 +652,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         else:
             qs = qs.order_by('-installation_date')
         context['recent_installations'] = qs[:10]
-        context['cars_count'] = Car.objects.count()
-        context['trackers_count'] = Tracker.objects.count()
+        totals = counters.values()
+        context['cars_count'] = totals['cars']
+        context['trackers_count'] = totals['trackers']
         return context
\ No newline at end of file
@@ -132,3 +132,37 @@ DBBACKUP_CLEANUP_KEEP_MEDIA = 10  # Хранить 10 последних мед
 
 # После выхода перенаправляем пользователя на корень сайта
 LOGOUT_REDIRECT_URL = '/'
+
+# Списки автомобилей/трекеров/установок листаются по курсору (tracker/pagination.py);
+# общее количество кэшируется на N секунд, None — не показывать его вовсе
+LIST_COUNT_CACHE_TIMEOUT = 60
+
+# JSON API (/tracker/api/installations/): страницы по курсору, ?limit= не больше API_MAX_PAGE_SIZE
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+CHANGES_KEEP_DAYS = 30  # журнал изменений для /tracker/api/changes/ хранится N дней (prune_changes)
+
+# Списки, отчёты, дашборд и API отвечают 304 Not Modified, пока данные не менялись (tracker/conditional.py).
+# ETag включает эту «соль»: None — новая при каждом перезапуске; задайте строку (например, номер
+# выкладки), чтобы несколько процессов выдавали одинаковые ETag
+DATA_ETAG_SALT = None
+
+# Выгрузки отчётов (tracker/exports.py): большие строит команда run_export_worker в MEDIA_ROOT/exports/
+EXPORT_INLINE_MAX_ROWS = 5000       # выгрузку до N строк отдавать сразу, без очереди
+EXPORT_WORKER_POLL_INTERVAL = 2.0   # пауза воркера между проверками пустой очереди, сек
+EXPORT_PROGRESS_EVERY = 1000        # сохранять прогресс каждые N строк
+EXPORT_JOB_TIMEOUT = 300            # задание без отчёта о прогрессе N секунд возвращается в очередь
+EXPORT_KEEP_DAYS = 7                # готовые файлы и задания старше N дней удаляются воркером
+
+# Журнал действий (ActionLog): записи копятся в памяти и пишутся пачками (tracker/audit.py)
+AUDIT_WRITE_BEHIND = True   # писать в фоновом потоке; False — синхронно при коммите транзакции
+AUDIT_BATCH_SIZE = 100      # сбросить очередь, когда в ней накопилось столько записей
+AUDIT_FLUSH_INTERVAL = 2.0  # ... или не реже, чем раз в N секунд
+AUDIT_RETRY_MAX_DELAY = 60.0  # после ошибки записи повторять с растущей паузой, но не реже, чем раз в N секунд
+AUDIT_LOG_MAX_BYTES = 2 * 1024 * 1024  # бюджет хранения логов; лишнее удаляет prune_action_logs / фоновый поток
+AUDIT_COMPACT_CHANGES = False  # хранить changes сжатыми, с номерами полей вместо имён (tracker/compact.py)
+AUDIT_CHECKPOINT_EVERY = 50  # снимок состояния объекта через каждые N записей (восстановление на дату, tracker/history.py)
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'archive' / 'actionlog'  # сжатые помесячные архивы (archive_action_logs)
+AUDIT_ARCHIVE_AFTER_DAYS = 180  # archive_action_logs по умолчанию переносит записи старше N дней
+# AUDIT_MODELS — какие модели пишутся в журнал и какие их поля исключить; по умолчанию
+# tracker.audit.DEFAULT_AUDIT_MODELS, задавать только чтобы заменить этот список